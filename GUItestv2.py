@@ -1,22 +1,61 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import matplotlib as mpl
 import os
-from scipy.stats import zscore  # クラスタタイプ分類で使用
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from stats_common import data_version, league_of, LEAGUE_TEAMS
+from frame_views import rows_where, take, numeric, alloc_probe
+from percentiles import radar_percentiles, percentile_badges
+from roster_render import batter_roster, pitcher_roster
+from team_compare import team_batting_values, team_pitching_values, top_team_summary
+from regulars import regulars_table, regulars_display, best_nine
+from rankings import POSITION_OPTIONS, BATTING_RANK_METRICS, PITCHING_RANK_METRICS, batter_ranking, pitcher_ranking
+from warm_cache import CACHE_TABLES, fetch, source_table
+from session_memory import object_bytes, process_rss, new_registry, record_session, session_table, capacity_estimate
+from incremental import VIEWS as DERIVED_VIEWS, update as update_derived, load_view
+from archetypes import load_or_fit, assign_archetypes, archetype_center_table, archetype_composition
+from career_stats import CAREER_METRICS, player_keys, build_prefix, career_leaderboard, rolling_leaderboard, player_career
+from platoon import build_matchup_engine, matchup_matrix, league_sweep
+from team_strength import team_strength_table, strength_view
+from lineup import team_lineups
+from name_search import build_name_index, search_players
+from team_bootstrap import BOOTSTRAP_METRICS, bootstrap_team_metric
+from image_store import STORE_DIR, MANIFEST as IMAGE_MANIFEST, load_manifest as load_image_store_manifest, resolve_image, import_images
+from watcher import new_watcher, start_watching, scope_version, watched_content_version, watched_digests, appended_years, changed_since, changed_images, change_log
+from projections import PROJECTION_DIR, PROJECTION_COLUMNS, load_or_train as load_or_train_projection, project, with_projections
+from alignment import alignment_candidates, pack_candidates, depth_charts, depth_chart_table, alignment_totals, alignment_comparison
+from trait_index import TRAIT_DB, load_trait_table, build_trait_index, term_options, query, query_keys, key_mask
+from similarity import add_season, player_vector, similar_players, comps_table
+from clustering import (
+    kmeans_labels, cluster_frame, cluster_center_table, cluster_type_names, team_cluster_composition,
+)
 
 # フォントパス指定（Streamlit Cloud用に絶対パス化）
 import pathlib
 font_path = str(pathlib.Path("font/NotoSansJP-VariableFont_wght.ttf").resolve())
 
+# font/ が無い環境ではシステムにある日本語フォントを使う
+SYSTEM_CJK_FONTS = [
+    "Noto Sans CJK JP", "Noto Sans JP", "IPAexGothic", "IPAGothic",
+    "Hiragino Sans", "Yu Gothic", "Meiryo", "TakaoGothic", "VL Gothic",
+]
+
 # フォントを登録
-fm.fontManager.addfont(font_path)
-font_prop = fm.FontProperties(fname=font_path)
+if os.path.exists(font_path):
+    fm.fontManager.addfont(font_path)
+    font_prop = fm.FontProperties(fname=font_path)
+    font_families = [font_prop.get_name()]
+else:
+    installed = {f.name for f in fm.fontManager.ttflist}
+    font_families = [name for name in SYSTEM_CJK_FONTS if name in installed] or [mpl.rcParams["font.family"][0]]
+    font_prop = fm.FontProperties(family=font_families)
 
 # matplotlibにフォントを設定
-mpl.rcParams["font.family"] = font_prop.get_name()
+mpl.rcParams["font.family"] = font_families
 mpl.rcParams["axes.unicode_minus"] = False
 
 
@@ -30,34 +69,335 @@ TEAM_COLORS = {
     "marines": "#c0c0c0", "Buffaloes": "#000000", "fighters": "#01609a"
 }
 
+# 元データの表はプロセスに1つだけ持ち、全セッションで同じオブジェクトを読み取り専用で共有する
+# （st.cache_data は呼び出しごとにコピーを返すため、セッション数に比例してメモリが増える）
+# 共有した表は書き換えない。列の追加・型変換は assign などで新しい表を作る
+@st.cache_resource(max_entries=8)
+def load_shared_table(version, table):
+    return source_table(table)
+
+# DB と image/ の変更監視（プロセスに1つ。変更のあった (テーブル, 年度, チーム) の版番号だけが進む）
+@st.cache_resource
+def data_watcher():
+    watcher = new_watcher()
+    start_watching(watcher)
+    return watcher
+
+# キャッシュキー用の版番号（DB 全体の更新時刻の代わりに、使うテーブル・年度・チームの範囲だけを見る）
+def table_version(tables, year=None, teams=None):
+    return scope_version(data_watcher(), tables, year, teams)
+
+ROLE_TABLES = {"投手": "pitching_stats", "野手": "batting_stats"}
+
 # データ読み込み
 def load_data():
-    conn = sqlite3.connect("player_stats.db")
-    df = pd.read_sql_query("SELECT * FROM pitching_stats", conn)
-    conn.close()
-    return df
+    return load_shared_table(table_version("pitching_stats"), "pitching_stats")
 
 # 野手データ読み込み
 def load_batter_data():
-    conn = sqlite3.connect("player_stats.db")
-    df = pd.read_sql_query("SELECT * FROM batting_stats", conn)
-    conn.close()
-    return df
+    return load_shared_table(table_version("batting_stats"), "batting_stats")
 
 # 能力データ読み込み
 def load_ability_data():
-    conn = sqlite3.connect("player_stats.db")
-    df = pd.read_sql_query("SELECT * FROM ability_stats", conn)
-    conn.close()
-    return df
+    return load_shared_table(table_version("ability_stats"), "ability_stats")
+
+# 守備データ読み込み
+def load_defense_data():
+    return load_shared_table(table_version("defense_stats"), "defense_stats")
+
+# 年度別の派生ビュー（DB更新時は変更のあった年度パーティションだけ再計算される）
+@st.cache_resource(max_entries=16)
+def load_derived_view(version, view):
+    update_derived(views=[view])
+    return load_view(view)
+
+# 派生ビューが依存するテーブルの版番号
+def view_version(view):
+    return table_version(sorted({table for table, _ in DERIVED_VIEWS[view][0]}))
+
+# リーグ内分位表（年度パーティションを結合）
+@st.cache_resource(max_entries=2)
+def load_percentile_table(version):
+    table = {}
+    for part in load_derived_view(version, "percentiles").values():
+        table.update(part)
+    return table
+
+# 重い計算はデプロイ時に warm_cache.py が書き出した共有キャッシュを先に見る（無ければ計算して保存）
+# 共有キャッシュのディレクトリは DB の内容版（WAL のコミットも監視のダイジェストに反映される）、
+# st.cache_resource のキーは範囲ごとの版番号
+CACHE_LOADERS = {"pitch": load_data, "bat": load_batter_data, "ability": load_ability_data}
+
+def disk_cache_version():
+    return watched_content_version(data_watcher(), CACHE_TABLES)
+
+# 年齢×ポジション表のHTML（チーム・年度・モードごとにキャッシュ）
+@st.cache_resource
+def load_roster_grid_html(version, team, year, mode):
+    return fetch(disk_cache_version(), "roster_grid", (team, year, mode), CACHE_LOADERS)
+
+# クラスタリング入力・t-SNE・クラスタ数探索（DB更新時のみ再計算。スライダー操作はキャッシュ済みの結果を使う）
+@st.cache_resource
+def load_cluster_sweep(version, mode, year=None, teams=None, roster_team=None):
+    return fetch(disk_cache_version(), "cluster_sweep", (mode, year, teams, roster_team), CACHE_LOADERS)
+
+# クラスタ数の選択（自動: シルエット係数が最大の k）と各 k のスコア表示
+def choose_n_clusters(sweep, label, key):
+    auto = sweep is not None and st.checkbox("クラスタ数を自動選択（シルエット係数）", value=True, key=f"{key}_auto")
+    if auto:
+        n_clusters = sweep["best_k"]
+        st.caption(f"{label}: {n_clusters}（シルエット係数が最大）")
+    else:
+        n_clusters = st.slider(label, 2, 6, 3, key=key)
+    if sweep is not None:
+        st.line_chart(sweep["scores"], height=180)
+    return n_clusters
+
+# 投手の特性・球速・スタミナの転置索引（pitching_stats.db の更新時のみ作り直す）
+@st.cache_resource(max_entries=2)
+def load_trait_index(version):
+    return build_trait_index(load_trait_table())
+
+# サイドバーの特性検索（条件なしなら None、あれば一致した選手年度キー）
+def trait_search_keys():
+    index = load_trait_index(data_version(TRAIT_DB))
+    with st.sidebar.expander("🔎 投手の特性検索"):
+        traits = st.multiselect("特性（すべて満たす）", term_options(index, "特性"), key="trait_terms")
+        throws = st.multiselect("投", term_options(index, "投"), key="trait_throws")
+        roles = st.multiselect("役割", term_options(index, "役割"), key="trait_roles")
+        min_velocity = st.number_input("球速（以上）", 0, 170, 0, step=1, key="trait_velocity")
+        min_stamina = st.number_input("スタミナ（以上）", 0, 100, 0, step=1, key="trait_stamina")
+        terms = [f"特性:{t}" for t in traits]
+        any_terms = [[f"投:{t}" for t in throws], [f"役割:{r}" for r in roles]]
+        any_terms = [group for group in any_terms if group]
+        ranges = {"velocity": (min_velocity or None, None), "stamina": (min_stamina or None, None)}
+        if not terms and not any_terms and not min_velocity and not min_stamina:
+            return None
+        keys = query_keys(index, query(index, terms, ranges, any_terms))
+        st.caption(f"該当: {len(keys)}人・年度（ランキングとクラスタ分析に反映）")
+    return keys
+
+# 全年度・全球団の選手名索引（n-gram）
+@st.cache_resource(max_entries=2)
+def load_name_index(version):
+    return build_name_index({"野手": load_batter_data(), "投手": load_data()})
+
+# サマリーパネルの選手選択（検索語があれば全年度・全球団から一致度順、無ければ現在の絞り込みの選手）
+# 選手名は姓だけのことが多く同名の別人がいるので、(選手名, 生年月日) の組で選ぶ。戻り値もその組
+def summary_player_select(role, key):
+    text = st.text_input("🔍 選手名で検索（全年度・全球団、全角/半角・カナ揺れ対応）", key=f"{key}_search")
+    matches = search_players(load_name_index(table_version(["batting_stats", "pitching_stats"])), text, role=role) if text else pd.DataFrame()
+    if matches.empty:
+        if text:
+            st.info("一致する選手がいません。現在の絞り込みの選手から選んでください。")
+        source = df_filtered[df_filtered["選手名"].notna()]
+        player_index = player_keys(source)
+        options = pd.DataFrame({
+            "選手名": player_index.get_level_values(0), "生年月日": player_index.get_level_values(1),
+            "team_name": source["team_name"].to_numpy(),
+        }).drop_duplicates(["選手名", "生年月日"]).sort_values(["選手名", "team_name"], kind="stable")
+        labels = {(r.選手名, r.生年月日): f"{r.選手名}（{r.team_name}）" for r in options.itertuples()}
+    else:
+        st.dataframe(matches[["選手名", "team_name", "最初年度", "最終年度", "年数", "一致度"]], hide_index=True)
+        options = matches.drop_duplicates(["選手名", "生年月日"])
+        labels = {(r.選手名, r.生年月日): f"{r.選手名}（{r.team_name} {r.最初年度:.0f}–{r.最終年度:.0f}）" for r in options.itertuples()}
+    return st.selectbox("選手を選択", list(labels), format_func=labels.get, key=key)
+
+# (選手名, 生年月日) の組に当たる行（同名の別人を混ぜない）
+def player_rows(source, player):
+    player_index = player_keys(source)
+    return source[(player_index.get_level_values(0) == player[0]) & (player_index.get_level_values(1) == player[1])]
+
+# チーム別指標のブートストラップ（年度・指標・チームの組ごとにキャッシュ）
+@st.cache_resource(max_entries=32)
+def load_team_bootstrap(version, mode, year, metric, teams):
+    source = load_data() if mode == "投手" else load_batter_data()
+    return bootstrap_team_metric(take(source, rows_where(source, year, list(teams))), mode, metric)
+
+# チーム別比較の信頼区間と順位確率
+def show_team_uncertainty(mode, metric):
+    st.markdown("#### 📏 信頼区間と順位確率（選手単位のブートストラップ）")
+    if metric not in BOOTSTRAP_METRICS[mode]:
+        st.caption(f"{metric} は積み上げ項目から再計算できないため対象外です。")
+        return
+    result = load_team_bootstrap(table_version(ROLE_TABLES[mode], selected_year, selected_teams), mode, selected_year, metric, tuple(sorted(selected_teams)))
+    summary = result["summary"]
+    st.caption(f"各チームの選手を{result['n_resamples']:,}回復元抽出し、積み上げ項目の合計から{metric}を計算し直した"
+               f"{result['confidence']:.0%}区間です（点推定も合計からの再計算値）。")
+    fig, ax = plt.subplots(figsize=(8, 0.4 * len(summary) + 1))
+    y = np.arange(len(summary))
+    ax.errorbar(summary[metric], y, xerr=[summary[metric] - summary["下限"], summary["上限"] - summary[metric]],
+                fmt="none", ecolor="gray", capsize=3)
+    ax.scatter(summary[metric], y, color=[TEAM_COLORS.get(t, "#90caf9") for t in summary.index], edgecolors="black", zorder=3)
+    ax.set_yticks(y, summary.index)
+    ax.invert_yaxis()
+    ax.set_xlabel(metric)
+    ax.set_title(f"{selected_year}年 チーム別 {metric}（{result['confidence']:.0%}信頼区間）")
+    st.pyplot(fig)
+    st.dataframe(summary.round(3))
+    st.dataframe(result["rank_probs"].style.format("{:.1%}").background_gradient(cmap="Blues", axis=None))
+
+# 画像の保存先の manifest（image_store.py で取り込み済みなら (年度, ファイル名) → 内容 を1回の辞書引きで解決）
+# 起動後に追加・差し替えられた画像は、保存先があればその画像だけ取り込み直す
+@st.cache_resource(max_entries=2)
+def load_image_manifest(version, changed):
+    if changed and os.path.exists(os.path.join(STORE_DIR, IMAGE_MANIFEST)):
+        try:
+            import_images(files=list(changed))
+        except OSError:
+            pass
+    return load_image_store_manifest()
+
+# 選手画像の中身（保存先に無ければ image/<年度>/ のファイルパス、どちらも無ければ None）
+def player_image(year, filename):
+    manifest = load_image_manifest(data_version(os.path.join(STORE_DIR, IMAGE_MANIFEST)), changed_images(data_watcher()))
+    data = resolve_image(manifest, year, filename)
+    if data is not None:
+        return data
+    path = os.path.join(f"image/{int(year)}", filename)
+    return path if os.path.exists(path) else None
+
+# キャッシュ済みのラベル（探索範囲外の k はその場で計算）
+def sweep_labels(sweep, embedding, n_clusters):
+    if sweep is not None and n_clusters in sweep["labels"]:
+        return sweep["labels"][n_clusters]
+    return kmeans_labels(embedding, n_clusters)
+
+# 全年度共通アーキタイプ（保存済みの中心点に割り当てるだけなので t-SNE は不要）
+@st.cache_resource
+def load_archetype_assignments(version, mode):
+    source = load_data() if mode == "投手" else load_batter_data()
+    model = load_or_fit(source, mode)
+    return model, assign_archetypes(model, source)
+
+# 翌年度予測（保存済みの最新版モデルで全選手分を1回で計算。DB かモデルの版が変われば計算し直す）
+@st.cache_resource(max_entries=4)
+def load_projections(version, model_version, role):
+    source = load_data() if role == "投手" else load_batter_data()
+    return project(load_or_train_projection(source, role), source)
+
+# モンテカルロ順位予測（年度・試行回数ごとにキャッシュ）
+@st.cache_resource
+def load_standings_projection(version, year, n_sims):
+    return fetch(disk_cache_version(), "standings", (year, n_sims), CACHE_LOADERS)
+
+# 前回作った類似選手の索引（(役割, 能力値の有無) → (索引, 作成時のダイジェスト)）
+@st.cache_resource
+def similarity_builds():
+    return {}
+
+# 類似選手検索の索引（役割・能力値の有無ごとにキャッシュ）
+# 前回から年度が追加されただけなら、その年度の木だけを作って前回の索引に足す
+@st.cache_resource
+def load_similarity_index(version, role, use_ability):
+    tables = [ROLE_TABLES[role], "ability_stats"] if use_ability else [ROLE_TABLES[role]]
+    digests = watched_digests(data_watcher(), tables)
+    builds = similarity_builds()
+    previous = builds.get((role, use_ability))
+    years = appended_years(previous[1], digests) if previous else None
+    if years:
+        source = load_data() if role == "投手" else load_batter_data()
+        season = source[pd.to_numeric(source["year"], errors="coerce").isin(years)]
+        index = add_season(previous[0], season, load_ability_data() if use_ability else None)
+    else:
+        index = fetch(disk_cache_version(), "similarity_index", (role, use_ability), CACHE_LOADERS)
+    builds[(role, use_ability)] = (index, digests)
+    return index
+
+# 通算・複数年成績の累積和（選手 × 年度。DB更新時に1回だけ作る）
+@st.cache_resource(max_entries=4)
+def load_career_prefix(version, role):
+    return build_prefix(load_data() if role == "投手" else load_batter_data(), role)
+
+# 通算成績の投球回は丸めずに集計されているので、表示のときだけ小数1桁にする
+IP_DISPLAY_DIGITS = {"IP_": 1}
+
+# 通算（年度範囲）・連続n年のランキング
+def show_career_leaderboards(role):
+    st.markdown("### 📚 通算・複数年ランキング")
+    prefix = load_career_prefix(table_version(ROLE_TABLES[role]), role)
+    all_years = [int(y) for y in prefix["years"]]
+    qualify_label = "最低打席数（期間合計）" if role == "野手" else "最低投球回（期間合計）"
+    col1, col2 = st.columns(2)
+    with col1:
+        career_metric = st.selectbox("指標", CAREER_METRICS[role], key=f"career_metric_{role}")
+        career_ascending = st.radio("並べ替え順", ["昇順", "降順"], index=0 if career_metric in ("防御率", "WHIP", "四球率", "被打率") else 1,
+                                    horizontal=True, key=f"career_order_{role}") == "昇順"
+    with col2:
+        min_qualify = st.number_input(qualify_label, 0, 20000, 300 if role == "野手" else 50, step=50, key=f"career_min_{role}")
+        career_top_n = st.slider("表示件数", 5, 50, 10, key=f"career_top_{role}")
+    if len(all_years) > 1:
+        year_range = st.select_slider("年度範囲", options=all_years, value=(all_years[0], all_years[-1]), key=f"career_range_{role}")
+    else:
+        year_range = (all_years[0], all_years[0]) if all_years else (selected_year, selected_year)
+    st.dataframe(career_leaderboard(prefix, career_metric, year_range[0], year_range[1], min_qualify, career_ascending, career_top_n).round(IP_DISPLAY_DIGITS), hide_index=True)
+
+    n_years = st.slider("連続年数", 1, len(all_years), min(3, len(all_years)), key=f"rolling_n_{role}") if len(all_years) > 1 else 1
+    st.markdown(f"#### 連続{n_years}年のベスト区間")
+    st.dataframe(rolling_leaderboard(prefix, career_metric, n_years, min_qualify, career_ascending, career_top_n).round(IP_DISPLAY_DIGITS), hide_index=True)
+
+# 全年度 × 全チームの得失点・ピタゴラス勝率（DB更新時に1回だけ集計）
+@st.cache_resource(max_entries=2)
+def load_team_strength(version):
+    return team_strength_table(load_batter_data(), load_data())
+
+# 主力9人の最適打順（年度ごとに12球団分をまとめて計算）
+@st.cache_resource(max_entries=4)
+def load_team_lineups(version, year):
+    df_regulars = load_derived_view(view_version("regulars"), "regulars").get(int(year))
+    if df_regulars is None:
+        df_regulars = regulars_table(load_defense_data(), load_batter_data(), load_ability_data(), year)
+    return team_lineups(df_regulars, load_batter_data(), year)
+
+# 守備配置の候補（年度ごとに12球団分を配列に詰めておき、割り当ての解き直しは毎回その場で行う）
+@st.cache_resource(max_entries=4)
+def load_alignment_candidates(version, year):
+    return pack_candidates(alignment_candidates(load_ability_data(), load_batter_data(), year))
+
+# 左右の対戦行列（年度ごとに全打者 × 全投手を1回だけ作る）
+@st.cache_resource(max_entries=8)
+def load_matchup_engine(version, year):
+    return build_matchup_engine(load_batter_data(), load_data(), year)
+
+# チームの組み合わせごとの対戦表（年度 × 打撃側 × 投手側でキャッシュ）
+@st.cache_resource(max_entries=512)
+def load_matchup_matrix(version, year, bat_team, pitch_team, value):
+    return matchup_matrix(load_matchup_engine(version, year), bat_team, pitch_team, value)
+
+# 監視で変更が見つかったら開いているセッションを再実行する（変更範囲外のキャッシュはそのまま使われる）
+@st.fragment(run_every=2)
+def refresh_on_data_change():
+    watcher = data_watcher()
+    seen = st.session_state.setdefault("watch_generation", watcher["generation"])
+    if changed_since(watcher, seen):
+        st.session_state["watch_generation"] = watcher["generation"]
+        st.rerun(scope="app")
+
+# 全セッション共通のセッション記録（メモリ使用量の表示用）
+@st.cache_resource
+def session_registry():
+    return new_registry()
+
+# サマリーパネルの類似選手（全年度から k 人）
+def show_similar_players(role, source, latest, key):
+    st.markdown("#### 🔍 類似選手（全年度）")
+    use_ability = False
+    if role == "野手":
+        use_ability = st.checkbox("能力値も考慮する", value=False, key=f"{key}_ability")
+    k = st.slider("表示人数", 3, 15, 5, key=f"{key}_k")
+    index = load_similarity_index(table_version([ROLE_TABLES[role], "ability_stats"] if use_ability else ROLE_TABLES[role]), role, use_ability)
+    player_key = (latest["選手名"], latest["team_name"], pd.to_numeric(latest["year"], errors="coerce"))
+    vector = player_vector(index, source, player_key, load_ability_data() if use_ability else None)
+    if vector is None:
+        st.info("類似選手の検索に必要な指標が欠損しています。")
+        return
+    comps = similar_players(index, vector, k=k, exclude=player_key)
+    st.dataframe(comps_table(comps, source, role), hide_index=True)
 
 df = load_data()
 df_batter = pd.DataFrame()
-
-df["year"] = pd.to_numeric(df["year"], errors="coerce")
-df["IP_"] = pd.to_numeric(df["IP_"], errors="coerce")
-df["登板"] = pd.to_numeric(df["登板"], errors="coerce")
-df["先発"] = pd.to_numeric(df["先発"], errors="coerce")
+percentile_table = load_percentile_table(view_version("percentiles"))
+# year・IP_・登板・先発などは typed_frame で読み込み時に数値化済み
 
 
 # フィルター
@@ -79,21 +419,26 @@ with st.sidebar:
         selected_teams = teams
     # モード選択: 「投手」「野手」のみ
     mode = st.radio("モード選択", ["投手", "野手"])
-
-# グローバルフィルター
+trait_keys = trait_search_keys() if mode == "投手" else None
+with st.sidebar:
+    refresh_on_data_change()
+    recent_changes = change_log(data_watcher())
+    if not recent_changes.empty:
+        with st.expander("🔄 データ更新の検知"):
+            latest_change = recent_changes.iloc[-1]
+            st.caption(f"最終更新 {latest_change['time']:%H:%M:%S}（{latest_change['table']} {latest_change['year']}年）")
+            st.dataframe(recent_changes.tail(20).iloc[::-1], hide_index=True)
+
+# グローバルフィルター（行番号で絞り込み、各タブは必要な列だけを取り出す）
 df_filtered = pd.DataFrame()  # 初期化
 df_batter = pd.DataFrame()    # 初期化
 if mode == "投手":
-    df_filtered = df[(df["year"] == selected_year) & (df["team_name"].isin(selected_teams))]
+    df_filtered = take(df, rows_where(df, selected_year, selected_teams))
 elif mode == "野手":
     df_batter = load_batter_data()
-    for col in ["1", "2", "3", "4", "5"]:
-        if col in df_batter.columns:
-            df_batter[col] = df_batter[col].astype(str)
-    df_batter["year"] = pd.to_numeric(df_batter["year"], errors="coerce")
-    df_filtered = df_batter[(df_batter["year"] == selected_year) & (df_batter["team_name"].isin(selected_teams))]
+    df_filtered = take(df_batter, rows_where(df_batter, selected_year, selected_teams))
 
-tabs = st.tabs([
+TAB_NAMES = [
     "🏆 項目別ランキング",
     "📈 昨年→今年 比較ランキング",
     "📊 年度別推移",
@@ -104,48 +449,38 @@ tabs = st.tabs([
     "🧱 選手層（年齢×ポジション）",
     "🧍 ポジション別出場主力",
     "🏆 タイトル・順位",
-    "🧠 クラスタ分析（リーグ・チーム別）"
-])
+    "🧠 クラスタ分析（リーグ・チーム別）",
+    "⚔️ 左右の対戦相性",
+]
+tabs = st.tabs(TAB_NAMES)
 
 # 今後、各タブに処理を追加していく（この構造で分岐・分割）
 
-with tabs[0]:
+with tabs[0], alloc_probe(TAB_NAMES[0]):
     if mode == "野手":
         st.write("### 野手ランキング")
 
         # フィルター設定（最低打席数）
         min_pa = st.slider("最低打席数", 0, 700, 50)
 
-        df_bat_rank = df_filtered.copy()
-        df_bat_rank["打席"] = pd.to_numeric(df_bat_rank["打席"], errors="coerce")
-        df_bat_rank = df_bat_rank[df_bat_rank["打席"] >= min_pa]
-
         # 年齢フィルター追加
         min_age, max_age = st.slider("年齢範囲を選択", 18, 45, (18, 45))
-        df_bat_rank["age"] = pd.to_numeric(df_bat_rank["age"], errors="coerce")
-        df_bat_rank = df_bat_rank[(df_bat_rank["age"] >= min_age) & (df_bat_rank["age"] <= max_age)]
 
         # ポジションフィルター
-        position_options = ["捕", "一", "二", "三", "遊", "左", "中", "右"]
-        selected_positions = st.multiselect("ポジションを選択（複数選択可）", position_options, default=position_options)
+        selected_positions = st.multiselect("ポジションを選択（複数選択可）", POSITION_OPTIONS, default=POSITION_OPTIONS)
 
-        def position_filter(pos):
-            if isinstance(pos, str):
-                return any(p in pos for p in selected_positions)
-            return False
-
-        df_bat_rank = df_bat_rank[df_bat_rank["position"].apply(position_filter)]
-
-        bat_metrics = ["打率", "出塁率", "長打率", "OPS", "本塁打", "打点", "得点", "四球", "三振", "盗塁"]
-        bat_metric = st.selectbox("ランキング指標を選択", bat_metrics, index=3)
+        bat_metric = st.selectbox("ランキング指標を選択", BATTING_RANK_METRICS + PROJECTION_COLUMNS["野手"], index=3)
         ascending = st.radio("並べ替え順", ["昇順", "降順"], index=1) == "昇順"
         top_n = st.slider("表示件数", 1, 30, 10)
 
-        df_bat_rank[bat_metric] = pd.to_numeric(df_bat_rank[bat_metric], errors="coerce")
-        df_bat_rank = df_bat_rank.dropna(subset=[bat_metric])
-        df_bat_rank = df_bat_rank.sort_values(bat_metric, ascending=ascending).head(top_n)
+        projection_cols = PROJECTION_COLUMNS["野手"]
+        df_rank_source = with_projections(df_filtered, load_projections(table_version("batting_stats"), data_version(PROJECTION_DIR), "野手"))
+        df_bat_rank = batter_ranking(
+            df_rank_source, bat_metric, min_pa=min_pa, age_range=(min_age, max_age),
+            positions=selected_positions, ascending=ascending, top_n=top_n
+        )
 
-        st.dataframe(df_bat_rank[["選手名", "team_name", "year", bat_metric]])
+        st.dataframe(df_bat_rank[["選手名", "team_name", "year", *dict.fromkeys([bat_metric, *projection_cols])]])
 
         fig, ax = plt.subplots(figsize=(8, 4))
         bars = ax.barh(df_bat_rank["選手名"], df_bat_rank[bat_metric], color="#81c784")
@@ -161,41 +496,24 @@ with tabs[0]:
         min_starts = st.slider("最低先発数", 0, 30, 0)
         min_reliever = st.slider("最低中継ぎ登板数", 0, 100, 0)
         
-        metrics_options = [
-            "防御率","投球回","勝率","勝","敗","セーブ","HP",
-            "登板", "先発", "完封", "完投", "QS", "QS率", "HQS","HQS率",
-            "奪三振", "奪三率", "与四球", "四球率", "与死球", "死球率",
-            "被安打", "被打率", "圏打率", "圏率差", "圏安打",
-            "右被率", "右率差", "右被安", "左被率", "左率差",
-            "被本率", "K/BB", "WHIP", "許盗率", "暴投",
-            "K/9", "BB/9", "K-BB%", "Command+"
-        ]
-        metric = st.selectbox("ランキング指標を選択", metrics_options, index=0)
+        metric = st.selectbox("ランキング指標を選択", PITCHING_RANK_METRICS + PROJECTION_COLUMNS["投手"], index=0)
         ascending = st.radio("並べ替え順", ["昇順", "降順"]) == "昇順"
         top_n = st.slider("表示件数", 1, 30, 10)
 
-        # 指標数値変換
-        df_rank = df_filtered.copy()
-        for col in [metric, "IP_", "登板", "先発"]:
-            if isinstance(col, str) and col in df_rank.columns:
-                df_rank[col] = pd.to_numeric(df_rank[col], errors="coerce")
-
+        projection_cols = PROJECTION_COLUMNS["投手"]
+        df_rank_source = with_projections(df_filtered, load_projections(table_version("pitching_stats"), data_version(PROJECTION_DIR), "投手"))
         # カラム存在チェック
-        if metric not in df_rank.columns:
+        if metric not in df_rank_source.columns:
             st.warning(f"選択された指標 '{metric}' はデータに存在しません。")
             st.stop()
-        df_rank = df_rank.dropna(subset=[metric])
-        df_rank["中継ぎ"] = (df_rank["登板"] - df_rank["先発"]).abs()
-        df_rank = df_rank[
-            (df_rank["IP_"] >= min_ip) &
-            (df_rank["登板"] >= min_games) &
-            (df_rank["先発"] >= min_starts) &
-            (df_rank["中継ぎ"] >= min_reliever)
-        ]
-
-        df_rank = df_rank.sort_values(metric, ascending=ascending).head(top_n)
+        if trait_keys is not None:
+            df_rank_source = df_rank_source[key_mask(df_rank_source, trait_keys)]
+        df_rank = pitcher_ranking(
+            df_rank_source, metric, min_ip=min_ip, min_games=min_games, min_starts=min_starts,
+            min_reliever=min_reliever, ascending=ascending, top_n=top_n
+        )
 
-        st.dataframe(df_rank[["選手名", "team_name", "year", metric]])
+        st.dataframe(df_rank[["選手名", "team_name", "year", *dict.fromkeys([metric, *projection_cols])]])
 
         # 棒グラフ
         fig, ax = plt.subplots(figsize=(8, 4))
@@ -206,22 +524,23 @@ with tabs[0]:
         st.pyplot(fig)
     else:
         pass
+    show_career_leaderboards(mode)
 
-with tabs[1]:
+with tabs[1], alloc_probe(TAB_NAMES[1]):
     if mode == "野手":
         st.info("野手モードは現在未実装です。")
     elif mode == "投手":
         pass
     st.write("### 昨年→今年 比較ランキング（未実装）")
 
-with tabs[2]:
+with tabs[2], alloc_probe(TAB_NAMES[2]):
     if mode == "野手":
         st.info("野手モードは現在未実装です。")
     elif mode == "投手":
         pass
     st.write("### 年度別推移（未実装）")
 
-with tabs[3]:
+with tabs[3], alloc_probe(TAB_NAMES[3]):
     if mode == "野手":
         st.write("### チーム別成績比較（野手）")
 
@@ -230,65 +549,8 @@ with tabs[3]:
         ])
         ascending = st.radio("並び替え", ["昇順", "降順"], index=1) == "昇順"
 
-        df_team = df_filtered.copy()
-        df_team[metric] = pd.to_numeric(df_team[metric], errors="coerce")
-        df_team["打席"] = pd.to_numeric(df_team["打席"], errors="coerce")
-
-        # Define weighted average metrics and their weighting columns
-        BATTING_WEIGHTED_METRICS = {
-            "打率": "打数",
-            "出塁率": "打数",
-            "長打率": "打数",
-            "OPS": "打数",
-            "盗塁率": "盗塁企画",  # assuming exists; otherwise remove
-            "三振率": "打席",
-            "アダム・ダン率": "打席",
-        }
-
-        # Calculate derived columns if needed
-        if metric == "アダム・ダン率":
-            df_team["四球"] = pd.to_numeric(df_team["四球"], errors="coerce")
-            df_team["三振"] = pd.to_numeric(df_team["三振"], errors="coerce")
-            df_team["本塁打"] = pd.to_numeric(df_team["本塁打"], errors="coerce")
-            df_team["アダム・ダン率"] = (df_team["四球"] + df_team["三振"] + df_team["本塁打"]) / df_team["打席"]
-        if metric == "OPS":
-            # OPS = 出塁率 + 長打率
-            df_team["出塁率"] = pd.to_numeric(df_team["出塁率"], errors="coerce")
-            df_team["長打率"] = pd.to_numeric(df_team["長打率"], errors="coerce")
-            df_team["OPS"] = df_team["出塁率"] + df_team["長打率"]
-        if metric == "打率":
-            df_team["安打"] = pd.to_numeric(df_team.get("安打", None), errors="coerce")
-            df_team["打数"] = pd.to_numeric(df_team.get("打数", None), errors="coerce")
-            df_team["打率"] = df_team["安打"] / df_team["打数"]
-        if metric == "盗塁率":
-            if "盗塁企画" in df_team.columns and "盗塁" in df_team.columns:
-                df_team["盗塁"] = pd.to_numeric(df_team["盗塁"], errors="coerce")
-                df_team["盗塁企画"] = pd.to_numeric(df_team["盗塁企画"], errors="coerce")
-                df_team["盗塁率"] = df_team["盗塁"] / df_team["盗塁企画"]
-        if metric == "三振率":
-            # 三振率 = 三振 / 打席
-            df_team["三振"] = pd.to_numeric(df_team["三振"], errors="coerce")
-            df_team["三振率"] = df_team["三振"] / df_team["打席"]
-
-        # Use weighted average if applicable
-        if metric in BATTING_WEIGHTED_METRICS:
-            weight_col = BATTING_WEIGHTED_METRICS[metric]
-            if weight_col in df_team.columns:
-                df_team[weight_col] = pd.to_numeric(df_team[weight_col], errors="coerce")
-                df_team[metric] = pd.to_numeric(df_team[metric], errors="coerce")
-                df_team = df_team.dropna(subset=[metric, weight_col])
-                df_team["weighted_value"] = df_team[metric] * df_team[weight_col]
-                df_grouped = df_team.groupby("team_name").agg({
-                    "weighted_value": "sum",
-                    weight_col: "sum"
-                })
-                df_grouped[metric] = df_grouped["weighted_value"] / df_grouped[weight_col]
-                df_grouped = df_grouped[metric].dropna().sort_values(ascending=ascending)
-            else:
-                # fallback to mean if weight column not present
-                df_grouped = df_team.groupby("team_name")[metric].mean().dropna().sort_values(ascending=ascending)
-        else:
-            df_grouped = df_team.groupby("team_name")[metric].mean().dropna().sort_values(ascending=ascending)
+        # 加重平均対象の指標は打数・打席で加重してチーム別に集計
+        df_grouped = team_batting_values(df_filtered, metric).sort_values(ascending=ascending)
 
         # 横並びレイアウト
         col1, col2 = st.columns([2, 1])
@@ -304,74 +566,20 @@ with tabs[3]:
         with col2:
             st.dataframe(df_grouped.reset_index().rename(columns={metric: f"{metric}"}))
 
+        show_team_uncertainty(mode, metric)
+
         # --- 上位/下位チーム一覧 追加 ---
         st.markdown("### 各指標で上位/下位チーム一覧")
 
         display_mode = st.radio("表示モード", ["上位3チーム", "ワースト3チーム"], key="batting_summary_display")
 
-        summary_results = []
-        bat_metrics_list = [
-            "打率", "出塁率", "長打率", "OPS", "本塁打", "打点", "得点", "盗塁", "四球", "三振", "アダム・ダン率"
-        ]
-        for m in bat_metrics_list:
-            try:
-                temp = df_filtered.copy()
-                temp["打席"] = pd.to_numeric(temp["打席"], errors="coerce")
-                temp["打数"] = pd.to_numeric(temp["打数"], errors="coerce")
-
-                if m == "アダム・ダン率":
-                    temp["四球"] = pd.to_numeric(temp["四球"], errors="coerce")
-                    temp["三振"] = pd.to_numeric(temp["三振"], errors="coerce")
-                    temp["本塁打"] = pd.to_numeric(temp["本塁打"], errors="coerce")
-                    temp[m] = (temp["四球"] + temp["三振"] + temp["本塁打"]) / temp["打席"]
-                    weight_col = "打席"
-                elif m == "OPS":
-                    temp["出塁率"] = pd.to_numeric(temp["出塁率"], errors="coerce")
-                    temp["長打率"] = pd.to_numeric(temp["長打率"], errors="coerce")
-                    temp[m] = temp["出塁率"] + temp["長打率"]
-                    weight_col = "打数"
-                elif m == "打率":
-                    temp["安打"] = pd.to_numeric(temp["安打"], errors="coerce")
-                    temp[m] = temp["安打"] / temp["打数"]
-                    weight_col = "打数"
-                elif m == "盗塁率":
-                    temp["盗塁"] = pd.to_numeric(temp["盗塁"], errors="coerce")
-                    temp["盗塁企画"] = pd.to_numeric(temp.get("盗塁企画", 0), errors="coerce")
-                    temp[m] = temp["盗塁"] / temp["盗塁企画"]
-                    weight_col = "盗塁企画"
-                elif m == "三振率":
-                    temp["三振"] = pd.to_numeric(temp["三振"], errors="coerce")
-                    temp[m] = temp["三振"] / temp["打席"]
-                    weight_col = "打席"
-                else:
-                    temp[m] = pd.to_numeric(temp[m], errors="coerce")
-                    weight_col = "打数"
-
-                temp = temp.dropna(subset=[m, weight_col])
-                temp["weighted_value"] = temp[m] * temp[weight_col]
-                g = temp.groupby("team_name").agg({"weighted_value": "sum", weight_col: "sum"})
-                g["値"] = g["weighted_value"] / g[weight_col]
-                g = g.dropna()
-
-                is_better_high = m not in ["三振", "三振率"]
-                sorted_g = g.sort_values("値", ascending=not is_better_high) if display_mode == "上位3チーム" else g.sort_values("値", ascending=is_better_high)
-                top_df = sorted_g.head(3)
-
-                result_row = {"指標": m}
-                for idx, (team, row) in enumerate(top_df.iterrows(), 1):
-                    result_row[f"{idx}位チーム"] = team
-                    result_row[f"{idx}位値"] = round(row["値"], 3)
-                summary_results.append(result_row)
-
-            except Exception:
-                continue
+        df_summary = top_team_summary(df_filtered, mode, display_mode)
 
         # チーム名カラー反映用関数
         def color_team_name(team_name):
             color = TEAM_COLORS.get(team_name, "#000000")
             return f'<span style="color:{color}">{team_name}</span>'
 
-        df_summary = pd.DataFrame(summary_results).copy()
         for rank in [1, 2, 3]:
             col = f"{rank}位チーム"
             if col in df_summary.columns:
@@ -389,115 +597,8 @@ with tabs[3]:
         ])
         ascending = st.radio("並び替え", ["昇順", "降順"]) == "昇順"
 
-        # 指標ごとの集計方式
-        AGG_METHOD = {
-            "防御率": "weighted_era",
-            "奪三振": "sum",
-            "与四球": "sum",
-            "被安打": "sum",
-            "被本率": "weighted_hr9",
-            "WHIP": "recalc_whip",
-            "K/9": "weighted_k9",
-            "BB/9": "weighted_bb9",
-            "QS率": "weighted_qs",
-            "K/BB": "recalc_kbb",
-            "被打率": "recalc_avg",
-            "HQS率": "weighted_hqs",
-            "奪三率": "weighted_k9",
-            "四球率": "weighted_bb9",
-            "完封": "sum",
-            "完投": "sum",
-            "与死球": "sum",
-            "許盗率": "weighted_sb",
-            "勝-セーブ": "sum_diff_win_sv",
-        }
-
-        df_team = df_filtered.copy()
-        agg_type = AGG_METHOD.get(metric, "mean")
-        if metric not in ["勝-セーブ"]:  # 実在しない列はスキップ
-            df_team[metric] = pd.to_numeric(df_team[metric], errors="coerce")
-        df_team["IP_"] = pd.to_numeric(df_team["IP_"], errors="coerce")
-
-        if agg_type == "weighted_era":
-            df_team["自責点"] = df_team["防御率"] * df_team["IP_"] / 9
-            df_grouped = df_team.groupby("team_name").agg({"自責点": "sum", "IP_": "sum"})
-            df_grouped["防御率"] = df_grouped["自責点"] / df_grouped["IP_"] * 9
-            df_grouped = df_grouped["防御率"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_hr9":
-            df_team["被本率"] = pd.to_numeric(df_team["被本率"], errors="coerce")
-            df_team["被本数_推定"] = df_team["被本率"] * df_team["IP_"] / 9
-            df_grouped = df_team.groupby("team_name").agg({"被本数_推定": "sum", "IP_": "sum"})
-            df_grouped["被本率"] = df_grouped["被本数_推定"] / df_grouped["IP_"] * 9
-            df_grouped = df_grouped["被本率"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "recalc_whip":
-            df_team["WHIP"] = pd.to_numeric(df_team["WHIP"], errors="coerce")
-            df_team["被安打"] = pd.to_numeric(df_team["被安打"], errors="coerce")
-            df_team["与四球"] = pd.to_numeric(df_team["与四球"], errors="coerce")
-            df_team["WHIP_分子"] = df_team["被安打"] + df_team["与四球"]
-            df_grouped = df_team.groupby("team_name").agg({"WHIP_分子": "sum", "IP_": "sum"})
-            df_grouped["WHIP"] = df_grouped["WHIP_分子"] / df_grouped["IP_"]
-            df_grouped = df_grouped["WHIP"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_k9":
-            df_team["奪三振"] = pd.to_numeric(df_team["奪三振"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"奪三振": "sum", "IP_": "sum"})
-            df_grouped["K/9"] = df_grouped["奪三振"] / df_grouped["IP_"] * 9
-            df_grouped = df_grouped["K/9"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_bb9":
-            df_team["与四球"] = pd.to_numeric(df_team["与四球"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"与四球": "sum", "IP_": "sum"})
-            df_grouped["BB/9"] = df_grouped["与四球"] / df_grouped["IP_"] * 9
-            df_grouped = df_grouped["BB/9"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_qs":
-            df_team["QS"] = pd.to_numeric(df_team["QS"], errors="coerce")
-            df_team["先発"] = pd.to_numeric(df_team["先発"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"QS": "sum", "先発": "sum"})
-            df_grouped["QS率"] = df_grouped["QS"] / df_grouped["先発"]
-            df_grouped = df_grouped["QS率"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "recalc_kbb":
-            df_team["奪三振"] = pd.to_numeric(df_team["奪三振"], errors="coerce")
-            df_team["与四球"] = pd.to_numeric(df_team["与四球"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"奪三振": "sum", "与四球": "sum"})
-            df_grouped["K/BB"] = df_grouped["奪三振"] / df_grouped["与四球"]
-            df_grouped = df_grouped["K/BB"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "recalc_avg":
-            df_team["被安打"] = pd.to_numeric(df_team["被安打"], errors="coerce")
-            df_team["打数"] = pd.to_numeric(df_team["打数"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"被安打": "sum", "打数": "sum"})
-            df_grouped["被打率"] = df_grouped["被安打"] / df_grouped["打数"]
-            df_grouped = df_grouped["被打率"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_hqs":
-            df_team["HQS"] = pd.to_numeric(df_team["HQS"], errors="coerce")
-            df_team["先発"] = pd.to_numeric(df_team["先発"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"HQS": "sum", "先発": "sum"})
-            df_grouped["HQS率"] = df_grouped["HQS"] / df_grouped["先発"]
-            df_grouped = df_grouped["HQS率"].dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "sum_diff_win_sv":
-            df_team["勝"] = pd.to_numeric(df_team["勝"], errors="coerce")
-            df_team["セーブ"] = pd.to_numeric(df_team["セーブ"], errors="coerce")
-            df_team["勝-セーブ"] = df_team["勝"] - df_team["セーブ"]
-            df_grouped = df_team.groupby("team_name")["勝-セーブ"].sum().dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "sum":
-            df_grouped = df_team.groupby("team_name")[metric].sum().dropna().sort_values(ascending=ascending)
-
-        elif agg_type == "weighted_sb":
-            df_team["許盗数"] = pd.to_numeric(df_team["許盗数"], errors="coerce")
-            df_team["被盗企"] = pd.to_numeric(df_team["被盗企"], errors="coerce")
-            df_grouped = df_team.groupby("team_name").agg({"許盗数": "sum", "被盗企": "sum"})
-            df_grouped["許盗率"] = df_grouped["許盗数"] / df_grouped["被盗企"]
-            df_grouped = df_grouped["許盗率"].dropna().sort_values(ascending=ascending)
-
-        else:
-            df_grouped = df_team.groupby("team_name")[metric].mean().dropna().sort_values(ascending=ascending)
+        # 指標ごとの集計方式は team_compare.PITCHING_AGG_METHOD を参照
+        df_grouped = team_pitching_values(df_filtered, metric).sort_values(ascending=ascending)
 
         # 横並びレイアウト
         col1, col2 = st.columns([2, 1])
@@ -513,99 +614,19 @@ with tabs[3]:
         with col2:
             st.dataframe(df_grouped.reset_index().rename(columns={metric: f"{metric}"}))
 
+        show_team_uncertainty(mode, metric)
+
         st.markdown("### 各指標で上位/下位チーム一覧")
 
         display_mode = st.radio("表示モード", ["上位3チーム", "ワースト3チーム"])
 
-        summary_results = []
-        for m, agg in AGG_METHOD.items():
-            try:
-                temp = df_team.copy()
-                temp["IP_"] = pd.to_numeric(temp["IP_"], errors="coerce")
-
-                if agg == "weighted_era":
-                    temp["自責点"] = pd.to_numeric(temp["防御率"], errors="coerce") * temp["IP_"] / 9
-                    g = temp.groupby("team_name").agg({"自責点": "sum", "IP_": "sum"})
-                    g["値"] = g["自責点"] / g["IP_"] * 9
-                elif agg == "weighted_hr9":
-                    temp["被本率"] = pd.to_numeric(temp["被本率"], errors="coerce")
-                    temp["被本数_推定"] = temp["被本率"] * temp["IP_"] / 9
-                    g = temp.groupby("team_name").agg({"被本数_推定": "sum", "IP_": "sum"})
-                    g["値"] = g["被本数_推定"] / g["IP_"] * 9
-                elif agg == "recalc_whip":
-                    temp["被安打"] = pd.to_numeric(temp["被安打"], errors="coerce")
-                    temp["与四球"] = pd.to_numeric(temp["与四球"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"被安打": "sum", "与四球": "sum", "IP_": "sum"})
-                    g["値"] = (g["被安打"] + g["与四球"]) / g["IP_"]
-                elif agg == "weighted_k9":
-                    temp["奪三振"] = pd.to_numeric(temp["奪三振"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"奪三振": "sum", "IP_": "sum"})
-                    g["値"] = g["奪三振"] / g["IP_"] * 9
-                elif agg == "weighted_bb9":
-                    temp["与四球"] = pd.to_numeric(temp["与四球"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"与四球": "sum", "IP_": "sum"})
-                    g["値"] = g["与四球"] / g["IP_"] * 9
-                elif agg == "weighted_qs":
-                    temp["QS"] = pd.to_numeric(temp["QS"], errors="coerce")
-                    temp["先発"] = pd.to_numeric(temp["先発"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"QS": "sum", "先発": "sum"})
-                    g["値"] = g["QS"] / g["先発"]
-                elif agg == "recalc_kbb":
-                    temp["奪三振"] = pd.to_numeric(temp["奪三振"], errors="coerce")
-                    temp["与四球"] = pd.to_numeric(temp["与四球"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"奪三振": "sum", "与四球": "sum"})
-                    g["値"] = g["奪三振"] / g["与四球"]
-                elif agg == "recalc_avg":
-                    temp["被安打"] = pd.to_numeric(temp["被安打"], errors="coerce")
-                    temp["打数"] = pd.to_numeric(temp["打数"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"被安打": "sum", "打数": "sum"})
-                    g["値"] = g["被安打"] / g["打数"]
-                elif agg == "weighted_hqs":
-                    temp["HQS"] = pd.to_numeric(temp["HQS"], errors="coerce")
-                    temp["先発"] = pd.to_numeric(temp["先発"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"HQS": "sum", "先発": "sum"})
-                    g["値"] = g["HQS"] / g["先発"]
-                elif agg == "sum_diff_win_sv":
-                    temp["勝"] = pd.to_numeric(temp["勝"], errors="coerce")
-                    temp["セーブ"] = pd.to_numeric(temp["セーブ"], errors="coerce")
-                    temp["値"] = temp["勝"] - temp["セーブ"]
-                    g = temp.groupby("team_name")["値"].sum().to_frame()
-                elif agg == "sum":
-                    temp[m] = pd.to_numeric(temp[m], errors="coerce")
-                    g = temp.groupby("team_name")[m].sum().to_frame(name="値")
-                elif agg == "weighted_sb":
-                    temp["許盗数"] = pd.to_numeric(temp["許盗数"], errors="coerce")
-                    temp["被盗企"] = pd.to_numeric(temp["被盗企"], errors="coerce")
-                    g = temp.groupby("team_name").agg({"許盗数": "sum", "被盗企": "sum"})
-                    g["値"] = g["許盗数"] / g["被盗企"]
-                else:
-                    temp[m] = pd.to_numeric(temp[m], errors="coerce")
-                    g = temp.groupby("team_name")[m].mean().to_frame(name="値")
-
-                g = g.dropna()
-                is_better_high = m not in ["防御率", "与四球", "与死球", "被安打", "被本率", "BB/9", "四球率", "被打率", "許盗率", "WHIP"]
-                if display_mode == "上位3チーム":
-                    sorted_g = g.sort_values("値", ascending=not is_better_high)
-                    top_df = sorted_g.head(3)
-                else:
-                    sorted_g = g.sort_values("値", ascending=is_better_high)
-                    top_df = sorted_g.head(3)
-
-                result_row = {"指標": m}
-                for idx, (team, row) in enumerate(top_df.iterrows(), 1):
-                    result_row[f"{idx}位チーム"] = team
-                    result_row[f"{idx}位値"] = round(row["値"], 3)
-                summary_results.append(result_row)
-
-            except Exception:
-                continue
+        df_summary = top_team_summary(df_filtered, mode, display_mode)
 
         # チーム名カラー反映用関数
         def color_team_name(team_name):
             color = TEAM_COLORS.get(team_name, "#000000")
             return f'<span style="color:{color}">{team_name}</span>'
 
-        df_summary = pd.DataFrame(summary_results).copy()
         for rank in [1, 2, 3]:
             col = f"{rank}位チーム"
             if col in df_summary.columns:
@@ -614,7 +635,7 @@ with tabs[3]:
         # HTML表示（unsafe_allow_html=True）
         st.markdown(df_summary.to_html(escape=False, index=False), unsafe_allow_html=True)
 
-with tabs[4]:
+with tabs[4], alloc_probe(TAB_NAMES[4]):
     if mode == "野手":
         st.write("### 詳細解析：指標の分布図")
 
@@ -624,12 +645,12 @@ with tabs[4]:
         # 追加: 最低打席数スライダー
         min_pa_detail = st.slider("最低打席数", 0, 700, 50, key="min_pa_detail")
 
-        df_plot = df_filtered.copy()
-        df_plot["打席"] = pd.to_numeric(df_plot["打席"], errors="coerce")
-        df_plot = df_plot[df_plot["打席"] >= min_pa_detail]
-
-        df_plot[x_metric] = pd.to_numeric(df_plot[x_metric], errors="coerce")
-        df_plot[y_metric] = pd.to_numeric(df_plot[y_metric], errors="coerce")
+        # 描画に使う列だけを数値配列で取り出す（df_filtered 全体はコピーしない）
+        plot_rows = np.flatnonzero(numeric(df_filtered, "打席") >= min_pa_detail)
+        df_plot = take(df_filtered, plot_rows, ["選手名", "team_name"]).assign(**{
+            x_metric: numeric(df_filtered, x_metric, plot_rows),
+            y_metric: numeric(df_filtered, y_metric, plot_rows),
+        })
         df_plot = df_plot.dropna(subset=[x_metric, y_metric, "選手名", "team_name"])
 
         fig, ax = plt.subplots()
@@ -660,24 +681,22 @@ with tabs[4]:
         min_starts = st.slider("最低先発数", 0, 30, 0, key="starts_detail")
         min_reliever = st.slider("最低中継ぎ登板数", 0, 100, 0, key="reliever_detail")
 
-        df_plot = df_filtered.copy()
-        df_plot[x_metric] = pd.to_numeric(df_plot[x_metric], errors="coerce")
-        df_plot[y_metric] = pd.to_numeric(df_plot[y_metric], errors="coerce")
-        df_plot["IP_"] = pd.to_numeric(df_plot["IP_"], errors="coerce")
-
-        df_plot = df_plot.dropna(subset=[x_metric, y_metric, "IP_", "選手名", "team_name"])
-
-        # 追加: 項目別ランキングと同様のフィルタ
-        df_plot["登板"] = pd.to_numeric(df_plot["登板"], errors="coerce")
-        df_plot["先発"] = pd.to_numeric(df_plot["先発"], errors="coerce")
-        df_plot["中継ぎ"] = (df_plot["登板"] - df_plot["先発"]).abs()
-
-        df_plot = df_plot[
-            (df_plot["IP_"] >= min_ip) &
-            (df_plot["登板"] >= min_games) &
-            (df_plot["先発"] >= min_starts) &
-            (df_plot["中継ぎ"] >= min_reliever)
-        ]
+        # 追加: 項目別ランキングと同様のフィルタ（列配列とマスクで絞り込み、描画に使う列だけ取り出す）
+        x_values = numeric(df_filtered, x_metric)
+        y_values = numeric(df_filtered, y_metric)
+        ip = numeric(df_filtered, "IP_")
+        games = numeric(df_filtered, "登板")
+        starts = numeric(df_filtered, "先発")
+        plot_rows = np.flatnonzero(
+            ~np.isnan(x_values) & ~np.isnan(y_values)
+            & (ip >= min_ip) & (games >= min_games) & (starts >= min_starts)
+            & (np.abs(games - starts) >= min_reliever)
+        )
+        df_plot = take(df_filtered, plot_rows, ["選手名", "team_name"]).assign(**{
+            x_metric: x_values[plot_rows],
+            y_metric: y_values[plot_rows],
+        })
+        df_plot = df_plot.dropna(subset=["選手名", "team_name"])
 
         fig, ax = plt.subplots()
         for team in df_plot["team_name"].unique():
@@ -695,7 +714,7 @@ with tabs[4]:
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         st.pyplot(fig)
 
-with tabs[5]:
+with tabs[5], alloc_probe(TAB_NAMES[5]):
     if mode == "野手":
         st.info("野手モードは現在未実装です。")
         st.write("### ブレイク選手（未実装）")
@@ -703,7 +722,7 @@ with tabs[5]:
         pass
 
 
-with tabs[6]:
+with tabs[6], alloc_probe(TAB_NAMES[6]):
     # サマリーパネル: データが空の場合のガード
     if df_filtered.empty:
         st.warning("データが存在しません。")
@@ -711,22 +730,18 @@ with tabs[6]:
     if mode == "野手":
         st.write("### サマリーパネル（選手ごとの年度別成績）")
 
-        available_players = df_filtered["選手名"].dropna().unique().tolist()
-        selected_player = st.selectbox("選手を選択", sorted(available_players), key="summary_batter")
+        selected_key = summary_player_select("野手", "summary_batter")
+        selected_player = selected_key[0] if selected_key else None
 
         # 画像表示処理を追加
         import os
         from PIL import Image
 
         image_path = None
-        image_dir = f"image/{selected_year}"
 
         # データ取得: df_batterを使う
         try:
-            df_player = df_batter[
-                (df_batter["選手名"] == selected_player) &
-                (df_batter["team_name"].isin(selected_teams))
-            ].copy()
+            df_player = player_rows(df_batter, selected_key) if selected_key else df_batter.iloc[0:0]
         except Exception:
             st.warning(f"{selected_player} のデータ取得でエラーが発生しました。")
             st.stop()
@@ -736,17 +751,18 @@ with tabs[6]:
 
         # 画像ファイル名取得
         filename_candidate = ""
+        image_year = selected_year
         if not df_player.empty and "filename" in df_player.columns:
             try:
-                filename_candidate = df_player.sort_values("year", ascending=False).iloc[0].get("filename", "")
+                latest_row = df_player.sort_values("year", ascending=False).iloc[0]
+                filename_candidate = latest_row.get("filename", "")
+                image_year = latest_row["year"]
             except Exception:
                 filename_candidate = ""
         if isinstance(filename_candidate, str) and filename_candidate and filename_candidate.lower().endswith(".png"):
-            candidate_path = os.path.join(image_dir, filename_candidate)
-            if os.path.exists(candidate_path):
-                image_path = candidate_path
-            else:
-                st.warning(f"画像ファイルが存在しません: {candidate_path}")
+            image_path = player_image(image_year, filename_candidate)
+            if image_path is None:
+                st.warning(f"画像ファイルが存在しません: image/{int(image_year)}/{filename_candidate}")
         elif filename_candidate:
             st.warning(f"不正なファイル名: {filename_candidate}")
 
@@ -796,17 +812,7 @@ with tabs[6]:
         latest_year = df_player["year"].max()
         df_player = df_player[df_player["year"] == latest_year]
         df_player = df_player.sort_values("year")
-        # --- BABIPを計算して追加 ---
-        try:
-            H = pd.to_numeric(df_player["安打"], errors="coerce")
-            HR = pd.to_numeric(df_player["本塁打"], errors="coerce")
-            AB = pd.to_numeric(df_player["打数"], errors="coerce")
-            SO = pd.to_numeric(df_player["三振"], errors="coerce")
-            SF = pd.to_numeric(df_player["犠飛"], errors="coerce")
-            denominator = AB - SO - HR + SF
-            df_player["BABIP"] = ((H - HR) / denominator).round(3)
-        except Exception as e:
-            df_player["BABIP"] = None
+        # BABIP・ISO・wOBA・wRAA は読み込み時に計算済み
 
         # レーダーチャートの表示（主要打撃指標）
         if latest.get("打席") == 0:
@@ -815,16 +821,10 @@ with tabs[6]:
             st.subheader("📊 レーダーチャートによる成績可視化")
             radar_cols = ["打率", "出塁率", "長打率", "本塁打", "三振率", "盗塁", "OPS"]
             radar_raw = {col: pd.to_numeric(latest.get(col), errors="coerce") for col in radar_cols}
+            # 同年度・同リーグの分布に対するパーセンタイルで正規化
             def normalize_radar_values(raw_dict):
-                norm = {}
-                norm["打率"] = max(0.0, min(1.0, (raw_dict["打率"] - 0.2) / (0.35 - 0.2)))
-                norm["出塁率"] = min(raw_dict["出塁率"] / 0.45, 1.0)
-                norm["長打率"] = max(0.0, min(1.0, (raw_dict["長打率"] - 0.2) / (0.65 - 0.2)))
-                norm["本塁打"] = min(raw_dict["本塁打"] / 40, 1.0)
-                norm["三振率"] = max(0.0, min(1.0, (0.35 - raw_dict["三振率"]) / (0.35 - 0.1)))
-                norm["盗塁"] = min(raw_dict["盗塁"] / 30, 1.0)
-                norm["OPS"] = max(0.0, min(1.0, (raw_dict["OPS"] - 0.5) / (1.2 - 0.5)))
-                return [norm[k] for k in ["打率", "出塁率", "長打率", "本塁打", "三振率", "盗塁", "OPS"]]
+                pcts = radar_percentiles(percentile_table, latest_year, league_of(latest["team_name"]), "野手", raw_dict)
+                return [0.0 if pd.isna(v) else v for v in pcts]
 
             if any(pd.isna(list(radar_raw.values()))):
                 st.warning("一部の指標が欠損しているため、レーダーチャートを表示できません。")
@@ -850,6 +850,9 @@ with tabs[6]:
                 scaled = normalize_radar_values(radar_raw)
                 fig = plot_radar_chart(radar_cols, scaled, title=f"{selected_player}（{latest_year}）")
                 st.pyplot(fig)
+                st.markdown("#### リーグ内パーセンタイル")
+                st.dataframe(percentile_badges(percentile_table, latest_year, league_of(latest["team_name"]), "野手", radar_raw), hide_index=True)
+        show_similar_players("野手", df_batter, latest, "similar_batter")
         drop_cols = [col for col in ["group_file"] if col in df_player.columns]
         st.write(f"### 昨年の成績一覧")
         base_cols = ["year", "選手名"]
@@ -879,7 +882,7 @@ with tabs[6]:
         st.dataframe(df_player[ [c for c in cols6 if c in df_player.columns]])
 
         st.subheader("【その他】")
-        cols7 = ['連続安', '連試出', '連無安', '猛打賞', 'PA/HR', '得点', '内野安', '内安率', 'IsoP','BABIP']
+        cols7 = ['連続安', '連試出', '連無安', '猛打賞', 'PA/HR', '得点', '内野安', '内安率', 'IsoP', 'ISO', 'BABIP', 'wOBA', 'wRAA']
         st.dataframe(df_player[base_cols + [c for c in cols7 if c in df_player.columns]])
 
         st.write(f"#### 年度別成績一覧（{selected_player}）")
@@ -887,34 +890,31 @@ with tabs[6]:
         if "filename" in df_player.columns:
             drop_cols.append("filename")
         st.dataframe(df_player.drop(columns=drop_cols))
+        st.write("#### 通算成績（全年度）")
+        st.dataframe(player_career(load_career_prefix(table_version("batting_stats"), "野手"), selected_player, latest.get("birth")))
         # st.stop()
     else:
         # 投手モード
         st.write("### サマリーパネル（選手ごとの年度別成績）")
 
-        available_players = df_filtered["選手名"].dropna().unique().tolist()
-        selected_player = st.selectbox("選手を選択", sorted(available_players), key="summary_pitcher")
+        selected_key = summary_player_select("投手", "summary_pitcher")
+        selected_player = selected_key[0] if selected_key else None
 
         # 画像表示処理を追加
         import os
         from PIL import Image
 
         image_path = None
-        image_dir = f"image/{selected_year}"
-        df_player = df[
-            (df["選手名"] == selected_player) &
-            (df["team_name"].isin(selected_teams))
-        ].copy()
+        df_player = player_rows(df, selected_key) if selected_key else df.iloc[0:0]
 
         if not df_player.empty:
-            filename_candidate = df_player.sort_values("year", ascending=False).iloc[0].get("filename", "")
+            latest_row = df_player.sort_values("year", ascending=False).iloc[0]
+            filename_candidate = latest_row.get("filename", "")
             # nanやNoneのときはstr()で"nan"などにならないように
             if isinstance(filename_candidate, str) and filename_candidate and filename_candidate.lower().endswith(".png"):
-                candidate_path = os.path.join(image_dir, filename_candidate)
-                if os.path.exists(candidate_path):
-                    image_path = candidate_path
-                else:
-                    st.warning(f"画像ファイルが存在しません: {candidate_path}")
+                image_path = player_image(latest_row["year"], filename_candidate)
+                if image_path is None:
+                    st.warning(f"画像ファイルが存在しません: image/{int(latest_row['year'])}/{filename_candidate}")
             else:
                 st.warning(f"不正なファイル名: {filename_candidate}")
 
@@ -971,23 +971,10 @@ with tabs[6]:
             radar_cols = ["防御率", "奪三率", "BB/9", "WHIP", "QS", "被打率", "被本率"]
             radar_raw = {col: pd.to_numeric(latest.get(col), errors="coerce") for col in radar_cols}
 
+            # 同年度・同リーグの分布に対するパーセンタイルで正規化（低いほど良い指標は反転済み）
             def normalize_pitcher_radar(raw):
-                norm = {}
-                # 防御率: 1.00〜5.00（低いほど良い）
-                norm["防御率"] = max(0.0, min(1.0, (5.0 - raw["防御率"]) / (5.0 - 1.0)))
-                # 奪三率: 7.0〜11.0（高いほど良い）
-                norm["奪三率"] = max(0.0, min(1.0, (raw["奪三率"] - 3.0) / (11.0 - 3.0)))
-                # 四球率: 0.1〜0.5（低いほど良い）
-                norm["BB/9"] = max(0.0, min(1.0, (9 - raw["BB/9"]) / (9 - 3)))
-                # WHIP: 1.0〜2.0（低いほど良い）
-                norm["WHIP"] = max(0.0, min(1.0, (2.0 - raw["WHIP"]) / (2.0 - 1.0)))
-                # QS: 0〜20（高いほど良い）
-                norm["QS"] = min(raw["QS"] / 20.0, 1.0)
-                # 被打率: 0.2〜0.35（低いほど良い）
-                norm["被打率"] = max(0.0, min(1.0, (0.35 - raw["被打率"]) / (0.35 - 0.2)))
-                # 被本率: 0.0〜1.0（低いほど良い）
-                norm["被本率"] = max(0.0, min(1.0, (1.0 - raw["被本率"]) / 1.0))
-                return [norm[k] for k in ["防御率", "奪三率", "BB/9", "WHIP", "QS", "被打率", "被本率"]]
+                pcts = radar_percentiles(percentile_table, latest["year"], league_of(latest["team_name"]), "投手", raw)
+                return [0.0 if pd.isna(v) else v for v in pcts]
 
             if any(pd.isna(list(radar_raw.values()))):
                 st.warning("一部の指標が欠損しているため、レーダーチャートを表示できません。")
@@ -1009,6 +996,9 @@ with tabs[6]:
                 scaled = normalize_pitcher_radar(radar_raw)
                 fig = plot_radar_chart(radar_cols, scaled, title=f"{selected_player}（{latest_year}）")
                 st.pyplot(fig)
+                st.markdown("#### リーグ内パーセンタイル")
+                st.dataframe(percentile_badges(percentile_table, latest_year, league_of(latest["team_name"]), "投手", radar_raw), hide_index=True)
+        show_similar_players("投手", df, latest, "similar_pitcher")
 
 
 
@@ -1027,11 +1017,11 @@ with tabs[6]:
         st.dataframe(df_player[base_cols + [c for c in cols1 if c in df_player.columns]])
 
         st.subheader("【完封・完投・QS関連】")
-        cols2 = ['完封', '完投', 'QS', 'QS率', 'HQS', 'HQS率', '被安打', '被打率', '被本率']
+        cols2 = ['完封', '完投', 'QS', 'QS率', 'HQS', 'HQS率', '被安打', '被打率', '被本率', '被本塁打', '被BABIP']
         # st.dataframe(df_player[base_cols + [c for c in cols2 if c in df_player.columns]])
         st.dataframe(df_player[[c for c in cols2 if c in df_player.columns]])
         st.subheader("【与四球・奪三振・WHIP】")
-        cols3 = ['与四球', 'BB/9', '奪三振', 'K/9', 'K/BB', 'K-BB%', 'WHIP']
+        cols3 = ['与四球', 'BB/9', 'BB%', '奪三振', 'K/9', 'K%', 'K/BB', 'K-BB%', 'WHIP', 'FIP（算出）']
         st.dataframe(df_player[[c for c in cols3 if c in df_player.columns]])
 
         st.subheader("【得点圏・左右打者の被打率】")
@@ -1047,9 +1037,11 @@ with tabs[6]:
         if "filename" in df_player.columns:
             drop_cols.append("filename")
         st.dataframe(df_player.drop(columns=drop_cols))
+        st.write("##### 通算成績（全年度）")
+        st.dataframe(player_career(load_career_prefix(table_version("pitching_stats"), "投手"), selected_player, latest.get("birth")).round(IP_DISPLAY_DIGITS))
 
 
-with tabs[7]:
+with tabs[7], alloc_probe(TAB_NAMES[7]):
     # 年とチーム選択を個別に指定（共通化）
     unique_teams = sorted(df["team_name"].dropna().unique())
     team_selected = st.selectbox("チームを選択", unique_teams, key="team_selected_final")
@@ -1057,23 +1049,10 @@ with tabs[7]:
     if mode == "野手":
         st.write("### 打撃方向別人数（右打ち・左打ち）")
 
-        df_pos = df_batter[(df_batter["year"] == selected_year) & (df_batter["team_name"] == team_selected)].copy()
-        df_pos = df_pos[df_pos["hand"].notna()]
-        df_pos = df_pos[df_pos["hand"].str.contains("打")]
+        df_pos = batter_roster(df_batter, team_selected, selected_year)
 
-        def classify_batting_direction(hand_str):
-            if isinstance(hand_str, str):
-                hand_str = hand_str.strip().replace(" ", "").replace("　", "")
-                if "右打" in hand_str:
-                    return "右打"
-                elif "左打" in hand_str:
-                    return "左打"
-                elif "両打" in hand_str:
-                    return "両打"
-            return "不明"
-
-        df_pos["打撃方向"] = df_pos["hand"].apply(classify_batting_direction)
-        direction_counts = df_pos["打撃方向"].value_counts().sort_index()
+        # 投打はロード時に解析済みのカテゴリ列（bats）を使う
+        direction_counts = df_pos["bats"].value_counts().sort_index().rename_axis("打撃方向")
 
         # グラフ表示
         fig, ax = plt.subplots()
@@ -1091,13 +1070,12 @@ with tabs[7]:
         """, unsafe_allow_html=True)
 
         # テーブル表示
-        st.dataframe(direction_counts.reset_index().rename(columns={"index": "打撃方向", "打撃方向": "人数"}))
+        st.dataframe(direction_counts.reset_index().rename(columns={"count": "人数"}))
 
         # メインポジションごとの人数表示
         st.write("### メインポジション別人数")
 
-        df_pos["メインポジション"] = df_pos["position"].astype(str).str[0]
-        main_position_counts = df_pos["メインポジション"].value_counts().reindex(["捕", "一", "二", "三", "遊", "左", "中", "右"], fill_value=0)
+        main_position_counts = df_pos["primary_position"].value_counts().reindex(["捕", "一", "二", "三", "遊", "左", "中", "右"], fill_value=0).rename_axis("ポジション")
 
         fig2, ax2 = plt.subplots()
         ax2.bar(main_position_counts.index, main_position_counts.values, color="#90caf9")
@@ -1105,41 +1083,13 @@ with tabs[7]:
         ax2.set_title(f"{selected_year}年 {team_selected} メインポジション別人数")
         st.pyplot(fig2)
 
-        st.dataframe(main_position_counts.reset_index().rename(columns={"index": "ポジション", "メインポジション": "人数"}))
+        st.dataframe(main_position_counts.reset_index().rename(columns={"count": "人数"}))
 
         # 年齢 × ポジション 表
         st.write("### 年齢 × ポジション 表")
 
-        df_pos["age"] = pd.to_numeric(df_pos["age"], errors="coerce").fillna(0).astype(int)
-        df_pos["age_group"] = df_pos["age"].apply(lambda x: str(x) if x <= 34 else "35~")
-
-        def classify_position(pos_str):
-            if pd.isna(pos_str):
-                return None
-            pos = str(pos_str)[0]
-            if pos == "投":
-                return "投手"
-            elif pos == "捕":
-                return "捕手"
-            elif pos in "一二三遊":
-                return "内野手"
-            elif pos in "左右中":
-                return "外野手"
-            return None
-
-        df_pos["pos_class"] = df_pos["position"].apply(classify_position)
-
-        df_grid = df_pos[["選手名", "age_group", "pos_class", "hand"]].dropna(subset=["pos_class"])
-        df_grid["cell_html"] = df_grid.apply(
-            lambda row: f"<div style='background-color:{'#ef5350' if '右打' in str(row['hand']) else '#42a5f5' if '左打' in str(row['hand']) else '#9ccc65' if '両打' in str(row['hand']) else '#f0f0f0'};padding:2px;border-radius:4px;margin:1px'>{row['選手名']}</div>",
-            axis=1
-        )
-
-        pivot = df_grid.groupby(["age_group", "pos_class"])["cell_html"].apply(lambda x: "".join(x)).unstack().fillna("")
-
-        # Render as styled HTML
-        styled_html = "<style>table {font-size: 13px;} td {vertical-align: top;}</style>"
-        styled_html += pivot.to_html(escape=False)
+        # Render as styled HTML（テンプレート描画済みのHTMLをキャッシュから取得）
+        styled_html = load_roster_grid_html(table_version(ROLE_TABLES[mode], selected_year, team_selected), team_selected, selected_year, mode)
         st.markdown(styled_html, unsafe_allow_html=True)
         # Add color legend
         st.markdown("""
@@ -1154,47 +1104,11 @@ with tabs[7]:
     elif mode == "投手":
         st.write("### 🧱 投手年齢分布（左投/右投）")
 
-        df_pos = df[(df["year"] == selected_year) & (df["team_name"] == team_selected)].copy()
-
-        # 投手だけに絞る
-        df_pos["age"] = pd.to_numeric(df_pos["age"], errors="coerce")
-        df_pos = df_pos.dropna(subset=["position", "age", "hand"])
-        df_pos = df_pos[df_pos["position"].astype(str).str.contains("投")]
-        df_pos["age"] = df_pos["age"].astype(int).clip(lower=18, upper=43)
-
-        def classify_throwing_hand(hand_str):
-            if isinstance(hand_str, str):
-                hand_str = hand_str.strip().replace(" ", "").replace("　", "")  # 半角・全角スペース除去
-                if "左投" in hand_str:
-                    return "左投"
-                elif "右投" in hand_str:
-                    return "右投"
-            return "不明"
-
-        df_pos["投手種別"] = df_pos["hand"].apply(classify_throwing_hand)
-        df_pos = df_pos[df_pos["投手種別"].isin(["左投", "右投"])]
-
-        # 投打フル組み合わせ分類を追加
-        def classify_throw_bat(hand_str):
-            if isinstance(hand_str, str):
-                hand_str = hand_str.strip().replace(" ", "").replace("　", "")
-                if "右投右打" in hand_str:
-                    return "右投右打"
-                elif "右投左打" in hand_str:
-                    return "右投左打"
-                elif "右投両打" in hand_str:
-                    return "右投両打"
-                elif "左投右打" in hand_str:
-                    return "左投右打"
-                elif "左投左打" in hand_str:
-                    return "左投左打"
-                elif "左投両打" in hand_str:
-                    return "左投両打"
-            return "不明"
-        df_pos["投打分類"] = df_pos["hand"].apply(classify_throw_bat)
+        # 投手だけに絞る（投打はロード時に解析済みのカテゴリ列を使う）
+        df_pos = pitcher_roster(df, team_selected, selected_year)
 
         # 年齢ごとの人数をカウント
-        age_hand_counts = df_pos.groupby(["age", "投手種別"]).size().unstack(fill_value=0).sort_index()
+        age_hand_counts = df_pos.groupby(["age", "投手種別"], observed=True).size().unstack(fill_value=0).sort_index()
         # 年齢範囲を埋める
         full_age_range = range(df_pos["age"].min(), df_pos["age"].max() + 1)
         age_hand_counts = age_hand_counts.reindex(full_age_range, fill_value=0)
@@ -1207,16 +1121,6 @@ with tabs[7]:
         ax.set_title(f"{selected_year}年 {team_selected} 投手年齢分布（左投/右投）")
         fig.tight_layout()
 
-        df_display = df_pos[["age", "選手名", "投手種別"]].copy()
-        def color_name(row):
-            color = "#42a5f5" if row["投手種別"] == "左投" else "#ef5350"
-            return f'<span style="color:{color}">{row["選手名"]}</span>'
-
-        df_display["選手名"] = df_display.apply(color_name, axis=1)
-        # group by age, join player names with 、 and smaller font
-        df_display_grouped = df_display.groupby("age")["選手名"].apply(lambda x: "、".join(x)).reset_index()
-        df_display_grouped = df_display_grouped.sort_values("age")
-
         col1, col2 = st.columns([1.2, 1])
         with col1:
             st.markdown("<br>", unsafe_allow_html=True)  # さらにスペースを追加
@@ -1233,69 +1137,42 @@ with tabs[7]:
             else:
                 st.markdown("**左投手/右投手の情報がありません。**")
         with col2:
-            styled_html = (
-                "<div style='font-size: 12px;'>"
-                + df_display_grouped.to_html(escape=False, index=False)
-                + "</div>"
-            )
+            # 年齢ごとの選手名一覧（テンプレート描画済みのHTMLをキャッシュから取得）
+            styled_html = load_roster_grid_html(table_version(ROLE_TABLES[mode], selected_year, team_selected), team_selected, selected_year, mode)
             st.markdown(styled_html, unsafe_allow_html=True)
 
         # --- クラスタリング表示: 投手モードのときのみ ---
         # ここからクラスタリング処理（t-SNEやKMeans等）を投手モードのみに限定して移動
         if mode == "投手":
-            # 必要なライブラリのインポート
-            from sklearn.manifold import TSNE
-            from sklearn.cluster import KMeans
-            import numpy as np
-
             st.write("### 投手クラスタリング（t-SNE + KMeans）")
-            # クラスタリングは年齢、投球回、各種指標（防御率、奪三振、与四球、WHIP）に基づいて分類
-            cluster_features = [ "防御率", "奪三率", "四球率", "WHIP","被本率", "被打率"]
-            df_cluster = df_pos.copy()
-            # 登板数が0の選手を除外
-            df_cluster["登板"] = pd.to_numeric(df_cluster["登板"], errors="coerce")
-            df_cluster = df_cluster[df_cluster["登板"] > 0]
-            # 必要なカラムが揃っているか確認
-            if all(f in df_cluster.columns for f in cluster_features):
-                cluster_data = df_cluster[cluster_features].apply(pd.to_numeric, errors="coerce").dropna()
-                if not cluster_data.empty and len(cluster_data) >= 2:
-                    # t-SNEのperplexity要件をチェック
-                    # if len(cluster_data) < 30:
-                    #     st.warning(f"クラスタリングには最低30選手以上のデータが必要です（現在: {len(cluster_data)}）")
-                    #     st.stop()
-                    # perplexityはサンプル数の1/3または最大30を目安に自動調整（最低5）
-                    tsne = TSNE(n_components=2, random_state=0, perplexity=min(30, max(5, len(cluster_data) // 3)))
-                    tsne_result = tsne.fit_transform(cluster_data)
-                    # KMeansによりt-SNEで圧縮した2次元データにクラスタ分けを実施
-                    n_clusters = st.slider("クラスタ数", 2, 6, 3, key="pitcher_cluster_n")
-                    kmeans = KMeans(n_clusters=n_clusters, random_state=0)
-                    cluster_labels = kmeans.fit_predict(tsne_result)
-                    # 結果をdfに反映
-                    df_cluster_vis = df_cluster.loc[cluster_data.index].copy()
-                    df_cluster_vis["tsne_x"] = tsne_result[:, 0]
-                    df_cluster_vis["tsne_y"] = tsne_result[:, 1]
-                    df_cluster_vis["cluster"] = cluster_labels
-                    # 可視化
-                    fig3, ax3 = plt.subplots()
-                    colors = plt.get_cmap("tab10", n_clusters)
-                    for i in range(n_clusters):
-                        d = df_cluster_vis[df_cluster_vis["cluster"] == i]
-                        ax3.scatter(d["tsne_x"], d["tsne_y"], label=f"クラスタ{i+1}", color=colors(i), alpha=0.7)
-                        for _, row in d.iterrows():
-                            ax3.text(row["tsne_x"], row["tsne_y"], row["選手名"], fontsize=7)
-                    ax3.set_title("投手クラスタリング（t-SNE + KMeans）")
-                    ax3.set_xlabel("t-SNE 1")
-                    ax3.set_ylabel("t-SNE 2")
-                    ax3.legend()
-                    st.pyplot(fig3)
-                else:
-                    st.info("クラスタリングに十分なデータがありません。")
+            # クラスタリングは各種指標（防御率、奪三率、四球率、WHIP、被本率、被打率）に基づいて分類
+            df_cluster, cluster_data, tsne_result, sweep = load_cluster_sweep(table_version("pitching_stats", selected_year, team_selected), mode, selected_year, roster_team=team_selected)
+            if not cluster_data.empty and len(cluster_data) >= 2:
+                # KMeansによりt-SNEで圧縮した2次元データにクラスタ分けを実施
+                n_clusters = choose_n_clusters(sweep, "クラスタ数", "pitcher_cluster_n")
+                cluster_labels = sweep_labels(sweep, tsne_result, n_clusters)
+                # 結果をdfに反映
+                df_cluster_vis = cluster_frame(df_cluster, tsne_result, cluster_labels)
+                # 可視化
+                fig3, ax3 = plt.subplots()
+                colors = plt.get_cmap("tab10", n_clusters)
+                for i in range(n_clusters):
+                    d = df_cluster_vis[df_cluster_vis["cluster"] == i]
+                    ax3.scatter(d["tsne_x"], d["tsne_y"], label=f"クラスタ{i+1}", color=colors(i), alpha=0.7)
+                    for _, row in d.iterrows():
+                        ax3.text(row["tsne_x"], row["tsne_y"], row["選手名"], fontsize=7)
+                ax3.set_title("投手クラスタリング（t-SNE + KMeans）")
+                ax3.set_xlabel("t-SNE 1")
+                ax3.set_ylabel("t-SNE 2")
+                ax3.legend()
+                st.pyplot(fig3)
             else:
-                st.info("クラスタリングに必要な指標が不足しています。")
+                st.info("クラスタリングに十分なデータがありません。")
 
         # 投打別内訳テーブル
         st.markdown("### 投打別内訳")
-        throw_bat_summary = df_pos["投打分類"].value_counts().reset_index()
+        throw_bat_summary = df_pos["投打分類"].value_counts()
+        throw_bat_summary = throw_bat_summary[throw_bat_summary > 0].reset_index()
         throw_bat_summary.columns = ["投打", "人数"]
         st.dataframe(throw_bat_summary)
 
@@ -1326,256 +1203,78 @@ with tabs[7]:
 # st.dataframe(df_outfield_sample[sample_cols])
 
 # --- 新規タブ: ポジション別出場主力 ---
-with tabs[8]:
+with tabs[8], alloc_probe(TAB_NAMES[8]):
     st.write("### 各チーム ポジション別 主力選手（守備+打撃）")
 
     # --- チーム選択フィルタ追加 ---
     team_options = sorted(df["team_name"].dropna().unique())
     selected_teams_in_tab = [st.selectbox("表示するチームを選択", team_options)]
 
-    # 守備成績の読み込み
-    conn_def = sqlite3.connect("player_stats.db")
-    df_def = pd.read_sql_query("SELECT * FROM defense_stats", conn_def)
-    conn_def.close()
-    # 「outfielder」としてすでに統一されているためそのまま使用
-    df_def["position_group"] = df_def["ポジション"]
-
-    # バッティング成績の読み込み
-    df_bat_all = load_batter_data()
-    df_def["team_name"] = df_def["チーム"]
-
-    # === 能力データの読み込み・マージ ===
-    df_ability = load_ability_data()
-    df_ability["year"] = pd.to_numeric(df_ability["year"], errors="coerce")
-    df_ability = df_ability[df_ability["year"] == selected_year]
-
-    ability_cols = [
-        "選手名", "team_name", "Left", "Right", "center",
-        "first", "second", "short", "third", "catcher"
-    ]
-
-    # 各チーム・ポジションで最も出場数が多い選手を抽出
-    df_def["出場"] = pd.to_numeric(df_def["試合"], errors="coerce")
-    df_def = df_def.dropna(subset=["team_name", "position_group", "選手名", "出場"])
-    df_def_ranked = df_def.sort_values("出場", ascending=False)
-
-    # 各チーム・ポジションごとに、出場数が合計110以上になるよう選手を抽出
-    top_players_list = []
-    non_outfield_df = df_def_ranked[df_def_ranked["position_group"] != "outfielder"]
-
-    for (team, pos), group in non_outfield_df.groupby(["team_name", "position_group"]):
-        group_sorted = group.sort_values("出場", ascending=False)
-        total = 0
-        rows = []
-        for _, row in group_sorted.iterrows():
-            rows.append(row)
-            total += row["出場"]
-            if total >= 110:
-                break
-        top_players_list.extend(rows)
-
-    top_players = pd.DataFrame(top_players_list)
-
-    # 外野は合計330試合以上になるまで選出
-    outfield_players_list = []
-    outfield_df = df_def_ranked[df_def_ranked["position_group"] == "outfielder"]
-
-    for team, group in outfield_df.groupby("team_name"):
-        group_sorted = group.sort_values("出場", ascending=False)
-        total = 0
-        rows = []
-        for _, row in group_sorted.iterrows():
-            rows.append(row)
-            total += row["出場"]
-            if total >= 330:
-                break
-        outfield_players_list.extend(rows)
-
-    outfield_top = pd.DataFrame(outfield_players_list)
-    outfield_top["position_group"] = "外野"
-    outfield_top["ポジション"] = "外野"
-    # --- フィルタ前のデータを保持（ベストナイン用） ---
-    top_players_raw = top_players.copy()
-    outfield_top_raw = outfield_top.copy()
-    # === フィルタリング追加ここから ===
-    # チーム選択フィルタを top_players, outfield_top に適用
-    top_players = top_players[top_players["team_name"].isin(selected_teams_in_tab)]
-    outfield_top = outfield_top[outfield_top["team_name"].isin(selected_teams_in_tab)]
-    # === フィルタリング追加ここまで ===
-
-    # 外野も結合
-    # 空・全NAデータフレームを除外し、全NA列も除去して結合
-    top_players_full = pd.concat(
-        [df.dropna(how="all", axis=1) for df in [top_players, outfield_top] if not df.empty],
-        ignore_index=True
-    )
-
-    # ポジション名の日本語化（top_players_full 側にも適用）
-    top_players_full["ポジション"] = top_players_full["ポジション"].replace({
-        "outfielder": "外野",
-        "catcher": "捕手",
-        "first": "一塁",
-        "second": "二塁",
-        "third": "三塁",
-        "short": "遊撃"
-    })
-
-    # 守備情報列を選定（例：失策、守備率、捕手固有指標も含む）
-    defense_cols = ["選手名", "チーム", "ポジション", "試合", "失策", "守備率", "捕逸", "被盗塁企画", "許盗塁", "盗塁刺", "盗阻率"]
-    df_def_info = df_def[defense_cols].copy()
-    df_def_info["team_name"] = df_def_info["チーム"]
-    # ポジション名の統一（英語→日本語）
-    df_def_info["ポジション"] = df_def_info["ポジション"].replace({
-        "outfielder": "外野",
-        "catcher": "捕手",
-        "first": "一塁",
-        "second": "二塁",
-        "third": "三塁",
-        "short": "遊撃"
-    })
-
-    # バッティング情報とマージ
-    df_bat_all["year"] = pd.to_numeric(df_bat_all["year"], errors="coerce")
-    df_bat_latest = df_bat_all[df_bat_all["year"] == selected_year]
-
-    # 守備情報を追加（top_players_fullにマージ）
-    df_combined = pd.merge(
-        top_players_full,
-        df_def_info,
-        on=["選手名", "team_name", "ポジション"],
-        how="left",
-        suffixes=("", "_def")
-    )
-
-    # バッティング情報とマージ
-    df_merged = pd.merge(
-        df_combined,
-        df_bat_latest[["選手名", "team_name", "打率", "本塁打", "打点", "OPS"]],
-        on=["選手名", "team_name"],
-        how="left"
-    )
+    # 各チーム・ポジションごとに、出場数が合計110以上（外野は330以上）になるよう主力を抽出し、
+    # 守備・打撃・能力を結合（全チーム分。ベストナインでも使う）。年度パーティションが無ければその場で計算
+    df_combined_all = load_derived_view(view_version("regulars"), "regulars").get(int(selected_year))
+    if df_combined_all is None:
+        df_combined_all = regulars_table(load_defense_data(), load_batter_data(), load_ability_data(), selected_year)
 
-    # 能力データをマージ
-    df_merged = pd.merge(
-        df_merged,
-        df_ability[ability_cols],
-        on=["選手名", "team_name"],
-        how="left"
-    )
-
-    # Remove defensive columns if present
-    cols_to_remove = ["守備スコア", "守備偏差値", "守備範囲能力"]
-    df_merged = df_merged.drop(columns=[col for col in cols_to_remove if col in df_merged.columns], errors="ignore")
-
-    # Calculate OPS偏差値 (global z-score, not by position)
-    if "OPS" in df_merged.columns:
-        df_merged["OPS"] = pd.to_numeric(df_merged["OPS"], errors="coerce")
-        ops_mean = df_merged["OPS"].mean()
-        ops_std = df_merged["OPS"].std(ddof=0)
-        if ops_std != 0:
-            df_merged["OPS偏差値"] = ((df_merged["OPS"] - ops_mean) / ops_std * 10 + 50).round(2)
-        else:
-            df_merged["OPS偏差値"] = 50
-    # Prepare display columns (remove defensive info, add OPS偏差値)
-    display_cols = [
-        "team_name", "ポジション", "選手名", "出場", "打率", "本塁打", "打点", "OPS"
-    ]
-    # Add OPS偏差値 if not present
-    if "OPS偏差値" in df_merged.columns and "OPS偏差値" not in display_cols:
-        display_cols.append("OPS偏差値")
-    # Add positional ability columns if present
-    for col in ["Left", "Right", "center", "first", "second", "short", "third", "catcher"]:
-        if col in df_merged.columns and col not in display_cols:
-            display_cols.append(col)
-    display_cols = [col for col in display_cols if col in df_merged.columns]
-    st.dataframe(df_merged[display_cols])
+    # チーム選択フィルタを適用して表示（OPS偏差値は表示チーム内で計算）
+    df_merged = df_combined_all[df_combined_all["team_name"].isin(selected_teams_in_tab)]
+    st.dataframe(regulars_display(df_merged))
 
     # --- 🔥 ベストバッティングナイン（OPS順） ---
     st.write("### 🔥 ベストバッティングナイン（OPS順）")
     selected_league_for_best9 = st.radio("リーグを選択", ["セ・リーグ", "パ・リーグ"], horizontal=True)
 
-    # リーグ定義
-    SE_TEAMS = ["giants", "hanshin", "dragons", "baystars", "swallows", "carp"]
-    PA_TEAMS = ["hawks", "lions", "eagles", "marines", "Buffaloes", "fighters"]
-
-    # 🔥 ベストナイン用に全チーム分のdfを用意（選択チームフィルタなし）
-    top_players_all = pd.concat(
-        [df.dropna(how="all", axis=1) for df in [top_players_raw, outfield_top_raw] if not df.empty],
-        ignore_index=True
-    )
-    top_players_all["ポジション"] = top_players_all["ポジション"].replace({
-        "outfielder": "外野",
-        "catcher": "捕手",
-        "first": "一塁",
-        "second": "二塁",
-        "third": "三塁",
-        "short": "遊撃"
-    })
-
-    # 守備・打撃・能力をマージ
-    df_combined_all = pd.merge(
-        top_players_all,
-        df_def_info,
-        on=["選手名", "team_name", "ポジション"],
-        how="left"
-    )
-    df_combined_all = pd.merge(
-        df_combined_all,
-        df_bat_latest[["選手名", "team_name", "打率", "本塁打", "打点", "OPS"]],
-        on=["選手名", "team_name"],
-        how="left"
-    )
-    df_combined_all = pd.merge(
-        df_combined_all,
-        df_ability[ability_cols],
-        on=["選手名", "team_name"],
-        how="left"
-    )
-    # --- 表示用ポジション列を追加 ---
-    def split_outfielder_position(row):
-        if row["ポジション"] != "外野":
-            return row["ポジション"]
-        vals = {
-            "左": pd.to_numeric(row.get("Left", 0), errors="coerce") or 0,
-            "中": pd.to_numeric(row.get("center", 0), errors="coerce") or 0,
-            "右": pd.to_numeric(row.get("Right", 0), errors="coerce") or 0
-        }
-        best_pos = max(vals, key=vals.get)
-        # 1文字→フル日本語表記
-        return {"左": "左", "中": "中", "右": "右"}[best_pos]
-    df_combined_all["表示用ポジション"] = df_combined_all.apply(split_outfielder_position, axis=1)
-
-    # OPS偏差値計算（全体ベース）
-    if "OPS" in df_combined_all.columns:
-        df_combined_all["OPS"] = pd.to_numeric(df_combined_all["OPS"], errors="coerce")
-        ops_mean = df_combined_all["OPS"].mean()
-        ops_std = df_combined_all["OPS"].std(ddof=0)
-        df_combined_all["OPS偏差値"] = ((df_combined_all["OPS"] - ops_mean) / ops_std * 10 + 50).round(2)
-
-    # ベストナイン抽出は df_combined_all から行う
-    df_best_source = df_combined_all[df_combined_all["team_name"].isin(SE_TEAMS if selected_league_for_best9 == "セ・リーグ" else PA_TEAMS)]
-
-    def get_best_nine(df):
-        # ポジション列名を"ポジション"に統一
-        df = df.dropna(subset=["OPS", "ポジション"])
-        best_nine = []
-        positions = ["捕手", "一塁", "二塁", "三塁", "遊撃", "左", "中", "右"]
-        for pos in positions:
-            df_pos = df[df["表示用ポジション"] == pos]
-            if not df_pos.empty:
-                best = df_pos.sort_values("OPS", ascending=False).iloc[0]
-                best_nine.append(best)
-        return pd.DataFrame(best_nine)
-
-    df_best = get_best_nine(df_best_source)
+    # ベストナイン抽出は全チーム分の df_combined_all から行う
+    df_best = best_nine(df_combined_all, LEAGUE_TEAMS[selected_league_for_best9])
     # 表示用: ポジション列名を"position"でなく"ポジション"に
     display_best_cols = ["ポジション", "選手名", "team_name", "OPS"]
     df_best_display = df_best[display_best_cols] if all(c in df_best.columns for c in display_best_cols) else df_best
     st.dataframe(df_best_display)
 
+    # --- 🧮 最適打順（主力9人） ---
+    st.write("### 🧮 最適打順（主力9人・マルコフ連鎖による期待得点）")
+    st.caption("各ポジションの出場最多の選手 + 打席最多の控え1人（指）の9人で、1試合の期待得点が最大になる打順を探します。")
+    lineup_result = load_team_lineups(table_version(["defense_stats", "batting_stats", "ability_stats"], selected_year), int(selected_year)).get(selected_teams_in_tab[0])
+    if lineup_result is None:
+        st.info("打順を組める9人の打撃成績がそろっていません。")
+    else:
+        col1, col2 = st.columns(2)
+        col1.metric("最適打順の期待得点（1試合）", f"{lineup_result['runs']:.2f}",
+                    f"{lineup_result['runs'] - lineup_result['baseline']:+.3f}（OPS順との差）")
+        col2.metric("評価した打順", f"{lineup_result['evaluated']:,}")
+        st.dataframe(lineup_result["lineup"])
+
+    # --- 🛡 最適守備配置（depth chart） ---
+    st.write("### 🛡 最適守備配置（守備能力の合計が最大になる割り当て）")
+    st.caption("能力表の守備位置別の能力から、8つの守備位置に1人ずつ割り当てる組み合わせを割り当て問題として解き、"
+               "正選手を外して解き直すことで2番手・3番手まで決めます。能力が空欄の位置には置きません。")
+    alignment_packed = load_alignment_candidates(table_version(["ability_stats", "batting_stats"], selected_year), int(selected_year))
+    alignment_team = selected_teams_in_tab[0]
+    ops_weight = st.slider("打撃の重み（OPS偏差値1あたり守備能力何点分か）", 0.0, 2.0, 0.0, 0.1, key="alignment_ops_weight")
+    team_candidates = alignment_packed["candidates"]
+    excluded_players = st.multiselect(
+        "離脱した場合を試す選手", sorted(team_candidates.loc[team_candidates["team_name"] == alignment_team, "選手名"].unique()),
+        key="alignment_excluded",
+    )
+    depth_chart = depth_charts(alignment_packed, ops_weight, excluded={alignment_team: excluded_players})
+    if alignment_team not in set(depth_chart["team_name"]):
+        st.info("守備能力のある選手がいません。")
+    else:
+        totals = alignment_totals(depth_chart).join(alignment_comparison(depth_chart, df_combined_all))
+        team_totals = totals.loc[alignment_team]
+        col1, col2 = st.columns(2)
+        col1.metric("最適配置の守備能力合計", f"{team_totals['守備能力合計']:.0f}",
+                    f"{team_totals['現行との差']:+.0f}（現行の主力との差・{team_totals['比較した守備位置']:.0f}位置で比較）")
+        col2.metric("埋まった守備位置", f"{team_totals['埋まった守備位置']} / 8")
+        st.dataframe(depth_chart_table(depth_chart, alignment_team))
+        st.caption("現行との差は、最適配置と主力表（各位置の出場最多選手）の両方に守備能力のある位置だけで比べた合計の差です。"
+                   f"このチームの現行側は主力のいない位置が{team_totals['現行の主力なし']:.0f}、"
+                   f"能力が空欄の位置が{team_totals['現行の能力空欄']:.0f}あり、比較から外しています。")
+        st.dataframe(totals.sort_values("評価値合計", ascending=False).round(1))
+
 
 # --- 新規タブ: タイトル・順位 ---
-with tabs[9]:
+with tabs[9], alloc_probe(TAB_NAMES[9]):
     st.write("### 🏆 各リーグタイトル & 順位表")
 
     # df_batterをここで再読み込み（必要な列が存在しないことへの対処）
@@ -1595,14 +1294,10 @@ with tabs[9]:
     # print("=== df_batter columns ===")
     # print(df_batter.columns.tolist())
 
-    # Ensure 'year' column exists and is numeric
-    df_batter["year"] = pd.to_numeric(df_batter.get("year", pd.NA), errors="coerce")
     # チーム別打撃指標（OPSなど）
-    df_bat_league = df_batter[(df_batter["year"] == selected_year) & (df_batter["team_name"].isin(league_teams))].copy()
-    df_bat_league["OPS"] = pd.to_numeric(df_bat_league["OPS"], errors="coerce")
-    df_bat_league["打数"] = pd.to_numeric(df_bat_league["打数"], errors="coerce")
+    df_bat_league = take(df_batter, rows_where(df_batter, selected_year, league_teams), ["team_name", "OPS", "打数"])
     df_bat_league = df_bat_league.dropna(subset=["OPS", "打数"])
-    df_bat_league["weighted_OPS"] = df_bat_league["OPS"] * df_bat_league["打数"]
+    df_bat_league = df_bat_league.assign(weighted_OPS=df_bat_league["OPS"] * df_bat_league["打数"])
     df_bat_team = df_bat_league.groupby("team_name").agg({
         "weighted_OPS": "sum",
         "打数": "sum"
@@ -1612,12 +1307,10 @@ with tabs[9]:
     df_bat_team.columns = ["チーム", "OPS（加重平均）"]
 
     # チーム別投手勝ち星
-    df_pitch_league = df[(df["year"] == selected_year) & (df["team_name"].isin(league_teams))].copy()
-    df_pitch_league["勝"] = pd.to_numeric(df_pitch_league["勝"], errors="coerce")
+    df_pitch_league = take(df, rows_where(df, selected_year, league_teams), ["team_name", "勝", "敗"])
     df_win_team = df_pitch_league.groupby("team_name")["勝"].sum().dropna().sort_values(ascending=False).reset_index()
     df_win_team.columns = ["チーム", "勝利数"]
     # --- 敗北数・引き分け数追加 ---
-    df_pitch_league["敗"] = pd.to_numeric(df_pitch_league["敗"], errors="coerce")
     df_lose_team = df_pitch_league.groupby("team_name")["敗"].sum().dropna().reset_index()
     df_lose_team.columns = ["チーム", "敗北数"]
     df_win_team = pd.merge(df_win_team, df_lose_team, on="チーム", how="left")
@@ -1635,264 +1328,172 @@ with tabs[9]:
         st.markdown("#### 🥇順位表（チーム勝利数ベース）")
         st.dataframe(df_win_team)
 
+    st.markdown("#### 📐 得失点から見た実力（ピタゴラス勝率）")
+    st.caption("得点は野手成績、失点は投手成績の合計。期待勝利は Pythagenpat 勝率 × (勝+敗)、運は実際の勝利数との差です。")
+    strength = load_team_strength(table_version(["batting_stats", "pitching_stats"]))
+    strength_year = strength_view(strength, selected_year, league)
+    if strength_year.empty:
+        st.info("得点・失点のデータが不足しています。")
+    else:
+        st.dataframe(strength_year.drop(columns="year").style.format({
+            "勝率": "{:.3f}", "ピタゴラス勝率": "{:.3f}", "Pythagenpat勝率": "{:.3f}",
+            "得点": "{:.0f}", "失点": "{:.0f}", "得失点差": "{:+.0f}", "期待勝利": "{:.1f}", "運（勝利数）": "{:+.1f}",
+        }), hide_index=True)
+    with st.expander(f"{league} 歴代（全年度）"):
+        st.dataframe(strength_view(strength, league=league).round(3), hide_index=True)
+
+    st.markdown("#### 🔮 シーズン順位予測（モンテカルロ）")
+    st.caption("得点・失点からピタゴラス勝率を求め、log5 で対戦ごとの勝率に換算して143試合を繰り返しシミュレーションします。")
+    n_sims = st.select_slider("シミュレーション回数", options=[10000, 50000, 100000], value=100000, key="standings_n_sims")
+    projection = load_standings_projection(table_version(["batting_stats", "pitching_stats"], selected_year), selected_year, n_sims)
+    projection = projection[projection["league"] == league].drop(columns="league")
+    if projection.empty:
+        st.info("得点・失点のデータが不足しているため予測できません。")
+    else:
+        st.dataframe(projection.style.format({
+            "得点": "{:.0f}", "失点": "{:.0f}", "平均勝": "{:.1f}", "平均敗": "{:.1f}", "平均分": "{:.1f}",
+            "優勝確率": "{:.1%}", "CS進出確率": "{:.1%}",
+        }))
+
 
 
 # --- 新規タブ: 🧠 クラスタ分析（リーグ・チーム別） ---
-with tabs[10]:
+with tabs[10], alloc_probe(TAB_NAMES[10]):
     st.write("### 🧠 クラスタ分析（リーグ・チーム別）")
 
-    # 投手・野手で分岐
-    if mode == "投手":
-        league_tabs = st.tabs(["⚾ 全体（12球団）", "🔵 セ・リーグ", "🟡 パ・リーグ"])
-        TEAM_SE = ["giants", "hanshin", "dragons", "baystars", "swallows", "carp"]
-        TEAM_PA = ["hawks", "lions", "eagles", "marines", "Buffaloes", "fighters"]
-
-        for idx, (tab, league_name, team_filter) in enumerate(zip(
-            league_tabs,
-            ["全体", "セ・リーグ", "パ・リーグ"],
-            [None, TEAM_SE, TEAM_PA]
-        )):
-            with tab:
-                st.write(f"#### {league_name} クラスタリング結果")
-
-                # チームフィルタ適用
-                df_cluster = df.copy()
-                if team_filter:
-                    df_cluster = df_cluster[df_cluster["team_name"].isin(team_filter)]
-
-                # 前処理
-                cluster_features = ["防御率", "奪三率", "四球率", "WHIP", "被本率", "被打率"]
-                df_cluster["登板"] = pd.to_numeric(df_cluster["登板"], errors="coerce")
-                df_cluster = df_cluster[df_cluster["登板"] > 0]
-                cluster_data = df_cluster[cluster_features].apply(pd.to_numeric, errors="coerce").dropna()
-
-                if cluster_data.shape[0] < 2:
-                    st.warning("クラスタリングに必要なデータが不足しています。")
-                    continue
-
-                from sklearn.manifold import TSNE
-                from sklearn.cluster import KMeans
-                import matplotlib.pyplot as plt
-                import numpy as np
-
-                perplexity = min(30, max(5, len(cluster_data) // 3))
-                tsne = TSNE(n_components=2, random_state=0, perplexity=perplexity)
-                tsne_result = tsne.fit_transform(cluster_data)
-
-                n_clusters = st.slider(f"{league_name}のクラスタ数", 2, 6, 3, key=f"tsne_n_clusters_{idx}")
-                kmeans = KMeans(n_clusters=n_clusters, random_state=0)
-                cluster_labels = kmeans.fit_predict(tsne_result)
-
-                df_vis = df_cluster.loc[cluster_data.index].copy()
-                df_vis["tsne_x"] = tsne_result[:, 0]
-                df_vis["tsne_y"] = tsne_result[:, 1]
-                df_vis["cluster"] = cluster_labels
-
-                # 可視化
-                fig, ax = plt.subplots()
-                cmap = plt.get_cmap("tab10", n_clusters)
-                for i in range(n_clusters):
-                    d = df_vis[df_vis["cluster"] == i]
-                    ax.scatter(d["tsne_x"], d["tsne_y"], label=f"クラスタ{i+1}", color=cmap(i), alpha=0.7)
-                    for _, row in d.iterrows():
-                        ax.text(row["tsne_x"], row["tsne_y"], row["選手名"], fontsize=7)
-                ax.set_title(f"{league_name} クラスタリング（t-SNE + KMeans）")
-                ax.legend()
-                st.pyplot(fig)
-
-                # クラスタ中心点の特徴表示
-                st.markdown("#### 📊 各クラスタの平均成績（中心点特徴）")
-                # 重複列を防ぐために df_vis 側の重複列を削除して結合
-                df_vis_clean = df_vis.drop(columns=[col for col in cluster_data.columns if col in df_vis.columns], errors="ignore")
-                df_vis_with_features = pd.concat([df_vis_clean.reset_index(drop=True), cluster_data.reset_index(drop=True)], axis=1)
-                cluster_centers = df_vis_with_features.groupby("cluster")[cluster_features].mean().round(2)
-                cluster_centers.index = [f"クラスタ{i+1}" for i in cluster_centers.index]
-                st.dataframe(cluster_centers)
-
-                # クラスタタイプ名称分類関数（z-score基準）
-                def classify_cluster_type(row, z_df):
-                    try:
-                        z_row = z_df.loc[row.name]
-                        if z_row["奪三率"] > 0.5 and z_row["四球率"] > 0.2:
-                            return "パワー型"
-                        elif z_row["四球率"] < -0.5 and z_row["奪三率"] > 0.5:
-                            return "エース型"
-                        elif z_row["WHIP"] < -0.5 and z_row["四球率"] < -0.3:
-                            return "技巧型"
-                        elif z_row["被打率"] > 0.5:
-                            return "飛翔型"
-                        elif z_row["防御率"] > 0.7:
-                            return "2軍レベル"
-                        else:
-                            return "バランス型"
-                    except:
-                        return "未分類"
-
-                # z-score計算
-                cluster_centers_z = cluster_centers.apply(zscore)
-
-                # クラスタタイプ名称分類
-                cluster_type_names = [
-                    classify_cluster_type(row, cluster_centers_z)
-                    for _, row in cluster_centers.iterrows()
-                ]
-
-                st.markdown("#### 🧩 クラスタタイプ（仮称）")
-                for i, style in zip(cluster_centers.index, cluster_type_names):
-                    st.write(f"{i}: {style}")
-
-                # チーム別クラスタ構成比
-                st.markdown("#### 📈 チーム別クラスタ構成比")
-                cluster_counts = df_vis.groupby(["team_name", "cluster"]).size().unstack(fill_value=0)
-                cluster_counts_ratio = cluster_counts.div(cluster_counts.sum(axis=1), axis=0)
-
-                fig2, ax2 = plt.subplots(figsize=(10, 4))
-                cluster_counts_ratio.plot(kind="bar", stacked=True, ax=ax2, colormap="tab10")
-                ax2.set_ylabel("割合")
-                ax2.set_title(f"{league_name} チーム別クラスタ構成比")
-                ax2.legend(title="クラスタ")
-                st.pyplot(fig2)
-
-    elif mode == "野手":
-        # 野手クラスタリング
+    # 投手・野手で分岐（投手は全年度、野手は選択年度・打席100以上が対象）
+    if mode == "野手":
         st.write("#### 野手クラスタリング（t-SNE + KMeans）")
-        league_tabs = st.tabs(["⚾ 全体（12球団）", "🔵 セ・リーグ", "🟡 パ・リーグ"])
-        TEAM_SE = ["giants", "hanshin", "dragons", "baystars", "swallows", "carp"]
-        TEAM_PA = ["hawks", "lions", "eagles", "marines", "Buffaloes", "fighters"]
-
-        for idx, (tab, league_name, team_filter) in enumerate(zip(
-            league_tabs,
-            ["全体", "セ・リーグ", "パ・リーグ"],
-            [None, TEAM_SE, TEAM_PA]
-        )):
-            with tab:
-                st.write(f"#### {league_name} クラスタリング結果")
-
-                # データロード
-                df_bat = load_batter_data()
-                df_bat["year"] = pd.to_numeric(df_bat["year"], errors="coerce")
-                df_bat["打席"] = pd.to_numeric(df_bat["打席"], errors="coerce")
-                # チームフィルタ適用
-                if team_filter:
-                    df_bat = df_bat[df_bat["team_name"].isin(team_filter)]
-                # 年度フィルタ（最新年度のみ）
-                df_bat = df_bat[df_bat["year"] == selected_year]
-                # 打席100以上でフィルタ
-                df_bat = df_bat[df_bat["打席"] >= 100]
-                cluster_features = ["打率", "出塁率", "長打率", "本塁打", "三振"]
-                # 必要なカラムを数値に
-                for col in cluster_features:
-                    df_bat[col] = pd.to_numeric(df_bat[col], errors="coerce")
-                cluster_data = df_bat[cluster_features].dropna()
-                if cluster_data.shape[0] < 2:
-                    st.warning("クラスタリングに必要なデータが不足しています。")
-                    continue
-                from sklearn.manifold import TSNE
-                from sklearn.cluster import KMeans
-                import matplotlib.pyplot as plt
-                import numpy as np
-
-                perplexity = min(30, max(5, len(cluster_data) // 3))
-                tsne = TSNE(n_components=2, random_state=0, perplexity=perplexity)
-                tsne_result = tsne.fit_transform(cluster_data)
+    league_tabs = st.tabs(["⚾ 全体（12球団）", "🔵 セ・リーグ", "🟡 パ・リーグ"])
+
+    for idx, (tab, league_name, team_filter) in enumerate(zip(
+        league_tabs,
+        ["全体", "セ・リーグ", "パ・リーグ"],
+        [None, LEAGUE_TEAMS["セ・リーグ"], LEAGUE_TEAMS["パ・リーグ"]]
+    )):
+        with tab:
+            st.write(f"#### {league_name} クラスタリング結果")
+
+            # チームフィルタ適用・前処理
+            team_key = None if team_filter is None else tuple(team_filter)
+            if mode == "投手":
+                df_cluster, cluster_data, tsne_result, sweep = load_cluster_sweep(table_version("pitching_stats", teams=team_key), mode, teams=team_key)
+                slider_key = f"tsne_n_clusters_{idx}"
+            else:
+                df_cluster, cluster_data, tsne_result, sweep = load_cluster_sweep(table_version("batting_stats", selected_year, team_key), mode, selected_year, team_key)
+                slider_key = f"tsne_n_clusters_bat_{idx}"
 
-                n_clusters = st.slider(f"{league_name}のクラスタ数", 2, 6, 3, key=f"tsne_n_clusters_bat_{idx}")
-                kmeans = KMeans(n_clusters=n_clusters, random_state=0)
-                cluster_labels = kmeans.fit_predict(tsne_result)
+            if cluster_data.shape[0] < 2:
+                st.warning("クラスタリングに必要なデータが不足しています。")
+                continue
 
-                df_vis = df_bat.loc[cluster_data.index].copy()
-                df_vis["tsne_x"] = tsne_result[:, 0]
-                df_vis["tsne_y"] = tsne_result[:, 1]
-                df_vis["cluster"] = cluster_labels
+            n_clusters = choose_n_clusters(sweep, f"{league_name}のクラスタ数", slider_key)
+            cluster_labels = sweep_labels(sweep, tsne_result, n_clusters)
+            df_vis = cluster_frame(df_cluster, tsne_result, cluster_labels)
 
-                # 可視化
-                fig, ax = plt.subplots()
-                cmap = plt.get_cmap("tab10", n_clusters)
-                for i in range(n_clusters):
-                    d = df_vis[df_vis["cluster"] == i]
-                    ax.scatter(d["tsne_x"], d["tsne_y"], label=f"クラスタ{i+1}", color=cmap(i), alpha=0.7)
-                    for _, row in d.iterrows():
-                        ax.text(row["tsne_x"], row["tsne_y"], row["選手名"], fontsize=7)
-                ax.set_title(f"{league_name} クラスタリング（t-SNE + KMeans）")
-                ax.legend()
-                st.pyplot(fig)
+            # 可視化
+            fig, ax = plt.subplots()
+            cmap = plt.get_cmap("tab10", n_clusters)
+            for i in range(n_clusters):
+                d = df_vis[df_vis["cluster"] == i]
+                ax.scatter(d["tsne_x"], d["tsne_y"], label=f"クラスタ{i+1}", color=cmap(i), alpha=0.7)
+                for _, row in d.iterrows():
+                    ax.text(row["tsne_x"], row["tsne_y"], row["選手名"], fontsize=7)
+            # 特性検索に一致した投手を枠で強調
+            if trait_keys is not None:
+                hit = df_vis[key_mask(df_vis, trait_keys)]
+                ax.scatter(hit["tsne_x"], hit["tsne_y"], s=160, facecolors="none", edgecolors="black", linewidths=1.5, label="特性検索")
+            ax.set_title(f"{league_name} クラスタリング（t-SNE + KMeans）")
+            ax.legend()
+            st.pyplot(fig)
 
-                # クラスタ中心点の特徴表示
-                st.markdown("#### 📊 各クラスタの平均成績（中心点特徴）")
-                # 重複列を防ぐために df_vis 側の重複列を削除して結合
-                df_vis_clean = df_vis.drop(columns=[col for col in cluster_data.columns if col in df_vis.columns], errors="ignore")
-                df_vis_with_features = pd.concat([df_vis_clean.reset_index(drop=True), cluster_data.reset_index(drop=True)], axis=1)
-                cluster_centers = df_vis_with_features.groupby("cluster")[cluster_features].mean().round(2)
-                cluster_centers.index = [f"クラスタ{i+1}" for i in cluster_centers.index]
-                st.dataframe(cluster_centers)
-
-                # クラスタタイプ名称分類関数（z-score基準, 指定ロジック）
-                def classify_batter_type_all(cluster_centers_z):
-                    # cluster_centers_z: DataFrame, index=f"クラスタ1" etc, rows=clusters, columns=features
-                    cluster_names = [None] * len(cluster_centers_z)
-                    used_types = set()
-
-                    def get_type_name(center_z, used_types):
-                        # center_z is a Series
-                        obp = center_z.get("出塁率", 0)
-                        avg = center_z.get("打率", 0)
-                        slg = center_z.get("長打率", 0)
-                        hr = center_z.get("本塁打", 0)
-                        so = center_z.get("三振", 0)
-
-
-                        if slg > 0.8 and obp > 0.8:
-                            return "最強型"
-                        elif  obp > 0.8:
-                            return "1番型"
-                        elif avg > 0.6 and obp < 0.6:
-                            return "アヘ単型"
-                        elif hr > 0.5 and so > 0.5:
-                            return "ウホウホ本塁打型"
-                        elif so >0.2:
-                            return "三振マシン"
-                        return "バランス型"
-
-                    # 1周目: 最強型と1番型だけ使う
-                    for i, (_, center_z) in enumerate(cluster_centers_z.iterrows()):
-                        name = get_type_name(center_z, used_types)
-                        if name in {"最強型", "1番型"} and name not in used_types:
-                            cluster_names[i] = name
-                            used_types.add(name)
-
-                    # 2周目: アヘ単型、ウホウホ長打型を 1クラスタに限定して使う
-                    for i, (_, center_z) in enumerate(cluster_centers_z.iterrows()):
-                        if cluster_names[i] is not None:
-                            continue
-                        name = get_type_name(center_z, used_types)
-                        if name in {"アヘ単型", "ウホウホ長打型"} and name not in used_types:
-                            cluster_names[i] = name
-                            used_types.add(name)
-
-                    # 3周目: 残りはバランス型で埋める
-                    for i in range(len(cluster_centers_z)):
-                        if cluster_names[i] is None:
-                            cluster_names[i] = "バランス型"
-
-                    return cluster_names
-
-                # z-score計算
-                cluster_centers_z = cluster_centers.apply(zscore)
-                # クラスタタイプ名称分類（優先度ルール）
-                cluster_type_names = classify_batter_type_all(cluster_centers_z)
-
-                st.markdown("#### 🧩 クラスタタイプ（仮称）")
-                for i, style in zip(cluster_centers.index, cluster_type_names):
-                    st.write(f"{i}: {style}")
-
-                # チーム別クラスタ構成比
-                st.markdown("#### 📈 チーム別クラスタ構成比")
-                cluster_counts = df_vis.groupby(["team_name", "cluster"]).size().unstack(fill_value=0)
-                cluster_counts_ratio = cluster_counts.div(cluster_counts.sum(axis=1), axis=0)
-
-                fig2, ax2 = plt.subplots(figsize=(10, 4))
-                cluster_counts_ratio.plot(kind="bar", stacked=True, ax=ax2, colormap="tab10")
-                ax2.set_ylabel("割合")
-                ax2.set_title(f"{league_name} チーム別クラスタ構成比")
-                ax2.legend(title="クラスタ")
-                st.pyplot(fig2)
+            # クラスタ中心点の特徴表示
+            st.markdown("#### 📊 各クラスタの平均成績（中心点特徴）")
+            cluster_centers = cluster_center_table(cluster_data, cluster_labels)
+            st.dataframe(cluster_centers)
+
+            # クラスタタイプ名称分類（z-score基準）
+            cluster_types = cluster_type_names(cluster_centers, mode)
+
+            st.markdown("#### 🧩 クラスタタイプ（仮称）")
+            for i, style in zip(cluster_centers.index, cluster_types):
+                st.write(f"{i}: {style}")
+
+            # チーム別クラスタ構成比
+            st.markdown("#### 📈 チーム別クラスタ構成比")
+            cluster_counts_ratio = team_cluster_composition(df_vis)
+
+            fig2, ax2 = plt.subplots(figsize=(10, 4))
+            cluster_counts_ratio.plot(kind="bar", stacked=True, ax=ax2, colormap="tab10")
+            ax2.set_ylabel("割合")
+            ax2.set_title(f"{league_name} チーム別クラスタ構成比")
+            ax2.legend(title="クラスタ")
+            st.pyplot(fig2)
+
+    # 年度・リーグをまたいで比較できる共通ID（保存済みの中心点への最近傍割り当て）
+    st.markdown("### 🧬 アーキタイプ（全年度共通ID）")
+    archetype_model, df_archetype = load_archetype_assignments(table_version(ROLE_TABLES[mode]), mode)
+    st.dataframe(archetype_center_table(archetype_model))
+    archetype_share = archetype_composition(df_archetype, archetype_model)
+    share_year = archetype_share.xs(selected_year, level="year") if selected_year in archetype_share.index.get_level_values("year") else pd.DataFrame()
+    if share_year.empty:
+        st.info(f"{selected_year}年のアーキタイプ割り当て対象がいません。")
+    else:
+        fig3, ax3 = plt.subplots(figsize=(10, 4))
+        share_year.plot(kind="bar", stacked=True, ax=ax3, colormap="tab10")
+        ax3.set_ylabel("割合")
+        ax3.set_title(f"{selected_year}年 チーム別アーキタイプ構成比")
+        ax3.legend(title="アーキタイプ", bbox_to_anchor=(1.0, 1.0))
+        st.pyplot(fig3)
+
+    archetype_team = st.selectbox("チームの推移を表示", sorted(df_archetype["team_name"].dropna().unique()), key="archetype_team")
+    st.dataframe(archetype_share.loc[archetype_team].round(3) if archetype_team in archetype_share.index else pd.DataFrame())
+
+# --- 新規タブ: 左右の対戦相性 ---
+with tabs[11], alloc_probe(TAB_NAMES[11]):
+    st.write("### ⚔️ 左右の対戦相性（打者 × 投手）")
+    st.caption("打者の対右/対左打率と投手の右被/左被打率を打数に応じて全体打率へ寄せ、log5 で対戦ごとの打率を予想します。"
+               "有利度は左右を無視した場合との差（正なら打者有利）。打者は各チーム打席数上位9人。")
+    matchup_engine = load_matchup_engine(table_version(["batting_stats", "pitching_stats"], selected_year), int(selected_year))
+    matchup_teams = sorted(set(matchup_engine["batter_team"]) & set(matchup_engine["pitcher_team"]))
+    if not matchup_teams:
+        st.info(f"{selected_year}年の対戦データがありません。")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            bat_team = st.selectbox("打撃側チーム", matchup_teams, key="matchup_bat_team")
+        with col2:
+            pitch_team = st.selectbox("投手側チーム", matchup_teams, index=min(1, len(matchup_teams) - 1), key="matchup_pitch_team")
+        with col3:
+            matchup_value = st.radio("表示", ["有利度", "予想打率"], horizontal=True, key="matchup_value")
+        value_key = "advantage" if matchup_value == "有利度" else "expected"
+        matrix = load_matchup_matrix(table_version(["batting_stats", "pitching_stats"], selected_year), int(selected_year), bat_team, pitch_team, value_key)
+        value_format = "{:+.3f}" if value_key == "advantage" else "{:.3f}"
+        st.dataframe(matrix.style.format(value_format).background_gradient(cmap="RdBu_r", axis=None))
+
+        st.markdown("#### 12球団総当たり（打線平均・投手は対戦打者数で加重）")
+        sweep_table = league_sweep(matchup_engine, value_key)
+        st.dataframe(sweep_table.style.format(value_format).background_gradient(cmap="RdBu_r", axis=None))
+
+# --- メモリ使用量（共有データとこのセッション分） ---
+# 共有データはキャッシュ済みの表を数えるだけ（再読み込みはしない）。セッション分は session_state と絞り込み結果
+shared_objects = {
+    "投手成績": df, "野手成績": load_batter_data(), "能力": load_ability_data(), "守備": load_defense_data(),
+    "分位表": percentile_table,
+}
+shared_sizes = {name: object_bytes(obj) for name, obj in shared_objects.items()}
+session_bytes = object_bytes(dict(st.session_state)) + object_bytes(df_filtered)
+run_ctx = get_script_run_ctx()
+if run_ctx is not None:
+    record_session(session_registry(), run_ctx.session_id, session_bytes)
+with st.sidebar.expander("🧮 メモリ使用量"):
+    shared_total = sum(shared_sizes.values())
+    sessions = session_table(session_registry())
+    rss = process_rss()
+    st.caption(f"共有データ {shared_total / 2**20:.1f} MB / このセッション {session_bytes / 2**20:.2f} MB")
+    if rss is not None:
+        st.caption(f"プロセス全体 {rss / 2**20:.0f} MB・接続中 {len(sessions)} セッション")
+    st.dataframe(pd.Series(shared_sizes, name="MB").div(2**20).round(2))
+    per_session = sessions["peak_bytes"].max() if not sessions.empty else session_bytes
+    st.markdown("同時接続数ごとの見積もり（セッション分は記録中の最大値）")
+    st.dataframe(capacity_estimate(shared_total, per_session).round(1), hide_index=True)
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+# 守備配置の最適化（ability_stats のポジション別守備能力の合計が最大になるよう8つの守備位置に1人ずつ割り当てる）
+# 全チームの候補を (チーム × 選手 × 守備位置) の1つの配列に詰め、割り当て問題（ハンガリアン法）をチームごとに解く。
+# 正選手を決めたらその選手を外して解き直し、2番手・3番手の控えまでの depth chart を作る
+ALIGNMENT_POSITIONS = {
+    "捕手": "catcher", "一塁": "first", "二塁": "second", "三塁": "third",
+    "遊撃": "short", "左": "Left", "中": "center", "右": "Right",
+}
+DEPTH = 3
+# OPS偏差値はこの打席数以上の打者で計算し、満たない選手・打撃成績の無い選手はその最低値とする
+MIN_PA_FOR_OPS = 50
+# 守れない位置（能力が空欄）に割り当てないための大きなコスト
+_BLOCKED = 1e6
+
+
+# 年度の守備候補（いずれかの守備位置の能力がある選手）と打撃の OPS偏差値
+def alignment_candidates(df_ability, df_bat, year):
+    cols = list(ALIGNMENT_POSITIONS.values())
+    df_ability = df_ability[pd.to_numeric(df_ability["year"], errors="coerce") == year]
+    ratings = df_ability[cols].apply(pd.to_numeric, errors="coerce")
+    df = df_ability[["選手名", "team_name"]].assign(**ratings)[ratings.notna().any(axis=1).to_numpy()]
+
+    df_bat = df_bat[pd.to_numeric(df_bat["year"], errors="coerce") == year]
+    ops = pd.to_numeric(df_bat["OPS"], errors="coerce")
+    qualified = (pd.to_numeric(df_bat["打席"], errors="coerce") >= MIN_PA_FOR_OPS) & ops.notna()
+    if qualified.sum() > 1:
+        deviation = (ops - ops[qualified].mean()) / ops[qualified].std(ddof=0) * 10 + 50
+    else:
+        deviation = pd.Series(50.0, index=df_bat.index)
+    batting = df_bat[["選手名", "team_name"]].assign(OPS=ops, OPS偏差値=deviation.where(qualified))
+    df = df.merge(batting.drop_duplicates(["選手名", "team_name"]), on=["選手名", "team_name"], how="left")
+    floor = df["OPS偏差値"].min() if df["OPS偏差値"].notna().any() else 50.0
+    return df.assign(OPS偏差値=df["OPS偏差値"].fillna(floor)).reset_index(drop=True)
+
+
+# 候補表を (チーム × 選手 × 守備位置) の配列に詰める（選手数の少ないチームは空欄で埋める）
+def pack_candidates(candidates):
+    teams, team_codes = np.unique(candidates["team_name"].to_numpy(), return_inverse=True)
+    slot = candidates.groupby(team_codes).cumcount().to_numpy()
+    n_slots = int(slot.max()) + 1 if len(slot) else 0
+    ratings = np.full((len(teams), n_slots, len(ALIGNMENT_POSITIONS)), np.nan)
+    ratings[team_codes, slot] = candidates[list(ALIGNMENT_POSITIONS.values())].to_numpy(dtype=float)
+    deviation = np.full((len(teams), n_slots), np.nan)
+    deviation[team_codes, slot] = candidates["OPS偏差値"].to_numpy(dtype=float)
+    rows = np.full((len(teams), n_slots), -1)
+    rows[team_codes, slot] = np.arange(len(candidates))
+    return {"teams": teams, "ratings": ratings, "ops_deviation": deviation, "rows": rows, "candidates": candidates}
+
+
+# 全チームの depth chart（ops_weight: OPS偏差値の50からの差1あたり、守備能力何点分とみなすか。excluded: 外す選手名の集合（チームごと））
+def depth_charts(packed, ops_weight=0.0, excluded=None, depth=DEPTH):
+    ratings = packed["ratings"]
+    score = ratings + ops_weight * (packed["ops_deviation"][:, :, None] - 50)
+    cost = np.where(np.isnan(ratings), _BLOCKED, -score)
+    cost = np.where(packed["rows"][:, :, None] >= 0, cost, _BLOCKED)
+    names = packed["candidates"]["選手名"].to_numpy()[packed["rows"]]
+    for t, team in enumerate(packed["teams"]):
+        cost[t, np.isin(names[t], list((excluded or {}).get(team, ())))] = _BLOCKED
+
+    records = []
+    for level in range(1, depth + 1):
+        for t in range(len(packed["teams"])):
+            players, positions = linear_sum_assignment(cost[t])
+            filled = cost[t, players, positions] < _BLOCKED
+            for p, pos in zip(players[filled], positions[filled]):
+                records.append((t, level, pos, packed["rows"][t, p], ratings[t, p, pos], score[t, p, pos]))
+            # この段で使った選手は次の段の候補から外す
+            cost[t, players[filled]] = _BLOCKED
+    chart = pd.DataFrame(records, columns=["team", "順位", "pos", "row", "守備能力", "評価値"])
+    candidates = packed["candidates"].iloc[chart["row"].to_numpy()]
+    position_names = np.array(list(ALIGNMENT_POSITIONS))
+    chart = chart.assign(
+        team_name=packed["teams"][chart["team"].to_numpy()],
+        ポジション=position_names[chart["pos"].to_numpy()],
+        選手名=candidates["選手名"].to_numpy(),
+        OPS=candidates["OPS"].to_numpy(),
+        OPS偏差値=candidates["OPS偏差値"].round(1).to_numpy(),
+    )
+    chart = chart.sort_values(["team", "順位", "pos"], kind="stable")
+    return chart[["team_name", "順位", "ポジション", "選手名", "守備能力", "OPS", "OPS偏差値", "評価値"]].reset_index(drop=True)
+
+
+# 1チームの depth chart をポジション × 順位の表に
+def depth_chart_table(chart, team):
+    view = chart[chart["team_name"] == team]
+    table = view.pivot(index="ポジション", columns="順位", values="選手名")
+    rating = view.pivot(index="ポジション", columns="順位", values="守備能力")
+    table = table.astype("string").fillna("—") + " (" + rating.astype("Int64").astype("string").fillna("") + ")"
+    table.columns = [f"{level}番手" for level in table.columns]
+    return table.reindex([p for p in ALIGNMENT_POSITIONS if p in table.index])
+
+
+# 正選手の守備能力の合計（チームごと）
+def alignment_totals(chart):
+    starters = chart[chart["順位"] == 1]
+    return starters.groupby("team_name").agg(守備能力合計=("守備能力", "sum"), 評価値合計=("評価値", "sum"), 埋まった守備位置=("ポジション", "size"))
+
+
+# 現行の主力表（外野は能力の最も高い枠、内野・捕手は守備成績の位置）の各位置の出場最多選手とその位置の守備能力（空欄は NaN のまま）
+def current_alignment(df_regulars):
+    df = df_regulars[df_regulars["表示用ポジション"].isin(list(ALIGNMENT_POSITIONS))]
+    df = df.sort_values("出場", ascending=False, kind="mergesort").drop_duplicates(["team_name", "表示用ポジション"])
+    ratings = df[list(ALIGNMENT_POSITIONS.values())].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    column = df["表示用ポジション"].map({pos: i for i, pos in enumerate(ALIGNMENT_POSITIONS)}).to_numpy(dtype=int)
+    return pd.DataFrame({
+        "team_name": df["team_name"].to_numpy(),
+        "ポジション": df["表示用ポジション"].to_numpy(),
+        "現行の選手": df["選手名"].to_numpy(),
+        "現行の守備能力": ratings[np.arange(len(df)), column],
+    })
+
+
+# 最適配置の正選手と現行の主力の比較（両方に能力のある守備位置だけで合計する）
+# 現行側の「主力のいない位置」「能力が空欄の位置」は数を別の列に出す
+def alignment_comparison(chart, df_regulars):
+    starters = chart.loc[chart["順位"] == 1, ["team_name", "ポジション", "守備能力"]]
+    current = current_alignment(df_regulars)
+    merged = starters.merge(current, on=["team_name", "ポジション"], how="outer")
+    both = merged["守備能力"].notna() & merged["現行の守備能力"].notna()
+    merged = merged.assign(
+        最適=merged["守備能力"].where(both, 0),
+        現行=merged["現行の守備能力"].where(both, 0),
+        比較した守備位置=both,
+        現行の能力空欄=merged["現行の選手"].notna() & merged["現行の守備能力"].isna(),
+        現行に主力あり=merged["現行の選手"].notna(),
+    )
+    table = merged.groupby("team_name").agg(**{
+        "最適配置（比較位置）": ("最適", "sum"), "現行の主力（比較位置）": ("現行", "sum"),
+        "比較した守備位置": ("比較した守備位置", "sum"), "現行の能力空欄": ("現行の能力空欄", "sum"), "現行に主力あり": ("現行に主力あり", "sum"),
+    })
+    table.insert(2, "現行との差", table["最適配置（比較位置）"] - table["現行の主力（比較位置）"])
+    return table.assign(現行の主力なし=len(ALIGNMENT_POSITIONS) - table.pop("現行に主力あり"))
+
+
+# python alignment.py で12球団の depth chart 作成と、正選手1人が離脱した場合の再計算時間を計測
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    df_ability, df_bat = read_table("ability_stats"), read_table("batting_stats")
+    year = int(pd.to_numeric(df_ability["year"], errors="coerce").max())
+    start = time.perf_counter()
+    packed = pack_candidates(alignment_candidates(df_ability, df_bat, year))
+    t_pack = time.perf_counter() - start
+    start = time.perf_counter()
+    chart = depth_charts(packed)
+    t_solve = time.perf_counter() - start
+    print(f"{year}: {len(packed['teams'])} teams x {packed['ratings'].shape[1]} slots, pack {t_pack * 1000:.1f}ms, "
+          f"{DEPTH}-deep charts {t_solve * 1000:.1f}ms")
+
+    team = packed["teams"][0]
+    star = chart[(chart["team_name"] == team) & (chart["順位"] == 1)].sort_values("守備能力").iloc[-1]["選手名"]
+    n_runs = 50
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        what_if = depth_charts(packed, ops_weight=0.5, excluded={team: [star]})
+    print(f"what-if ({team} without {star}, OPS weight 0.5): {(time.perf_counter() - start) / n_runs * 1000:.1f}ms")
+    print(depth_chart_table(chart, team).to_string())
+    from regulars import regulars_table
+    df_regulars = regulars_table(read_table("defense_stats"), df_bat, df_ability, year)
+    print(alignment_totals(chart).join(alignment_comparison(chart, df_regulars)).to_string())
@@ -0,0 +1,43 @@
+import argparse
+import tracemalloc
+import warnings
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from frame_views import alloc_report
+from stats_common import read_table
+
+# 使い方: python alloc_report.py
+# アプリを投手・野手モードで1回ずつ実行し、タブごとのピーク割り当て量（tracemalloc）を表示する
+# 2回目の実行を計測するので、キャッシュ済みの計算ではなく各タブ本体の割り当てが見える
+APP = "GUItestv2.py"
+
+
+def run_mode(mode, timeout):
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.run()
+    if mode == "野手":
+        at.sidebar.radio[1].set_value("野手").run()
+    alloc_report(clear=True)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{mode}: {[e.value for e in at.exception]}")
+    return alloc_report(clear=True).assign(mode=mode)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="タブごとのメモリ割り当てレポート")
+    parser.add_argument("--timeout", type=int, default=600)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    data_kb = sum(read_table(t).memory_usage(deep=True).sum() for t in ["pitching_stats", "batting_stats"]) / 1024
+    tracemalloc.start()
+    report = pd.concat([run_mode(mode, args.timeout) for mode in ["投手", "野手"]], ignore_index=True)
+    tracemalloc.stop()
+
+    report["peak/data"] = report["peak_kb"] / data_kb
+    pd.set_option("display.width", 200)
+    print(f"season frames (pitching + batting): {data_kb:.0f} KB")
+    print(report[["mode", "block", "peak_kb", "retained_kb", "peak/data", "seconds"]].round(2).to_string(index=False))
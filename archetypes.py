@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans
+
+from percentiles import MIN_IP
+from clustering import (
+    PITCHER_CLUSTER_FEATURES, BATTER_CLUSTER_FEATURES,
+    pitcher_cluster_data, batter_cluster_data, cluster_type_names,
+)
+
+# 全年度共通のアーキタイプ（KMeans の中心点を保存し、以後の年度は最近傍の中心点に割り当てる）
+ARCHETYPE_DIR = "archetypes"
+ARCHETYPE_FILES = {"投手": "pitcher.json", "野手": "batter.json"}
+ROLE_FEATURES = {"投手": PITCHER_CLUSTER_FEATURES, "野手": BATTER_CLUSTER_FEATURES}
+N_ARCHETYPES = 5
+
+
+def archetype_path(role, directory=ARCHETYPE_DIR):
+    return os.path.join(directory, ARCHETYPE_FILES[role])
+
+
+# 役割ごとの入力（投手: 登板あり、野手: 打席100以上。どちらも全年度）
+def archetype_data(df, role, teams=None):
+    if role == "投手":
+        return pitcher_cluster_data(df, teams)
+    return batter_cluster_data(df, None, teams)
+
+
+# 新しい中心点を前回の中心点に対応付け（ハンガリアン法）、前回と同じIDを引き継ぐ
+def match_ids(centroids, previous):
+    if previous is None:
+        return list(range(1, len(centroids) + 1))
+    prev_centroids = np.asarray(previous["centroids"])
+    prev_ids = previous["ids"]
+    cost = np.linalg.norm(centroids[:, None, :] - prev_centroids[None, :, :], axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    ids = [None] * len(centroids)
+    for r, c in zip(rows, cols):
+        ids[r] = prev_ids[c]
+    # 前回より数が増えた分は新しいIDを振る
+    next_id = max(prev_ids) + 1
+    for i in range(len(ids)):
+        if ids[i] is None:
+            ids[i] = next_id
+            next_id += 1
+    return ids
+
+
+# 全年度のデータで中心点を学習（previous があればIDを引き継ぐ）
+def fit_archetypes(df, role, n_archetypes=N_ARCHETYPES, previous=None):
+    df_cluster, cluster_data = archetype_data(df, role)
+    # 投手は少ない投球回の極端な成績で中心点が引っ張られないよう、学習は投球回30以上に限る
+    if role == "投手":
+        cluster_data = cluster_data[pd.to_numeric(df_cluster["IP_"], errors="coerce") >= MIN_IP]
+    features = ROLE_FEATURES[role]
+    # 前回モデルがあれば同じ標準化を使い、中心点の距離を比較できるようにする
+    if previous is not None and previous["features"] == features:
+        mean, std = np.asarray(previous["mean"]), np.asarray(previous["std"])
+    else:
+        previous = None
+        mean = cluster_data.mean().to_numpy()
+        std = cluster_data.std(ddof=0).replace(0, 1).to_numpy()
+    scaled = (cluster_data.to_numpy(dtype=float) - mean) / std
+    kmeans = KMeans(n_clusters=n_archetypes, random_state=0, n_init=10).fit(scaled)
+    centroids = kmeans.cluster_centers_
+
+    ids = match_ids(centroids, previous)
+    order = np.argsort(ids)
+    centroids = centroids[order]
+    ids = [ids[i] for i in order]
+    centers_raw = pd.DataFrame(centroids * std + mean, columns=features).round(3)
+    return {
+        "role": role,
+        "features": features,
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "ids": ids,
+        "centroids": centroids.tolist(),
+        "centers": centers_raw.to_dict(orient="list"),
+        "names": cluster_type_names(centers_raw, role),
+        "years": sorted(int(y) for y in pd.to_numeric(df["year"], errors="coerce").dropna().unique()),
+    }
+
+
+def save_archetypes(model, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=1)
+
+
+def load_archetypes(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# 保存済みモデルがあれば読み込み、なければ学習して保存
+def load_or_fit(df, role, path=None):
+    path = path or archetype_path(role)
+    model = load_archetypes(path)
+    if model is not None and model["features"] == ROLE_FEATURES[role]:
+        return model
+    model = fit_archetypes(df, role)
+    try:
+        save_archetypes(model, path)
+    except OSError:
+        pass
+    return model
+
+
+# 最近傍の中心点に割り当て（標準化 + 距離計算1回のみ、再学習しない）
+def assign_archetypes(model, df, teams=None):
+    df_cluster, cluster_data = archetype_data(df, model["role"], teams)
+    scaled = (cluster_data.to_numpy(dtype=float) - np.asarray(model["mean"])) / np.asarray(model["std"])
+    centroids = np.asarray(model["centroids"])
+    dist = ((scaled[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    nearest = dist.argmin(axis=1)
+    df_assigned = df_cluster[["選手名", "team_name", "year"]].copy()
+    df_assigned["year"] = pd.to_numeric(df_assigned["year"], errors="coerce")
+    df_assigned["archetype"] = np.asarray(model["ids"])[nearest]
+    return df_assigned
+
+
+def archetype_labels(model):
+    return {i: f"A{i} {name}" for i, name in zip(model["ids"], model["names"])}
+
+
+# 中心点の成績（元の単位）
+def archetype_center_table(model):
+    centers = pd.DataFrame(model["centers"], index=archetype_labels(model).values())
+    centers.index.name = "アーキタイプ"
+    return centers
+
+
+# チーム × 年度ごとのアーキタイプ構成比
+def archetype_composition(df_assigned, model):
+    counts = df_assigned.groupby(["team_name", "year", "archetype"]).size().unstack(fill_value=0)
+    counts = counts.reindex(columns=model["ids"], fill_value=0)
+    share = counts.div(counts.sum(axis=1), axis=0)
+    share.columns = [archetype_labels(model)[i] for i in share.columns]
+    return share
+
+
+# python archetypes.py --refit で全年度から再学習（前回のIDを引き継いで保存）
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    parser = argparse.ArgumentParser(description="全年度共通のアーキタイプを学習・保存する")
+    parser.add_argument("--refit", action="store_true", help="保存済みモデルがあっても再学習する")
+    parser.add_argument("--k", type=int, default=N_ARCHETYPES, help="アーキタイプ数")
+    args = parser.parse_args()
+
+    sources = {"投手": read_table("pitching_stats"), "野手": read_table("batting_stats")}
+    for role, df in sources.items():
+        path = archetype_path(role)
+        previous = load_archetypes(path)
+        if previous is None or args.refit:
+            model = fit_archetypes(df, role, args.k, previous)
+            save_archetypes(model, path)
+            print(f"{role}: saved {path} (ids {model['ids']})")
+        else:
+            model = previous
+        start = time.perf_counter()
+        assigned = assign_archetypes(model, df)
+        print(f"{role}: assigned {len(assigned)} player-seasons in {(time.perf_counter() - start) * 1000:.1f}ms")
+        print(archetype_center_table(model))
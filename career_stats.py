@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+
+from derived_stats import WOBA_WEIGHTS
+
+# 通算・複数年の成績を年度方向の累積和（選手 × 年度 × 積み上げ項目）で持つ
+# 任意の年度範囲 [start, end] の合計は prefix[:, end+1] - prefix[:, start] の差1回で求まる
+# 率の指標は合計した積み上げ項目から計算し直す（年度ごとの率の平均にはしない）
+
+COMPONENTS = {
+    "野手": [
+        "試合", "打席", "打数", "安打", "単打", "二塁打", "三塁打", "本塁打", "塁打", "打点", "得点",
+        "四球", "死球", "三振", "犠打", "犠飛", "盗塁", "盗塁死", "併殺打",
+    ],
+    "投手": [
+        "登板", "先発", "勝", "敗", "セーブ", "HP", "完投", "完封", "IP_", "打者", "打数",
+        "被安打", "被本塁打", "与四球", "与死球", "奪三振", "失点", "自責点",
+    ],
+}
+# 規定の目安に使う積み上げ項目
+QUALIFY_COL = {"野手": "打席", "投手": "IP_"}
+# 期間内に出場した年度数（積み上げ項目の最後に1を足していく）
+SEASONS_COL = "年数"
+
+
+def _ratio(num, den):
+    out = np.full(len(num), np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+# 合計値から率の指標を計算
+def _batting_rates(t):
+    on_base_den = t["打数"] + t["四球"] + t["死球"] + t["犠飛"]
+    obp = _ratio(t["安打"] + t["四球"] + t["死球"], on_base_den)
+    slg = _ratio(t["塁打"], t["打数"])
+    return {
+        "打率": _ratio(t["安打"], t["打数"]),
+        "出塁率": obp,
+        "長打率": slg,
+        "OPS": obp + slg,
+        "ISO": _ratio(t["塁打"] - t["安打"], t["打数"]),
+        "BABIP": _ratio(t["安打"] - t["本塁打"], t["打数"] - t["三振"] - t["本塁打"] + t["犠飛"]),
+        "wOBA": _ratio(sum(w * t[c] for c, w in WOBA_WEIGHTS.items()), on_base_den),
+        "三振率": _ratio(t["三振"], t["打数"]),
+    }
+
+
+def _pitching_rates(t):
+    ip = t["IP_"]
+    return {
+        "防御率": _ratio(t["自責点"] * 9, ip),
+        "WHIP": _ratio(t["被安打"] + t["与四球"], ip),
+        "奪三率": _ratio(t["奪三振"] * 9, ip),
+        "四球率": _ratio(t["与四球"] * 9, ip),
+        "K/BB": _ratio(t["奪三振"], t["与四球"]),
+        "被打率": _ratio(t["被安打"], t["打数"]),
+        "被BABIP": _ratio(t["被安打"] - t["被本塁打"], t["打数"] - t["奪三振"] - t["被本塁打"]),
+        "勝率": _ratio(t["勝"], t["勝"] + t["敗"]),
+    }
+
+
+RATES = {"野手": _batting_rates, "投手": _pitching_rates}
+RATE_DIGITS = {"防御率": 2, "WHIP": 2, "奪三率": 2, "四球率": 2, "K/BB": 2}
+CAREER_METRICS = {
+    "野手": ["OPS", "打率", "出塁率", "長打率", "wOBA", "ISO", "BABIP", "本塁打", "安打", "打点", "得点", "盗塁", "四球", "三振"],
+    "投手": ["防御率", "WHIP", "奪三率", "四球率", "K/BB", "被打率", "勝", "セーブ", "HP", "奪三振", "IP_", "完封", "勝率"],
+}
+
+
+# 同一選手の判定（選手名 + 生年月日。生年月日の「(xx歳)」は年度で変わるので除く。無ければチーム名で代用）
+def player_keys(df):
+    birth = df["birth"].astype("string").str.replace(r"\(.*\)$", "", regex=True) if "birth" in df.columns else None
+    if birth is None:
+        birth = "team:" + df["team_name"].astype("string")
+    else:
+        birth = birth.fillna("team:" + df["team_name"].astype("string"))
+    return pd.MultiIndex.from_arrays([df["選手名"].astype("string"), birth], names=["選手名", "生年月日"])
+
+
+# 選手 × 年度の累積和を作る（データ更新時に1回）
+def build_prefix(df, role):
+    components = [c for c in COMPONENTS[role] if c in df.columns]
+    years = pd.to_numeric(df["year"], errors="coerce")
+    valid = (years.notna() & df["選手名"].notna()).to_numpy()
+    df, years = df[valid], years[valid].astype(int).to_numpy()
+    codes, players = pd.factorize(player_keys(df))
+    first_year = years.min() if len(years) else 0
+    year_list = np.arange(first_year, (years.max() if len(years) else -1) + 1)
+
+    values = np.column_stack(
+        [pd.to_numeric(df[c], errors="coerce").fillna(0).to_numpy(dtype=float) for c in components] + [np.ones(len(df))]
+    )
+    totals = np.zeros((len(players), len(year_list), values.shape[1]))
+    np.add.at(totals, (codes, years - first_year), values)
+    prefix = np.zeros((len(players), len(year_list) + 1, values.shape[1]))
+    np.cumsum(totals, axis=1, out=prefix[:, 1:])
+
+    # 表示用の所属は最新年度のもの
+    order = np.argsort(years, kind="stable")
+    latest = pd.DataFrame({"code": codes[order], "team_name": df["team_name"].to_numpy()[order], "最終年度": years[order]})
+    latest = latest.groupby("code").last()
+    player_table = players.to_frame(index=False, name=["選手名", "生年月日"]).assign(
+        team_name=latest["team_name"].to_numpy(), 最終年度=latest["最終年度"].to_numpy()
+    )
+    return {"role": role, "players": player_table, "years": year_list, "components": components + [SEASONS_COL], "prefix": prefix}
+
+
+def _year_index(prefix, year):
+    return int(np.clip(int(year) - prefix["years"][0], 0, len(prefix["years"])))
+
+
+# 合計値の配列（行 × 積み上げ項目）から表を作る
+def _totals_frame(prefix, sums):
+    totals = pd.DataFrame(sums, columns=prefix["components"]).astype({SEASONS_COL: int})
+    rates = RATES[prefix["role"]](totals)
+    rates = {name: np.round(v, RATE_DIGITS.get(name, 3)) for name, v in rates.items()}
+    # 投球回（1/3回単位の合計）は丸めずに持つ。規定の判定もこの値で行い、丸めるのは表示するときだけ
+    return totals.assign(**rates)
+
+
+# 年度範囲 [start, end] の通算成績（全選手。差分1回）
+def window_totals(prefix, start, end):
+    lo, hi = _year_index(prefix, start), _year_index(prefix, int(end) + 1)
+    sums = prefix["prefix"][:, hi] - prefix["prefix"][:, lo]
+    table = pd.concat([prefix["players"], _totals_frame(prefix, sums)], axis=1)
+    return table[table[SEASONS_COL] > 0]
+
+
+# 連続 n 年の全区間（選手 × 終了年度）。各区間も累積和の差だけで求める
+def rolling_totals(prefix, n_years):
+    p = prefix["prefix"]
+    n_years = int(n_years)
+    if n_years < 1 or n_years > p.shape[1] - 1:
+        return pd.DataFrame()
+    sums = p[:, n_years:] - p[:, :-n_years]
+    n_players, n_windows, _ = sums.shape
+    end_years = prefix["years"][n_years - 1:]
+    table = pd.concat([
+        prefix["players"].iloc[np.repeat(np.arange(n_players), n_windows)].reset_index(drop=True),
+        _totals_frame(prefix, sums.reshape(n_players * n_windows, -1)),
+    ], axis=1)
+    ends = np.tile(end_years, n_players)
+    table.insert(2, "期間", [f"{e - n_years + 1}–{e}" for e in ends])
+    return table[table[SEASONS_COL] > 0]
+
+
+def _rank(table, prefix, metric, min_qualify, ascending, top_n):
+    table = table[(table[QUALIFY_COL[prefix["role"]]] >= min_qualify) & table[metric].notna()]
+    cols = [c for c in ["選手名", "team_name", "期間", SEASONS_COL, QUALIFY_COL[prefix["role"]], metric] if c in table.columns]
+    return table.sort_values(metric, ascending=ascending, kind="stable")[cols].head(top_n).reset_index(drop=True)
+
+
+# 年度範囲の通算ランキング
+def career_leaderboard(prefix, metric, start, end, min_qualify=0, ascending=False, top_n=10):
+    return _rank(window_totals(prefix, start, end), prefix, metric, min_qualify, ascending, top_n)
+
+
+# 連続 n 年のベスト区間ランキング（同じ選手の別区間も並ぶ）
+def rolling_leaderboard(prefix, metric, n_years, min_qualify=0, ascending=False, top_n=10):
+    table = rolling_totals(prefix, n_years)
+    if table.empty:
+        return table
+    return _rank(table, prefix, metric, min_qualify, ascending, top_n)
+
+
+# 1選手の年度別 + 通算（サマリーパネル用）
+def player_career(prefix, name, birth=None):
+    players = prefix["players"]
+    mask = players["選手名"] == name
+    if birth is not None:
+        mask &= players["生年月日"] == pd.Series([birth]).str.replace(r"\(.*\)$", "", regex=True).iloc[0]
+    idx = np.flatnonzero(mask.to_numpy())
+    if len(idx) == 0:
+        return pd.DataFrame()
+    p = prefix["prefix"][idx[0]]
+    seasons = np.diff(p, axis=0)
+    played = seasons[:, -1] > 0
+    rows = np.vstack([seasons[played], p[-1] - p[0]])
+    labels = [str(y) for y in prefix["years"][played]] + ["通算"]
+    return _totals_frame(prefix, rows).drop(columns=SEASONS_COL).assign(年度=labels).set_index("年度")
+
+
+# python career_stats.py で、年度を複製した合成データ上で範囲集計（累積和の差）と毎回の groupby を比べる
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+    from derived_stats import add_pitching_derived
+
+    n_seasons = 30
+    sources = {"野手": read_table("batting_stats"), "投手": add_pitching_derived(read_table("pitching_stats"))}
+    for role, df in sources.items():
+        base_year = int(pd.to_numeric(df["year"], errors="coerce").max())
+        synthetic = pd.concat([df.assign(year=base_year - i) for i in range(n_seasons)], ignore_index=True)
+        start = time.perf_counter()
+        prefix = build_prefix(synthetic, role)
+        print(f"{role}: build {len(synthetic)} rows x {len(prefix['years'])} years in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        lo, hi = base_year - 9, base_year
+        start = time.perf_counter()
+        fast = window_totals(prefix, lo, hi)
+        t_fast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        years = pd.to_numeric(synthetic["year"], errors="coerce")
+        scan = synthetic[(years >= lo) & (years <= hi)]
+        keys = player_keys(scan)
+        comps = [c for c in prefix["components"] if c != SEASONS_COL]
+        slow = scan[comps].apply(pd.to_numeric, errors="coerce").fillna(0).groupby(keys).sum()
+        t_scan = time.perf_counter() - start
+
+        check = fast.set_index(["選手名", "生年月日"])[comps].sort_index()
+        same = np.allclose(check.to_numpy(), slow.loc[check.index].to_numpy())
+        print(f"  {lo}-{hi}: prefix diff {t_fast * 1000:.2f}ms vs groupby scan {t_scan * 1000:.2f}ms (same totals: {same})")
+        metric = CAREER_METRICS[role][0]
+        print(career_leaderboard(prefix, metric, lo, hi, min_qualify=1000 if role == "野手" else 300,
+                                 ascending=role == "投手", top_n=3).to_string(index=False))
@@ -0,0 +1,183 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from scipy.stats import zscore  # クラスタタイプ分類で使用
+from sklearn.cluster import KMeans
+from sklearn.manifold import TSNE
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from frame_views import numeric
+
+PITCHER_CLUSTER_FEATURES = ["防御率", "奪三率", "四球率", "WHIP", "被本率", "被打率"]
+BATTER_CLUSTER_FEATURES = ["打率", "出塁率", "長打率", "本塁打", "三振"]
+
+# 野手クラスタリングの対象（打席100以上）
+MIN_PA = 100
+
+# クラスタ数の探索範囲（スライダーと同じ 2〜6）
+K_RANGE = range(2, 7)
+
+
+# 投手クラスタリングの入力（登板数が0の選手を除外）
+def pitcher_cluster_data(df_pitch, teams=None):
+    games = numeric(df_pitch, "登板")
+    keep = games > 0
+    if teams is not None:
+        keep &= df_pitch["team_name"].isin(teams).to_numpy()
+    df_cluster = df_pitch[keep].assign(登板=games[keep])
+    cluster_data = df_cluster[PITCHER_CLUSTER_FEATURES].apply(pd.to_numeric, errors="coerce").dropna()
+    return df_cluster.loc[cluster_data.index], cluster_data
+
+
+# 野手クラスタリングの入力（指定年度・打席100以上、year=None で全年度）
+def batter_cluster_data(df_bat, year, teams=None, min_pa=MIN_PA):
+    years = numeric(df_bat, "year")
+    pa = numeric(df_bat, "打席")
+    keep = pa >= min_pa
+    if teams is not None:
+        keep &= df_bat["team_name"].isin(teams).to_numpy()
+    if year is not None:
+        keep &= years == year
+    df_cluster = df_bat[keep].assign(year=years[keep], 打席=pa[keep])
+    df_cluster = df_cluster.assign(**{col: numeric(df_cluster, col) for col in BATTER_CLUSTER_FEATURES})
+    cluster_data = df_cluster[BATTER_CLUSTER_FEATURES].dropna()
+    return df_cluster.loc[cluster_data.index], cluster_data
+
+
+# t-SNE で2次元に圧縮（perplexityはサンプル数の1/3または最大30を目安に自動調整、最低5）
+def tsne_embedding(cluster_data):
+    perplexity = min(30, max(5, len(cluster_data) // 3))
+    tsne = TSNE(n_components=2, random_state=0, perplexity=perplexity)
+    return tsne.fit_transform(cluster_data)
+
+
+# t-SNE で圧縮した2次元データを KMeans でクラスタ分け
+def kmeans_labels(embedding, n_clusters):
+    kmeans = KMeans(n_clusters=n_clusters, random_state=0)
+    return kmeans.fit_predict(embedding)
+
+
+# 1つの k について KMeans を当ててシルエット係数を計算
+def _score_k(X, k):
+    labels = KMeans(n_clusters=k, random_state=0).fit_predict(X)
+    return labels, silhouette_score(X, labels)
+
+
+# k を並列に振ってシルエット係数で評価（t-SNE 埋め込みと標準化した元指標の両方）
+# KMeans は計算中に GIL を解放するのでスレッドで並列化できる
+def cluster_sweep(cluster_data, embedding, k_values=K_RANGE, workers=None):
+    k_values = [k for k in k_values if 2 <= k < len(cluster_data)]
+    if not k_values:
+        return None
+    scaled = StandardScaler().fit_transform(cluster_data)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        on_embedding = list(pool.map(lambda k: _score_k(embedding, k), k_values))
+        on_scaled = list(pool.map(lambda k: _score_k(scaled, k), k_values))
+    scores = pd.DataFrame({
+        "シルエット（t-SNE）": [score for _, score in on_embedding],
+        "シルエット（標準化指標）": [score for _, score in on_scaled],
+    }, index=pd.Index(k_values, name="クラスタ数"))
+    # 表示・タイプ分類は t-SNE 上のクラスタを使うため、その係数が最大の k を採用
+    return {
+        "scores": scores,
+        "labels": {k: labels for k, (labels, _) in zip(k_values, on_embedding)},
+        "best_k": int(scores["シルエット（t-SNE）"].idxmax()),
+    }
+
+
+# 可視化用の表（tsne_x, tsne_y, cluster）
+def cluster_frame(df_cluster, embedding, labels):
+    return df_cluster.assign(tsne_x=embedding[:, 0], tsne_y=embedding[:, 1], cluster=labels)
+
+
+# 各クラスタの平均成績（中心点特徴）
+def cluster_center_table(cluster_data, labels):
+    cluster_centers = cluster_data.groupby(labels).mean().round(2)
+    cluster_centers.index = [f"クラスタ{i+1}" for i in cluster_centers.index]
+    return cluster_centers
+
+
+# クラスタタイプ名称分類関数（z-score基準）
+def classify_cluster_type(row, z_df):
+    try:
+        z_row = z_df.loc[row.name]
+        if z_row["奪三率"] > 0.5 and z_row["四球率"] > 0.2:
+            return "パワー型"
+        elif z_row["四球率"] < -0.5 and z_row["奪三率"] > 0.5:
+            return "エース型"
+        elif z_row["WHIP"] < -0.5 and z_row["四球率"] < -0.3:
+            return "技巧型"
+        elif z_row["被打率"] > 0.5:
+            return "飛翔型"
+        elif z_row["防御率"] > 0.7:
+            return "2軍レベル"
+        else:
+            return "バランス型"
+    except:
+        return "未分類"
+
+
+# クラスタタイプ名称分類関数（z-score基準, 指定ロジック）
+def classify_batter_type_all(cluster_centers_z):
+    # cluster_centers_z: DataFrame, index=f"クラスタ1" etc, rows=clusters, columns=features
+    cluster_names = [None] * len(cluster_centers_z)
+    used_types = set()
+
+    def get_type_name(center_z, used_types):
+        # center_z is a Series
+        obp = center_z.get("出塁率", 0)
+        avg = center_z.get("打率", 0)
+        slg = center_z.get("長打率", 0)
+        hr = center_z.get("本塁打", 0)
+        so = center_z.get("三振", 0)
+
+
+        if slg > 0.8 and obp > 0.8:
+            return "最強型"
+        elif  obp > 0.8:
+            return "1番型"
+        elif avg > 0.6 and obp < 0.6:
+            return "アヘ単型"
+        elif hr > 0.5 and so > 0.5:
+            return "ウホウホ本塁打型"
+        elif so >0.2:
+            return "三振マシン"
+        return "バランス型"
+
+    # 1周目: 最強型と1番型だけ使う
+    for i, (_, center_z) in enumerate(cluster_centers_z.iterrows()):
+        name = get_type_name(center_z, used_types)
+        if name in {"最強型", "1番型"} and name not in used_types:
+            cluster_names[i] = name
+            used_types.add(name)
+
+    # 2周目: アヘ単型、ウホウホ長打型を 1クラスタに限定して使う
+    for i, (_, center_z) in enumerate(cluster_centers_z.iterrows()):
+        if cluster_names[i] is not None:
+            continue
+        name = get_type_name(center_z, used_types)
+        if name in {"アヘ単型", "ウホウホ長打型"} and name not in used_types:
+            cluster_names[i] = name
+            used_types.add(name)
+
+    # 3周目: 残りはバランス型で埋める
+    for i in range(len(cluster_centers_z)):
+        if cluster_names[i] is None:
+            cluster_names[i] = "バランス型"
+
+    return cluster_names
+
+
+# クラスタタイプ名称（mode: 投手 / 野手）
+def cluster_type_names(cluster_centers, mode):
+    cluster_centers_z = cluster_centers.apply(zscore)
+    if mode == "野手":
+        return classify_batter_type_all(cluster_centers_z)
+    return [classify_cluster_type(row, cluster_centers_z) for _, row in cluster_centers.iterrows()]
+
+
+# チーム別クラスタ構成比
+def team_cluster_composition(df_vis):
+    cluster_counts = df_vis.groupby(["team_name", "cluster"]).size().unstack(fill_value=0)
+    return cluster_counts.div(cluster_counts.sum(axis=1), axis=0)
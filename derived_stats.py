@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from stats_common import league_of
+
+# 元データに無い複合指標を全選手・全年度まとめて列として追加する（データ更新時に1回だけ）
+# 以後はランキング・サマリーパネル・クラスタリングのどこからでも普通の列として使える
+
+# wOBA の係数（NPB の近年の線形加重値に近い値）
+WOBA_WEIGHTS = {"四球": 0.69, "死球": 0.72, "単打": 0.89, "二塁打": 1.27, "三塁打": 1.62, "本塁打": 2.10}
+WOBA_SCALE = 1.24
+# FIP の係数（定数項は年度・リーグの防御率に合わせる）
+FIP_WEIGHTS = {"HR": 13, "BB": 3, "K": -2}
+
+BATTING_DERIVED = ["BABIP", "ISO", "wOBA", "wRAA"]
+PITCHING_DERIVED = ["被本塁打", "被BABIP", "K%", "BB%", "FIP（算出）"]
+
+
+def _col(df, name):
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    values = df[name]
+    if values.dtype.kind not in "fiu":
+        values = pd.to_numeric(values, errors="coerce")
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+# 分母が0以下の行は NaN
+def _ratio(num, den):
+    out = np.full(len(num), np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+# 年度・リーグごとの加重平均（weights が0の行は平均に含めない）
+def _group_mean(df, values, weights):
+    keys = [pd.to_numeric(df["year"], errors="coerce"), league_of(df["team_name"])]
+    frame = pd.DataFrame({"v": np.nan_to_num(values) * weights, "w": np.where(np.isnan(values), 0, weights)})
+    sums = frame.groupby(keys, dropna=False).transform("sum")
+    return _ratio(sums["v"].to_numpy(), sums["w"].to_numpy())
+
+
+# 野手: BABIP・ISO・wOBA・wRAA（wRAA は同年度・同リーグ平均との差を打席数で積み上げたもの）
+def add_batting_derived(df):
+    hits, hr, ab = _col(df, "安打"), _col(df, "本塁打"), _col(df, "打数")
+    so, sf, hbp, bb = _col(df, "三振"), _col(df, "犠飛"), _col(df, "死球"), _col(df, "四球")
+    pa = _col(df, "打席")
+    woba_den = ab + bb + sf + hbp
+    woba = _ratio(sum(w * _col(df, c) for c, w in WOBA_WEIGHTS.items()), woba_den)
+    lg_woba = _group_mean(df, woba, np.nan_to_num(woba_den))
+    return df.assign(**{
+        "BABIP": _ratio(hits - hr, ab - so - hr + sf).round(3),
+        "ISO": _ratio(_col(df, "塁打") - hits, ab).round(3),
+        "wOBA": woba.round(3),
+        "wRAA": ((woba - lg_woba) / WOBA_SCALE * pa).round(1),
+    })
+
+
+# 投手: 被本塁打（被本率×投球回から復元）・被BABIP・K%・BB%・FIP
+# 元データの FIP は算出方法が不明なため、同年度・同リーグの防御率に合わせた FIP を別列で持つ
+def add_pitching_derived(df):
+    ip = _col(df, "IP_")
+    hr = np.round(_col(df, "被本率") * ip / 9)
+    k, bb, hbp = _col(df, "奪三振"), _col(df, "与四球"), _col(df, "与死球")
+    batters = _col(df, "打者")
+    fip_raw = _ratio(FIP_WEIGHTS["HR"] * hr + FIP_WEIGHTS["BB"] * (bb + hbp) + FIP_WEIGHTS["K"] * k, ip)
+    lg_era = _group_mean(df, _col(df, "防御率"), np.nan_to_num(ip))
+    lg_fip_raw = _group_mean(df, fip_raw, np.nan_to_num(ip))
+    return df.assign(**{
+        "被本塁打": hr,
+        "被BABIP": _ratio(_col(df, "被安打") - hr, _col(df, "打数") - k - hr).round(3),
+        "K%": (_ratio(k, batters) * 100).round(1),
+        "BB%": (_ratio(bb, batters) * 100).round(1),
+        "FIP（算出）": (fip_raw + lg_era - lg_fip_raw).round(2),
+    })
+
+
+# python derived_stats.py で全選手分の計算時間と上位を表示
+if __name__ == "__main__":
+    import time
+    from roster_parse import parse_hand_position
+    from frame_views import typed_frame
+    from stats_common import read_table
+
+    for table, add, cols, key in [
+        ("batting_stats", add_batting_derived, BATTING_DERIVED, "wRAA"),
+        ("pitching_stats", add_pitching_derived, PITCHING_DERIVED, "FIP（算出）"),
+    ]:
+        df = typed_frame(parse_hand_position(read_table(table)))
+        start = time.perf_counter()
+        out = add(df)
+        print(f"{table}: {len(out)} rows in {(time.perf_counter() - start) * 1000:.1f}ms")
+        print(out.sort_values(key, ascending=key == "FIP（算出）")[["選手名", "team_name", "year"] + cols].head(5).to_string(index=False))
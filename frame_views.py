@@ -0,0 +1,84 @@
+import contextlib
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# 読み込み時に1回だけ型を揃え、以後は列配列を共有したまま行番号・マスクで絞り込む
+# pandas 2 系でも Copy-on-Write を有効にし、列の追加・部分選択で全体コピーが起きないようにする
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# 数値化しない列（それ以外の文字列列は読み込み時に数値化を試みる）
+TEXT_COLS = {"選手名", "team_name", "position", "hand", "birth", "draft", "filename", "group_file", "チーム", "ポジション"}
+
+# タブごとのメモリ割り当て記録（tracemalloc が有効なときだけ記録）
+_alloc_log = []
+
+
+# 年度などの文字列列を数値に揃えた読み取り専用の表
+def typed_frame(df):
+    converted = {}
+    for col in df.columns:
+        if col in TEXT_COLS or df[col].dtype.kind in "fiub" or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        # 数値として読めない値が混ざる列は元のまま
+        if values.notna().sum() == df[col].notna().sum():
+            converted[col] = values
+    return df.assign(**converted) if converted else df
+
+
+# 年度・チームでの絞り込み結果を行番号で返す
+def rows_where(df, year=None, teams=None, mask=None):
+    keep = np.ones(len(df), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    if year is not None:
+        keep &= (df["year"] == year).to_numpy()
+    if teams is not None:
+        keep &= df["team_name"].isin(teams).to_numpy()
+    return np.flatnonzero(keep)
+
+
+# 指定行・指定列だけを取り出す（全列コピーを避ける）
+def take(df, rows, cols=None):
+    if cols is not None:
+        df = df[list(dict.fromkeys(cols))]
+    return df.iloc[rows]
+
+
+# 数値配列として取り出す（数値列はそのまま、文字列列だけ変換）
+def numeric(df, col, rows=None):
+    values = df[col]
+    if values.dtype.kind not in "fiu":
+        values = pd.to_numeric(values, errors="coerce")
+    values = values.to_numpy() if values.dtype.kind == "f" else values.to_numpy(dtype=float, na_value=np.nan)
+    return values if rows is None else values[rows]
+
+
+# with alloc_probe("タブ名"): でブロック内のピーク割り当て量を記録
+@contextlib.contextmanager
+def alloc_probe(label):
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        after, peak = tracemalloc.get_traced_memory()
+        _alloc_log.append({
+            "block": label,
+            "peak_kb": (peak - before) / 1024,
+            "retained_kb": (after - before) / 1024,
+            "seconds": time.perf_counter() - start,
+        })
+
+
+def alloc_report(clear=True):
+    report = pd.DataFrame(_alloc_log, columns=["block", "peak_kb", "retained_kb", "seconds"])
+    if clear:
+        _alloc_log.clear()
+    return report
@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+
+# スクリーンショット（image/<年度>/teamXX_groupYY_N.png）の知覚ハッシュ索引
+# 画面の枠・ラベルは全画像で共通なので、8×8 の64ビットハッシュでは別選手の画面どうしもほぼ一致してしまう。
+# 32×32 の dHash（1024ビット）で近さを判定し、16×16 の pHash（256ビット）も記録しておく
+# 取り込み時は (サイズ, 更新時刻) が前回と同じ画像は読み込まず、変わった画像だけプロセスプールでハッシュを計算する
+IMAGE_DIR = "image"
+HASH_INDEX = os.path.join("derived", "image_hashes.json")
+DHASH_SIZE = 32
+PHASH_SIZE = 16
+# pHash は PHASH_SIZE の4倍の正方形に縮小してから DCT をとる
+PHASH_SCALE = 4
+# dHash の距離がこれ以下なら同じ画面（撮り直し・再保存）とみなす（実データでは同じ画面が0〜1、別の画面は9以上）
+NEAR_DUPLICATE_DISTANCE = 6
+# 近傍検索の索引は dHash を32ビットずつの帯に分ける
+BAND_BITS = 32
+# これより少ない枚数はプロセスを起こさずに計算する
+MIN_POOL_FILES = 64
+
+
+def read_gray(path):
+    # 日本語を含むパスでも読めるようにバイト列から復号する
+    data = np.fromfile(path, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE) if len(data) else None
+
+
+# 横に隣り合う画素の大小（DHASH_SIZE × DHASH_SIZE ビット）
+def dhash(gray, size=DHASH_SIZE):
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return np.packbits((small[:, 1:] > small[:, :-1]).ravel())
+
+
+# 低周波 DCT 係数が中央値（直流成分を除く）より大きいか
+def phash(gray, size=PHASH_SIZE):
+    small = cv2.resize(gray, (size * PHASH_SCALE,) * 2, interpolation=cv2.INTER_AREA).astype(np.float32)
+    coeffs = cv2.dct(small)[:size, :size]
+    return np.packbits((coeffs > np.median(coeffs.ravel()[1:])).ravel())
+
+
+# 1枚分のハッシュ（読めない画像は None）。プロセスプールから呼ぶのでモジュール直下に置く
+def hash_image(path):
+    gray = read_gray(path)
+    if gray is None:
+        return None
+    return {"dhash": dhash(gray).tobytes().hex(), "phash": phash(gray).tobytes().hex()}
+
+
+def hash_files(paths, workers=None):
+    if len(paths) < MIN_POOL_FILES or workers == 1:
+        return [hash_image(p) for p in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_image, paths, chunksize=16))
+
+
+# root 以下の png（root からの相対パス、区切りは "/"）
+def list_images(root=IMAGE_DIR):
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".png"):
+                found.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"))
+    return sorted(found)
+
+
+def load_hash_index(path=HASH_INDEX):
+    if not os.path.exists(path):
+        return {"images": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_hash_index(index, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def hash_distance(a, b):
+    xa = np.frombuffer(bytes.fromhex(a), dtype=np.uint64)
+    xb = np.frombuffer(bytes.fromhex(b), dtype=np.uint64)
+    return int(np.bitwise_count(xa ^ xb).sum())
+
+
+# 前回の取り込みからの差分を調べて索引を更新する
+# 戻り値の "to_process"（新規 + 内容の変わった画像のうち、他の画像と同じ画面でないもの）だけを後段の読み取りに回せばよい
+def ingest(root=IMAGE_DIR, index_path=HASH_INDEX, workers=None):
+    index = load_hash_index(index_path)
+    records = index["images"]
+    files = list_images(root)
+    stats = {rel: os.stat(os.path.join(root, rel)) for rel in files}
+    stale = [rel for rel in files
+             if rel not in records
+             or (records[rel]["size"], records[rel]["mtime_ns"]) != (stats[rel].st_size, stats[rel].st_mtime_ns)]
+    hashes = hash_files([os.path.join(root, rel) for rel in stale], workers)
+
+    report = {"new": [], "changed": [], "same_content": [], "unreadable": [], "skipped": len(files) - len(stale)}
+    for rel, hashed in zip(stale, hashes):
+        if hashed is None:
+            report["unreadable"].append(rel)
+            records.pop(rel, None)
+            continue
+        previous = records.get(rel)
+        if previous is None:
+            report["new"].append(rel)
+        elif hash_distance(previous["dhash"], hashed["dhash"]) > NEAR_DUPLICATE_DISTANCE:
+            report["changed"].append(rel)
+        else:
+            report["same_content"].append(rel)
+        records[rel] = {"size": stats[rel].st_size, "mtime_ns": stats[rel].st_mtime_ns, **hashed}
+    report["removed"] = sorted(set(records) - set(files))
+    for rel in report["removed"]:
+        records.pop(rel)
+    _save_hash_index(index, index_path)
+
+    # 新規・変更の画像のうち、既存の画像か先に処理する画像と同じ画面のもの（撮り直し・重なった撮影）は読み取りを省く
+    names = sorted(records)
+    lookup_index = build_lookup([records[n]["dhash"] for n in names])
+    pending = set(report["new"]) | set(report["changed"])
+    report["duplicate_of"] = {}
+    processed = set()
+    for rel in sorted(pending):
+        ids, _ = lookup(lookup_index, records[rel]["dhash"])
+        kept = [names[i] for i in ids if names[i] != rel and (names[i] not in pending or names[i] in processed)]
+        if kept:
+            report["duplicate_of"][rel] = kept[0]
+        else:
+            processed.add(rel)
+    report["to_process"] = sorted(processed)
+    return report
+
+
+# 近傍検索の索引（帯ごとの値を (帯番号 << 32 | 値) の1本の昇順配列にまとめる）
+def build_lookup(hex_hashes):
+    words = np.frombuffer(b"".join(bytes.fromhex(h) for h in hex_hashes), dtype=np.uint64)
+    words = words.reshape(len(hex_hashes), -1) if len(hex_hashes) else np.empty((0, DHASH_SIZE ** 2 // 64), np.uint64)
+    bands = words.view(np.uint32)
+    n_bands = bands.shape[1]
+    keys = (np.arange(n_bands, dtype=np.uint64) << np.uint64(BAND_BITS)) | bands.astype(np.uint64)
+    order = np.argsort(keys, axis=None, kind="stable")
+    return {"words": words, "keys": keys.ravel()[order], "ids": (order // n_bands).astype(np.int64), "n_bands": n_bands}
+
+
+# 距離 max_distance 以内の画像（戻り値: 画像番号, 距離。距離の小さい順）
+# 距離 r 以内なら、異なる帯は高々 r 個なので、どの r+1 個の帯を選んでも少なくとも1つは値が完全に一致する。
+# 共通の枠の部分は一致する画像が多いので、一致する画像の少ない帯から r+1 個を選んで候補を集める
+def lookup(index, hex_hash, max_distance=NEAR_DUPLICATE_DISTANCE):
+    query = np.frombuffer(bytes.fromhex(hex_hash), dtype=np.uint64)
+    bands = query.view(np.uint32).astype(np.uint64)
+    qkeys = (np.arange(len(bands), dtype=np.uint64) << np.uint64(BAND_BITS)) | bands
+    lo = np.searchsorted(index["keys"], qkeys, side="left")
+    hi = np.searchsorted(index["keys"], qkeys, side="right")
+    chosen = np.argsort(hi - lo, kind="stable")[:max_distance + 1]
+    candidates = np.unique(np.concatenate([index["ids"][lo[b]:hi[b]] for b in chosen]))
+    distances = np.bitwise_count(index["words"][candidates] ^ query).sum(axis=1)
+    keep = distances <= max_distance
+    order = np.argsort(distances[keep], kind="stable")
+    return candidates[keep][order], distances[keep][order]
+
+
+# 同じ画面と判定される画像の組（索引に入っている全画像どうし）
+def near_duplicates(hash_index, max_distance=NEAR_DUPLICATE_DISTANCE):
+    names = sorted(hash_index["images"])
+    hashes = [hash_index["images"][n]["dhash"] for n in names]
+    lookup_index = build_lookup(hashes)
+    pairs = []
+    for i, h in enumerate(hashes):
+        for j, d in zip(*lookup(lookup_index, h, max_distance)):
+            if j > i:
+                pairs.append((names[i], names[j], int(d)))
+    return pd.DataFrame(pairs, columns=["画像1", "画像2", "距離"])
+
+
+# python image_hash.py          → image/ を取り込み（前回から変わった画像だけハッシュ計算）、重複の組を表示
+# python image_hash.py --bench  → 実データの変化の出方を真似た10万枚の合成索引で近傍検索の時間を計測
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="スクリーンショットの知覚ハッシュ索引を更新する")
+    parser.add_argument("--root", default=IMAGE_DIR)
+    parser.add_argument("--index", default=HASH_INDEX)
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--bench", action="store_true", help="10万枚の合成索引で検索時間を計測")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = ingest(args.root, args.index, args.workers)
+    print(f"ingest in {time.perf_counter() - start:.2f}s: new {len(report['new'])}, changed {len(report['changed'])}, "
+          f"same content {len(report['same_content'])}, skipped {report['skipped']}, removed {len(report['removed'])}, "
+          f"unreadable {len(report['unreadable'])}, duplicates of other captures {len(report['duplicate_of'])}, "
+          f"to process {len(report['to_process'])}")
+    hash_index = load_hash_index(args.index)
+    start = time.perf_counter()
+    duplicates = near_duplicates(hash_index)
+    print(f"{len(duplicates)} near-duplicate pairs among {len(hash_index['images'])} images "
+          f"({time.perf_counter() - start:.3f}s)")
+    print(duplicates.head(10).to_string(index=False))
+
+    if args.bench:
+        rng = np.random.default_rng(0)
+        real = np.array([np.frombuffer(bytes.fromhex(r["dhash"]), dtype=np.uint8) for r in hash_index["images"].values()])
+        bits = np.unpackbits(real, axis=1)
+        # 実データで値の揺れるビットほど反転しやすくする（共通の枠のビットはほとんど変えない）
+        p = bits.mean(axis=0)
+        weight = p * (1 - p) + 1e-4
+        weight /= weight.sum()
+        n_images = 100_000
+        base = bits[rng.integers(0, len(bits), n_images)]
+        for row in range(n_images):
+            flips = rng.choice(bits.shape[1], size=rng.integers(10, 120), replace=False, p=weight)
+            base[row, flips] ^= 1
+        synthetic = [h.tobytes().hex() for h in np.packbits(base, axis=1)]
+        start = time.perf_counter()
+        big = build_lookup(synthetic)
+        print(f"synthetic lookup index: {n_images} hashes in {time.perf_counter() - start:.2f}s")
+
+        queries = [synthetic[i] for i in rng.integers(0, n_images, 1000)]
+        start = time.perf_counter()
+        found = [lookup(big, q) for q in queries]
+        per_query = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        for q in queries[:50]:
+            query = np.frombuffer(bytes.fromhex(q), dtype=np.uint64)
+            scan = np.flatnonzero(np.bitwise_count(big["words"] ^ query).sum(axis=1) <= NEAR_DUPLICATE_DISTANCE)
+        per_scan = (time.perf_counter() - start) / 50
+        print(f"band index: {per_query * 1e6:.0f}µs/query (mean {np.mean([len(f[0]) for f in found]):.2f} hits) "
+              f"vs full scan {per_scan * 1e6:.0f}µs/query")
@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from image_hash import IMAGE_DIR, list_images
+
+# 画像の内容アドレス方式の保存先（同じ内容の画像は年度・ファイル名が違っても1つだけ保存する）
+# manifest.json に (年度/ファイル名) → 内容の sha256、sha256 → 保存場所 を記録する。
+# 小さい画像は1つずつファイルにせず、パックファイルに追記して (パック, 位置, 長さ) で引く
+STORE_DIR = "image_store"
+MANIFEST = "manifest.json"
+# これ以下の大きさの画像はパックに入れる（選手画面のスクリーンショットは1枚200KB前後）
+PACK_MAX_BLOB = 256 * 1024
+# パックファイル1つの上限
+PACK_SIZE = 64 * 1024 * 1024
+
+
+def manifest_key(year, filename):
+    return f"{int(year)}/{filename}"
+
+
+def load_manifest(store_dir=STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"entries": {}, "objects": {}, "packs": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# 書き込みごとに別名の一時ファイルを使う（同時に保存しても他の書き込みの一時ファイルを消さない）
+def _save_manifest(manifest, store_dir):
+    path = os.path.join(store_dir, MANIFEST)
+    fd, tmp = tempfile.mkstemp(dir=store_dir, prefix=MANIFEST + ".", suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _object_path(store_dir, digest):
+    return os.path.join(store_dir, "objects", digest[:2], digest[2:] + ".png")
+
+
+# 追記先のパック（上限を超えるなら新しいパックを作る）
+def _pack_for(manifest, store_dir, size):
+    packs = manifest["packs"]
+    if packs:
+        path = os.path.join(store_dir, "packs", packs[-1])
+        if os.path.getsize(path) + size <= PACK_SIZE:
+            return packs[-1]
+    name = f"pack-{len(packs):04d}.bin"
+    os.makedirs(os.path.join(store_dir, "packs"), exist_ok=True)
+    open(os.path.join(store_dir, "packs", name), "wb").close()
+    packs.append(name)
+    return name
+
+
+# 内容を保存して sha256 を返す（同じ内容が既にあれば書き込まない）
+def put_blob(manifest, data, store_dir=STORE_DIR):
+    digest = hashlib.sha256(data).hexdigest()
+    if digest in manifest["objects"]:
+        return digest
+    if len(data) <= PACK_MAX_BLOB:
+        pack = _pack_for(manifest, store_dir, len(data))
+        with open(os.path.join(store_dir, "packs", pack), "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        manifest["objects"][digest] = {"size": len(data), "pack": pack, "offset": offset}
+    else:
+        path = _object_path(store_dir, digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        manifest["objects"][digest] = {"size": len(data)}
+    return digest
+
+
+def get_blob(manifest, digest, store_dir=STORE_DIR):
+    obj = manifest["objects"][digest]
+    if "pack" not in obj:
+        with open(_object_path(store_dir, digest), "rb") as f:
+            return f.read()
+    with open(os.path.join(store_dir, "packs", obj["pack"]), "rb") as f:
+        f.seek(obj["offset"])
+        return f.read(obj["size"])
+
+
+# (年度, ファイル名) の画像の中身（無ければ None）。manifest の辞書を1回引くだけ
+def resolve_image(manifest, year, filename, store_dir=STORE_DIR):
+    digest = manifest["entries"].get(manifest_key(year, filename))
+    return None if digest is None else get_blob(manifest, digest, store_dir)
+
+
+# アプリの複数セッションから同時に取り込んでも、パックへの追記と manifest の読み書きが混ざらないようにする
+_import_lock = threading.Lock()
+
+
+# image/<年度>/*.png を取り込む（登録済みで内容が同じものは書き込まない）
+# files（root からの相対パス）を渡すとその画像だけ取り込み、無くなった画像は manifest から外す
+def import_images(root=IMAGE_DIR, store_dir=STORE_DIR, files=None):
+    with _import_lock:
+        return _import_images(root, store_dir, files)
+
+
+def _import_images(root, store_dir, files):
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    added = updated = 0
+    for rel in list_images(root) if files is None else files:
+        year, _, filename = rel.partition("/")
+        if not year.isdigit() or "/" in filename:
+            continue
+        key = manifest_key(year, filename)
+        path = os.path.join(root, rel)
+        if not os.path.exists(path):
+            updated += manifest["entries"].pop(key, None) is not None
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        n_objects = len(manifest["objects"])
+        digest = put_blob(manifest, data, store_dir)
+        updated += manifest["entries"].get(key) != digest
+        manifest["entries"][key] = digest
+        added += len(manifest["objects"]) - n_objects
+    # 内容が変わらなければ manifest を書き直さない（更新時刻をキャッシュキーにしている）
+    if updated or files is None:
+        _save_manifest(manifest, store_dir)
+    return added
+
+
+# 年度ごとにファイルとして置いた場合と比べた容量
+def storage_report(manifest):
+    sizes = {digest: obj["size"] for digest, obj in manifest["objects"].items()}
+    logical = sum(sizes[digest] for digest in manifest["entries"].values())
+    stored = sum(sizes.values())
+    return {
+        "entries": len(manifest["entries"]),
+        "objects": len(sizes),
+        "packed_objects": sum("pack" in obj for obj in manifest["objects"].values()),
+        "packs": len(manifest["packs"]),
+        "logical_bytes": logical,
+        "stored_bytes": stored,
+        "saved_bytes": logical - stored,
+    }
+
+
+def _print_report(label, report):
+    saved = report["saved_bytes"] / report["logical_bytes"] if report["logical_bytes"] else 0
+    print(f"{label}: {report['entries']} images -> {report['objects']} objects "
+          f"({report['packed_objects']} packed in {report['packs']} packs), "
+          f"{report['logical_bytes'] / 1e6:.1f}MB -> {report['stored_bytes'] / 1e6:.1f}MB (saved {saved:.1%})")
+
+
+# python image_store.py          → image/ を image_store/ に取り込み、節約できた容量を表示
+# python image_store.py --bench  → 年度ごとに選手画面の一部だけが変わる複数年度の合成アーカイブで容量と引き当て時間を計測
+if __name__ == "__main__":
+    import random
+
+    parser = argparse.ArgumentParser(description="画像を内容アドレス方式の保存先に取り込む")
+    parser.add_argument("--root", default=IMAGE_DIR)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--bench", action="store_true", help="複数年度の合成アーカイブで容量と引き当て時間を計測")
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument("--changed", type=float, default=0.3, help="前年度から画面が変わる割合")
+    args = parser.parse_args()
+
+    if not args.bench:
+        start = time.perf_counter()
+        added = import_images(args.root, args.store)
+        print(f"imported in {time.perf_counter() - start:.2f}s ({added} new objects)")
+        _print_report(args.store, storage_report(load_manifest(args.store)))
+    else:
+        rng = random.Random(0)
+        base = list_images(args.root)
+        latest = max(int(rel.partition("/")[0]) for rel in base)
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = load_manifest(tmp)
+            # 最古の年度は全画面を取り込み、以後は毎年 --changed の割合の選手だけ画面が変わる。
+            # 変わった画面は末尾（IEND の後ろ、画像としては読まれない）に年度を付けて別の内容にする
+            version = {rel: b"" for rel in base}
+            start = time.perf_counter()
+            for season in range(args.seasons):
+                year = latest - args.seasons + 1 + season
+                for rel in base:
+                    if season > 0 and rng.random() < args.changed:
+                        version[rel] = f"season-{year}".encode()
+                    with open(os.path.join(args.root, rel), "rb") as f:
+                        data = f.read() + version[rel]
+                    manifest["entries"][manifest_key(year, rel.partition("/")[2])] = put_blob(manifest, data, tmp)
+            print(f"{args.seasons} seasons imported in {time.perf_counter() - start:.2f}s")
+            _print_report("synthetic archive", storage_report(manifest))
+
+            keys = [(int(k.partition("/")[0]), k.partition("/")[2]) for k in manifest["entries"]]
+            sample = [keys[rng.randrange(len(keys))] for _ in range(2000)]
+            start = time.perf_counter()
+            for year, filename in sample:
+                resolve_image(manifest, year, filename, tmp)
+            per_image = (time.perf_counter() - start) / len(sample)
+            print(f"resolve + read: {per_image * 1e3:.2f}ms/image")
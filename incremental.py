@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from archetypes import ARCHETYPE_FILES, archetype_path, load_archetypes, assign_archetypes
+from percentiles import build_percentile_table
+from regulars import regulars_table
+from stats_common import DB_PATH, LEAGUE_TEAMS, read_table
+from team_compare import team_comparison_table
+
+# 派生ビューを年度パーティションごとに保存し、入力の変わった年度だけ作り直す
+# manifest.json には各パーティションが依存する (テーブル, 年度) のダイジェストを記録する
+DERIVED_DIR = "derived"
+MANIFEST = "manifest.json"
+SOURCE_TABLES = ["batting_stats", "pitching_stats", "defense_stats", "ability_stats"]
+YOY_BATTING_METRICS = ["打率", "出塁率", "長打率", "OPS", "本塁打", "打点", "盗塁"]
+YOY_PITCHING_METRICS = ["防御率", "WHIP", "奪三率", "四球率", "被打率", "勝", "セーブ"]
+
+
+def _year_slice(frames, table, year):
+    df = frames[table]
+    return df[df["_year"] == year].drop(columns="_year")
+
+
+def _build_percentiles(frames, year):
+    return build_percentile_table(_year_slice(frames, "pitching_stats", year), _year_slice(frames, "batting_stats", year))
+
+
+def _build_team_comparison(frames, year):
+    bat = _year_slice(frames, "batting_stats", year)
+    pitch = _year_slice(frames, "pitching_stats", year)
+    tables = {}
+    for league, teams in LEAGUE_TEAMS.items():
+        tables[(league, "野手")] = team_comparison_table(bat[bat["team_name"].isin(teams)], "野手")
+        tables[(league, "投手")] = team_comparison_table(pitch[pitch["team_name"].isin(teams)], "投手")
+    return tables
+
+
+def _build_regulars(frames, year):
+    return regulars_table(
+        _year_slice(frames, "defense_stats", year),
+        _year_slice(frames, "batting_stats", year),
+        _year_slice(frames, "ability_stats", year),
+        year,
+    )
+
+
+def _build_archetypes(frames, year):
+    assigned = {}
+    for role, table in [("投手", "pitching_stats"), ("野手", "batting_stats")]:
+        model = load_archetypes(archetype_path(role))
+        if model is not None:
+            assigned[role] = assign_archetypes(model, _year_slice(frames, table, year))
+    return assigned
+
+
+# 前年からの増減（同一選手・同一チーム）
+def _yoy(frames, table, year, metrics):
+    keys = ["選手名", "team_name"]
+    prev = _year_slice(frames, table, year - 1)
+    curr = _year_slice(frames, table, year)
+    cols = [m for m in metrics if m in curr.columns and m in prev.columns]
+    prev = prev[keys + cols].set_index(keys).apply(pd.to_numeric, errors="coerce")
+    curr = curr[keys + cols].set_index(keys).apply(pd.to_numeric, errors="coerce")
+    both = curr.index.intersection(prev.index)
+    delta = (curr.loc[both] - prev.loc[both]).add_suffix("_増減")
+    return pd.concat([curr.loc[both], delta], axis=1).reset_index()
+
+
+def _build_yoy_batting(frames, year):
+    return _yoy(frames, "batting_stats", year, YOY_BATTING_METRICS)
+
+
+def _build_yoy_pitching(frames, year):
+    return _yoy(frames, "pitching_stats", year, YOY_PITCHING_METRICS)
+
+
+# ビュー名 → (依存する (テーブル, 年度オフセット), 依存ファイル, 作成関数)
+VIEWS = {
+    "percentiles": ([("batting_stats", 0), ("pitching_stats", 0)], [], _build_percentiles),
+    "team_comparison": ([("batting_stats", 0), ("pitching_stats", 0)], [], _build_team_comparison),
+    "regulars": ([("defense_stats", 0), ("batting_stats", 0), ("ability_stats", 0)], [], _build_regulars),
+    "archetypes": (
+        [("batting_stats", 0), ("pitching_stats", 0)],
+        [archetype_path(role) for role in ARCHETYPE_FILES],
+        _build_archetypes,
+    ),
+    "yoy_batting": ([("batting_stats", 0), ("batting_stats", -1)], [], _build_yoy_batting),
+    "yoy_pitching": ([("pitching_stats", 0), ("pitching_stats", -1)], [], _build_yoy_pitching),
+}
+
+
+# 年度ごとのダイジェスト（行ハッシュの和なので行の並び順に依存しない）
+def partition_digests(df):
+    years = pd.to_numeric(df["year"], errors="coerce")
+    row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digests = {}
+    for year, idx in years.groupby(years).indices.items():
+        total = np.add.reduce(row_hash[idx], dtype=np.uint64)
+        digests[int(year)] = f"{len(idx)}-{int(total):016x}"
+    return digests
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return "missing"
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_manifest(derived_dir=DERIVED_DIR):
+    path = os.path.join(derived_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"views": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# 一時ファイルに書いてから置き換える（読み込み側が書きかけのファイルを開かないように）
+def _write_atomic(path, write, mode="wb"):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with open(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _save_manifest(manifest, derived_dir):
+    path = os.path.join(derived_dir, MANIFEST)
+    _write_atomic(path, lambda f: json.dump(manifest, f, ensure_ascii=False, indent=1), mode="w")
+
+
+def _partition_path(derived_dir, view, year):
+    return os.path.join(derived_dir, view, f"{year}.pkl")
+
+
+# パーティションが依存する入力のダイジェスト（対象年度が存在しなければ None）
+def _dependency_digests(view, year, digests, file_digests):
+    table_deps, file_deps, _ = VIEWS[view]
+    deps = {}
+    for table, offset in table_deps:
+        dep_year = year + offset
+        if dep_year not in digests[table]:
+            return None
+        deps[f"{table}@{dep_year}"] = digests[table][dep_year]
+    for path in file_deps:
+        deps[f"file:{path}"] = file_digests[path]
+    return deps
+
+
+# 同じプロセスの複数セッションから同時に呼ばれても manifest の読み書きが混ざらないようにする
+_update_lock = threading.Lock()
+
+
+# 変更のあったパーティションだけ作り直す。戻り値は作り直した (ビュー, 年度) の一覧
+# views を渡すとそのビューが依存するテーブルだけを読み、そのビューだけを確認する
+def update(db_path=DB_PATH, derived_dir=DERIVED_DIR, views=None):
+    with _update_lock:
+        return _update(db_path, derived_dir, list(views or VIEWS))
+
+
+def _update(db_path, derived_dir, views):
+    frames = {}
+    digests = {}
+    tables = {table for view in views for table, _ in VIEWS[view][0]}
+    for table in [t for t in SOURCE_TABLES if t in tables]:
+        df = read_table(table, db_path)
+        digests[table] = partition_digests(df)
+        frames[table] = df.assign(_year=pd.to_numeric(df["year"], errors="coerce"))
+    file_digests = {path: file_digest(path) for view in views for path in VIEWS[view][1]}
+
+    manifest = load_manifest(derived_dir)
+    rebuilt = []
+    for view in views:
+        table_deps, _, build = VIEWS[view]
+        recorded = manifest["views"].setdefault(view, {})
+        years = sorted(set(digests[table_deps[0][0]]))
+        for year in years:
+            deps = _dependency_digests(view, year, digests, file_digests)
+            path = _partition_path(derived_dir, view, year)
+            if deps is None:
+                continue
+            if recorded.get(str(year)) == deps and os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            result = build(frames, year)
+            _write_atomic(path, lambda f: pickle.dump(result, f))
+            recorded[str(year)] = deps
+            rebuilt.append((view, year))
+        # 入力から消えた年度のパーティションは削除
+        for year in [y for y in recorded if int(y) not in years]:
+            recorded.pop(year)
+            path = _partition_path(derived_dir, view, year)
+            if os.path.exists(path):
+                os.remove(path)
+    os.makedirs(derived_dir, exist_ok=True)
+    _save_manifest(manifest, derived_dir)
+    return rebuilt
+
+
+def load_partition(view, year, derived_dir=DERIVED_DIR):
+    path = _partition_path(derived_dir, view, int(year))
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# 全年度分のパーティション（年度 → 中身）
+def load_view(view, derived_dir=DERIVED_DIR):
+    recorded = load_manifest(derived_dir)["views"].get(view, {})
+    return {int(year): load_partition(view, year, derived_dir) for year in recorded}
+
+
+# 年度分の行を追加・差し替え（UNIQUE キーが同じ行は置き換える）
+def upsert_rows(table, rows, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cols = list(rows.columns)
+    placeholders = ", ".join("?" for _ in cols)
+    col_sql = ", ".join(f'"{c}"' for c in cols)
+    values = rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO {table} ({col_sql}) VALUES ({placeholders})", values)
+    conn.close()
+
+
+# python incremental.py            → 変更のあった年度だけ再計算
+# python incremental.py --bench    → DBのコピーで1行修正時の再計算時間を計測
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="派生ビューを差分更新する")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--out", default=DERIVED_DIR)
+    parser.add_argument("--bench", action="store_true", help="1行修正時の差分更新時間を計測")
+    args = parser.parse_args()
+
+    if not args.bench:
+        start = time.perf_counter()
+        rebuilt = update(args.db, args.out)
+        print(f"rebuilt {len(rebuilt)} partitions in {time.perf_counter() - start:.3f}s: {rebuilt}")
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "player_stats.db")
+            out = os.path.join(tmp, DERIVED_DIR)
+            shutil.copy(args.db, db)
+            # 前年度分として最新年度の行を複製しておき、年度パーティションが分かれることを確認する
+            for table in SOURCE_TABLES:
+                df = read_table(table, db)
+                latest = pd.to_numeric(df["year"], errors="coerce").max()
+                prev = df[pd.to_numeric(df["year"], errors="coerce") == latest].assign(year=str(int(latest) - 1))
+                upsert_rows(table, prev, db)
+
+            start = time.perf_counter()
+            rebuilt = update(db, out)
+            print(f"full build: {len(rebuilt)} partitions in {time.perf_counter() - start:.3f}s")
+
+            start = time.perf_counter()
+            rebuilt = update(db, out)
+            print(f"no change: {len(rebuilt)} partitions in {time.perf_counter() - start:.3f}s")
+
+            df = read_table("batting_stats", db)
+            row = df[df["year"] == df["year"].min()].iloc[[0]].copy()
+            row["本塁打"] = pd.to_numeric(row["本塁打"]) + 1
+            upsert_rows("batting_stats", row, db)
+            start = time.perf_counter()
+            rebuilt = update(db, out)
+            print(f"one-row correction: {rebuilt} in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+
+from regulars import BEST_NINE_POSITIONS
+
+# 打順の最適化（塁状況 × アウト数のマルコフ連鎖で1試合あたりの期待得点を計算する）
+# 打順の候補はまとめて配列に積み、1打席ずつ全候補の状態分布を同時に進める
+# 9! 通りの全探索はせず、出塁率・OPS順などの初期打順と乱択打順から、2人の入れ替えで改善する山登り探索を行う
+
+# 打席結果（凡退・四死球・単打・二塁打・三塁打・本塁打）
+EVENTS = ["凡退", "四死球", "単打", "二塁打", "三塁打", "本塁打"]
+# 打席数が少ない選手の打席結果はこの打席数ぶんリーグ平均に寄せる
+REGRESS_PA = 50
+INNINGS = 9
+# 1イニングで残っている確率がこれを下回ったら打ち切る
+TAIL_MASS = 1e-7
+MAX_STEPS = 40
+N_RANDOM_STARTS = 256
+N_CLIMB_STARTS = 4
+
+
+# 塁状況（1塁=1, 2塁=2, 3塁=4 のビット）× アウト数（0〜2）の24状態 + 3アウト
+def _transitions():
+    n_states = 24
+    move = np.zeros((len(EVENTS), n_states, n_states + 1))
+    runs = np.zeros((len(EVENTS), n_states))
+    for state in range(n_states):
+        bases, outs = state % 8, state // 8
+        on1, on2, on3 = bases & 1, (bases >> 1) & 1, (bases >> 2) & 1
+        results = {
+            # 凡退では走者は進まない
+            "凡退": (bases, outs + 1, 0),
+            # 四死球は押し出しの分だけ進む
+            "四死球": (bases | 1 if not on1 else bases | 3 if not on2 else 7, outs, 1 if bases == 7 else 0),
+            # 単打: 二塁・三塁走者は生還、一塁走者は二塁へ
+            "単打": (1 | (2 if on1 else 0), outs, on2 + on3),
+            # 二塁打: 一塁走者は三塁へ、他は生還
+            "二塁打": (2 | (4 if on1 else 0), outs, on2 + on3),
+            "三塁打": (4, outs, on1 + on2 + on3),
+            "本塁打": (0, outs, on1 + on2 + on3 + 1),
+        }
+        for e, name in enumerate(EVENTS):
+            new_bases, new_outs, scored = results[name]
+            target = n_states if new_outs >= 3 else new_outs * 8 + new_bases
+            move[e, state, target] = 1
+            runs[e, state] = scored
+    return move, runs
+
+
+MOVE, RUNS = _transitions()
+
+
+# 打席結果の回数（行: 選手、列: EVENTS）。犠打・犠飛も凡退に含める
+def event_counts(df):
+    def col(name):
+        return pd.to_numeric(df[name], errors="coerce").fillna(0).to_numpy(dtype=float) if name in df.columns else np.zeros(len(df))
+
+    counts = np.column_stack([
+        np.zeros(len(df)), col("四球") + col("死球"), col("単打"), col("二塁打"), col("三塁打"), col("本塁打"),
+    ])
+    counts[:, 0] = np.maximum(col("打席") - counts[:, 1:].sum(axis=1), 0)
+    return counts
+
+
+# リーグ全体の打席結果の割合
+def league_rates(df):
+    totals = event_counts(df).sum(axis=0)
+    return totals / totals.sum() if totals.sum() > 0 else np.array([0.68, 0.08, 0.16, 0.045, 0.005, 0.03])
+
+
+# 打席結果の確率（打席数の少ない選手はリーグ平均に寄せる）
+def event_probs(df, league):
+    counts = event_counts(df)
+    return (counts + REGRESS_PA * league) / (counts.sum(axis=1, keepdims=True) + REGRESS_PA)
+
+
+# 打順ごとの1試合の期待得点（probs: 9人 × EVENTS、orders: 候補数 × 9 の並び）
+def expected_runs(probs, orders, innings=INNINGS):
+    orders = np.atleast_2d(orders)
+    n_orders = len(orders)
+    # 選手ごとの1打席の遷移行列（24 → 24 + 3アウト）と期待得点（打順に関係なく9人分だけ作る）
+    move = np.einsum("pe,est->pst", probs, MOVE)
+    runs = probs @ RUNS
+
+    # 先頭打者ごとに1イニングを進め、得点の期待値と次の回の先頭打者の分布を求める
+    dist = np.zeros((n_orders * 9, 24))
+    dist[:, 0] = 1
+    inning_runs = np.zeros(n_orders * 9)
+    next_lead = np.zeros((n_orders, 9, 9))
+    slots = np.arange(9)
+    for step in range(MAX_STEPS):
+        batter_slot = (slots + step) % 9
+        player = orders[:, batter_slot].ravel()              # (候補 × 先頭打者)
+        new = np.empty((len(dist), 25))
+        for j in range(len(probs)):
+            rows = player == j
+            inning_runs[rows] += dist[rows] @ runs[j]
+            new[rows] = dist[rows] @ move[j]
+        # 3アウトになった分は次の回の先頭（この打者の次）へ
+        next_lead[:, slots, (batter_slot + 1) % 9] += new[:, 24].reshape(n_orders, 9)
+        dist = new[:, :24]
+        if dist.sum(axis=1).max() < TAIL_MASS:
+            break
+
+    # 1回の先頭は1番打者。以後は先頭打者の分布を次の回へ移していく
+    inning_runs = inning_runs.reshape(n_orders, 9)
+    lead = np.zeros((n_orders, 9))
+    lead[:, 0] = 1
+    total = np.zeros(n_orders)
+    for _ in range(innings):
+        total += (lead * inning_runs).sum(axis=1)
+        lead = np.einsum("bl,blm->bm", lead, next_lead)
+    return total
+
+
+# 2人を入れ替えた全36通りを、複数の開始打順ぶんまとめて評価し、改善が止まるまで繰り返す
+def _climb(probs, orders):
+    orders = np.array(orders)
+    best = expected_runs(probs, orders)
+    evaluated = len(orders)
+    i_idx, j_idx = np.triu_indices(9, k=1)
+    swap = np.tile(np.arange(9), (len(i_idx), 1))
+    swap[np.arange(len(i_idx)), i_idx], swap[np.arange(len(i_idx)), j_idx] = j_idx, i_idx
+    active = np.ones(len(orders), dtype=bool)
+    while active.any():
+        # candidates[開始打順, 入れ替え] = orders[開始打順][swap[入れ替え]]
+        candidates = orders[active][:, swap]
+        scores = expected_runs(probs, candidates.reshape(-1, 9)).reshape(len(candidates), len(swap))
+        evaluated += scores.size
+        k = scores.argmax(axis=1)
+        improved = scores[np.arange(len(k)), k] > best[active] + 1e-9
+        rows = np.flatnonzero(active)
+        orders[rows[improved]] = candidates[improved, k[improved]]
+        best[rows[improved]] = scores[improved, k[improved]]
+        active[rows[~improved]] = False
+    return orders, best, evaluated
+
+
+# 最適打順（戻り値: 打順の並び, 期待得点, 評価した打順の数）
+def optimize_lineup(probs, seed=0, initial=None):
+    rng = np.random.default_rng(seed)
+    obp = 1 - probs[:, 0]
+    slg = probs[:, 2] + 2 * probs[:, 3] + 3 * probs[:, 4] + 4 * probs[:, 5]
+    starts = [np.argsort(-obp, kind="stable"), np.argsort(-(obp + slg), kind="stable")]
+    if initial is not None:
+        starts.append(np.asarray(initial))
+    random_orders = np.array([rng.permutation(9) for _ in range(N_RANDOM_STARTS)])
+    random_scores = expected_runs(probs, random_orders)
+    starts += list(random_orders[np.argsort(-random_scores)[:N_CLIMB_STARTS]])
+
+    orders, runs, evaluated = _climb(probs, starts)
+    best = int(runs.argmax())
+    return orders[best], runs[best], evaluated + N_RANDOM_STARTS
+
+
+# 主力表から9人を選ぶ（各ポジションで出場最多の1人 + 残りで打席最多の1人を指名打者扱い）
+def choose_nine(df_regulars, df_bat):
+    df = pd.merge(df_regulars[["選手名", "team_name", "表示用ポジション", "出場"]], df_bat, on=["選手名", "team_name"], how="inner")
+    df = df.assign(出場=pd.to_numeric(df["出場"], errors="coerce"), 打席=pd.to_numeric(df["打席"], errors="coerce"))
+    fielders = (
+        df[df["表示用ポジション"].isin(BEST_NINE_POSITIONS)]
+        .sort_values("出場", ascending=False, kind="mergesort")
+        .drop_duplicates("表示用ポジション")
+        .drop_duplicates("選手名")
+    )
+    rest = df[~df["選手名"].isin(fielders["選手名"])].sort_values("打席", ascending=False, kind="mergesort")
+    rest = rest.drop_duplicates("選手名").assign(表示用ポジション="指")
+    return pd.concat([fielders, rest.head(9 - len(fielders))], ignore_index=True)
+
+
+# 全チームの最適打順（年度分）。戻り値: チーム → {"lineup": 表, "runs": 期待得点, "baseline": OPS順の期待得点, ...}
+def team_lineups(df_regulars, df_bat, year, seed=0):
+    df_bat = df_bat[pd.to_numeric(df_bat["year"], errors="coerce") == year]
+    league = league_rates(df_bat)
+    results = {}
+    for team, regulars in df_regulars.groupby("team_name"):
+        nine = choose_nine(regulars, df_bat)
+        if len(nine) < 9:
+            continue
+        probs = event_probs(nine, league)
+        by_ops = np.argsort(-pd.to_numeric(nine["OPS"], errors="coerce").fillna(0).to_numpy(), kind="stable")
+        order, runs, evaluated = optimize_lineup(probs, seed=seed, initial=by_ops)
+        lineup = nine.iloc[order][["選手名", "表示用ポジション", "打率", "出塁率", "長打率", "OPS", "本塁打"]]
+        lineup = lineup.assign(打順=np.arange(1, 10)).set_index("打順")
+        results[team] = {
+            "lineup": lineup,
+            "runs": float(runs),
+            "baseline": float(expected_runs(probs, by_ops[None, :])[0]),
+            "evaluated": evaluated,
+        }
+    return results
+
+
+# python lineup.py                      → 12球団の最適打順と所要時間
+# python lineup.py --exhaustive hanshin  → 1チームだけ 9! 通りを全評価して探索結果と比べる（数十秒かかる）
+if __name__ == "__main__":
+    import argparse
+    import itertools
+    import time
+    from regulars import regulars_table
+    from stats_common import read_table
+
+    parser = argparse.ArgumentParser(description="12球団の最適打順を計算する")
+    parser.add_argument("--exhaustive", metavar="TEAM", help="全打順を評価して比較するチーム")
+    args = parser.parse_args()
+
+    df_bat = read_table("batting_stats")
+    year = int(pd.to_numeric(df_bat["year"], errors="coerce").max())
+    df_regulars = regulars_table(read_table("defense_stats"), df_bat, read_table("ability_stats"), year)
+
+    start = time.perf_counter()
+    results = team_lineups(df_regulars, df_bat, year)
+    print(f"{len(results)} teams in {time.perf_counter() - start:.2f}s")
+    for team, result in results.items():
+        print(f"{team}: {result['runs']:.3f} runs/game (OPS order {result['baseline']:.3f}, {result['evaluated']} orders evaluated)")
+
+    if args.exhaustive:
+        df_year = df_bat[pd.to_numeric(df_bat["year"], errors="coerce") == year]
+        nine = choose_nine(df_regulars[df_regulars["team_name"] == args.exhaustive], df_year)
+        probs = event_probs(nine, league_rates(df_year))
+        start = time.perf_counter()
+        best = -np.inf
+        permutations = itertools.permutations(range(9))
+        while True:
+            chunk = np.array(list(itertools.islice(permutations, 20_000)))
+            if len(chunk) == 0:
+                break
+            best = max(best, expected_runs(probs, chunk).max())
+        print(f"{args.exhaustive}: exhaustive best {best:.4f} in {time.perf_counter() - start:.1f}s"
+              f" (search {results[args.exhaustive]['runs']:.4f})")
@@ -0,0 +1,166 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from career_stats import player_keys
+
+# 全年度・全球団の選手名検索（正規化した選手名の文字 n-gram → 選手IDの転置索引）
+# 検索語の n-gram の出現リストを連結して選手ごとの一致数を数え、Dice 係数で順位を付ける（全件の文字列比較はしない）
+NGRAM_SIZES = (1, 2)
+TOP_N = 20
+# 完全一致・前方一致を上に出す加点（完全一致は前方一致の加点を含む）
+EXACT_BONUS = 1.0
+PREFIX_BONUS = 0.3
+
+# 長音・ハイフンの揺れ（OCRで「バ-グ」のように読まれる）
+_DASHES = str.maketrans({c: "ー" for c in "-‐‑‒–—―−─━～~"})
+# 小書き仮名は大きい仮名に寄せる（「アシュモア」と「アシユモア」を同じにする）
+_SMALL_KANA = str.maketrans("ぁぃぅぇぉっゃゅょゎゕゖ", "あいうえおつやゆよわかけ")
+# 異体字（人名でよく揺れるもの）
+_VARIANTS = str.maketrans({"﨑": "崎", "嵜": "崎", "髙": "高", "濵": "浜", "濱": "浜", "邉": "辺", "邊": "辺",
+                           "齋": "斉", "齊": "斉", "斎": "斉", "德": "徳", "桒": "桑", "槗": "橋"})
+
+
+def normalize_name(name):
+    # 全角・半角の統一（ｱ→ア、Ａ→A）。空白・中黒は落とす
+    text = unicodedata.normalize("NFKC", str(name)).lower()
+    text = "".join(text.split()).replace("・", "")
+    text = text.translate(_DASHES).translate(_VARIANTS)
+    # カタカナ → ひらがな（ヴ は ぶ に寄せる）
+    text = "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text.replace("ヴ", "ブ"))
+    return text.translate(_SMALL_KANA)
+
+
+# 先頭・末尾の印を付けた文字 n-gram（重複なし）
+def name_grams(normalized):
+    padded = f"^{normalized}$"
+    grams = set()
+    for n in NGRAM_SIZES:
+        # 1文字は印なし（名前の途中の1文字でも当たるように）
+        source = normalized if n == 1 else padded
+        grams.update(source[i:i + n] for i in range(len(source) - n + 1))
+    return grams
+
+
+# 選手一覧（同一選手は選手名 + 生年月日でまとめる）と索引を作る（DB更新時に1回）
+def build_name_index(frames):
+    parts = []
+    for role, df in frames.items():
+        df = df[df["選手名"].notna()]
+        years = pd.to_numeric(df["year"], errors="coerce")
+        keys = player_keys(df)
+        parts.append(pd.DataFrame({
+            "選手名": keys.get_level_values(0), "生年月日": keys.get_level_values(1), "区分": role,
+            "team_name": df["team_name"].to_numpy(), "year": years.to_numpy(),
+        }))
+    rows = pd.concat(parts, ignore_index=True).sort_values("year", kind="stable")
+    players = rows.groupby(["選手名", "生年月日", "区分"], sort=False).agg(
+        team_name=("team_name", "last"), 最初年度=("year", "min"), 最終年度=("year", "max"), 年数=("year", "nunique"),
+    ).reset_index()
+
+    # 索引は正規化後の名前ごとに1件（同姓の別人・投手と野手の両方に出る選手は同じ名前IDを共有する）
+    normalized = players["選手名"].map(normalize_name)
+    name_codes, names = pd.factorize(normalized)
+    postings = {}
+    n_grams = np.zeros(len(names), dtype=np.int32)
+    for name_id, name in enumerate(names):
+        grams = name_grams(name)
+        n_grams[name_id] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(name_id)
+    postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+    # 名前ID → 選手行（名前IDの順に並べ、各名前IDの先頭位置を持つ）
+    order = np.argsort(name_codes, kind="stable")
+    starts = np.searchsorted(name_codes[order], np.arange(len(names) + 1))
+    return {
+        "players": players.iloc[order].reset_index(drop=True),
+        "names": np.asarray(names, dtype=object),
+        "starts": starts,
+        "postings": postings,
+        "n_grams": n_grams,
+    }
+
+
+# 名前IDと類似度（上位 top_n 件）
+def search_names(index, text, top_n=TOP_N, min_score=0.0):
+    normalized = normalize_name(text)
+    if not normalized:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    grams = name_grams(normalized)
+    lists = [index["postings"][g] for g in grams if g in index["postings"]]
+    if not lists:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # 名前IDごとの一致 n-gram 数（出現リストを連結して数えるだけ）
+    shared = np.bincount(np.concatenate(lists), minlength=len(index["names"]))
+    candidates = np.flatnonzero(shared)
+    scores = 2 * shared[candidates] / (len(grams) + index["n_grams"][candidates])
+    # 前方一致の確認は先頭文字が同じ名前だけに絞って行う
+    heads = index["postings"].get(f"^{normalized[0]}", np.empty(0, dtype=np.int32))
+    heads = heads[shared[heads] > 0]
+    bonus = np.zeros(len(index["names"]))
+    for name_id in heads:
+        name = index["names"][name_id]
+        if name.startswith(normalized):
+            bonus[name_id] = EXACT_BONUS if name == normalized else PREFIX_BONUS
+    scores = scores + bonus[candidates]
+    keep = scores > min_score
+    candidates, scores = candidates[keep], scores[keep]
+    if len(candidates) > top_n:
+        top = np.argpartition(-scores, top_n)[:top_n]
+        candidates, scores = candidates[top], scores[top]
+    order = np.lexsort((candidates, -scores))
+    return candidates[order], scores[order]
+
+
+# 検索結果の選手表（類似度順、同じ名前の選手は最終年度の新しい順）
+def search_players(index, text, role=None, top_n=TOP_N):
+    name_ids, scores = search_names(index, text, top_n=top_n)
+    starts = index["starts"]
+    rows = np.concatenate([np.arange(starts[i], starts[i + 1]) for i in name_ids]) if len(name_ids) else np.empty(0, dtype=int)
+    counts = starts[name_ids + 1] - starts[name_ids]
+    result = index["players"].iloc[rows].assign(一致度=np.repeat(np.round(scores, 3), counts))
+    if role is not None:
+        result = result[result["区分"] == role]
+    return result.sort_values(["一致度", "最終年度"], ascending=[False, False], kind="stable").reset_index(drop=True)
+
+
+# python name_search.py で、実データの名前を組み合わせた10万人の合成名簿で検索時間を計測（全件走査と比較）
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    frames = {"野手": read_table("batting_stats"), "投手": read_table("pitching_stats")}
+    index = build_name_index(frames)
+    print(f"{len(index['players'])} players / {len(index['names'])} names")
+    for text in ["ﾊﾞｰｸﾞ", "島崎", "あしゅもあ", "佐々木", "ロース"]:
+        print(text, "→", search_players(index, text, top_n=3)[["選手名", "区分", "team_name", "一致度"]].to_dict("records"))
+
+    rng = np.random.default_rng(0)
+    base = pd.concat([df["選手名"] for df in frames.values()]).dropna().unique()
+    n_players = 100_000
+    synthetic = pd.DataFrame({
+        "選手名": pd.Series(rng.choice(base, n_players)) + pd.Series(rng.choice(base, n_players)),
+        "team_name": rng.choice(sorted(frames["野手"]["team_name"].dropna().unique()), n_players),
+        "year": rng.integers(1990, 2039, n_players),
+        "birth": np.arange(n_players).astype(str),
+    })
+    start = time.perf_counter()
+    big = build_name_index({"野手": synthetic})
+    print(f"synthetic: {len(big['players'])} players / {len(big['names'])} names, build {time.perf_counter() - start:.2f}s")
+
+    queries = ["佐藤", "ﾊﾞｰｸﾞ田中", "島崎", "ろーず", "清水大"]
+    n_runs = 200
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        for text in queries:
+            search_players(big, text)
+    per_query = (time.perf_counter() - start) / (n_runs * len(queries))
+    print(f"n-gram index: {per_query * 1000:.2f}ms/query")
+
+    normalized_all = pd.Series(big["names"])
+    start = time.perf_counter()
+    for text in queries:
+        normalized_all[normalized_all.str.contains(normalize_name(text), regex=False)]
+    per_scan = (time.perf_counter() - start) / len(queries)
+    print(f"substring scan (no ranking): {per_scan * 1000:.2f}ms/query")
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from stats_common import league_of, to_numeric_cols
+
+# レーダーチャート指標（True: 高いほど良い / False: 低いほど良い）
+BATTER_RADAR = {
+    "打率": True, "出塁率": True, "長打率": True, "本塁打": True,
+    "三振率": False, "盗塁": True, "OPS": True,
+}
+PITCHER_RADAR = {
+    "防御率": False, "奪三率": True, "BB/9": False, "WHIP": False,
+    "QS": True, "被打率": False, "被本率": False,
+}
+RADAR_METRICS = {"野手": BATTER_RADAR, "投手": PITCHER_RADAR}
+
+# 分布の母集団条件（出場の少ない選手で分布が歪まないように）
+MIN_PA = 100
+MIN_IP = 30
+
+ALL_LEAGUES = "12球団"
+
+
+# 1ロール分を縦持ち（year, league, metric, value）に変換
+def _melt_role(df, metrics, qualify_col, qualify_min):
+    df = to_numeric_cols(df[["year", "team_name", qualify_col] + metrics].copy(), ["year", qualify_col] + metrics)
+    df = df[df[qualify_col] >= qualify_min]
+    df["league"] = league_of(df["team_name"])
+    long = df.melt(id_vars=["year", "league"], value_vars=metrics, var_name="metric").dropna(subset=["year", "value"])
+    # 12球団全体の分布も同じ表に入れる
+    long_all = long.assign(league=ALL_LEAGUES)
+    return pd.concat([long.dropna(subset=["league"]), long_all], ignore_index=True)
+
+
+# (year, league, role, metric) ごとの昇順ソート済み配列を一括作成
+def build_percentile_table(df_pitch, df_bat):
+    parts = []
+    if df_bat is not None and not df_bat.empty:
+        parts.append(_melt_role(df_bat, list(BATTER_RADAR), "打席", MIN_PA).assign(role="野手"))
+    if df_pitch is not None and not df_pitch.empty:
+        parts.append(_melt_role(df_pitch, list(PITCHER_RADAR), "IP_", MIN_IP).assign(role="投手"))
+    if not parts:
+        return {}
+
+    long = pd.concat(parts, ignore_index=True)
+    long["year"] = long["year"].astype(int)
+    long = long.sort_values(["year", "league", "role", "metric", "value"], kind="mergesort")
+
+    keys = ["year", "league", "role", "metric"]
+    values = long["value"].to_numpy(dtype=float)
+    # ソート済みなのでグループ境界で配列を切り出すだけ
+    starts = np.flatnonzero(long[keys].ne(long[keys].shift()).any(axis=1).to_numpy())
+    ends = np.append(starts[1:], len(long))
+    key_rows = long[keys].iloc[starts].itertuples(index=False, name=None)
+    return {key: values[s:e] for key, s, e in zip(key_rows, starts, ends)}
+
+
+# 分位（0〜1）を二分探索で返す。分布が無い場合は NaN
+def percentile(table, year, league, role, metric, value):
+    arr = table.get((int(year), league, role, metric))
+    if arr is None or len(arr) == 0 or pd.isna(value):
+        return np.nan
+    # 同値は中間順位で扱う
+    left = np.searchsorted(arr, value, side="left")
+    right = np.searchsorted(arr, value, side="right")
+    pct = (left + right) / 2 / len(arr)
+    higher_is_better = RADAR_METRICS[role].get(metric, True)
+    return pct if higher_is_better else 1.0 - pct
+
+
+# レーダーチャート用の値リスト（リーグ分布が無ければ12球団分布を使う）
+def radar_percentiles(table, year, league, role, raw):
+    result = []
+    for metric in RADAR_METRICS[role]:
+        pct = percentile(table, year, league, role, metric, raw.get(metric))
+        if pd.isna(pct):
+            pct = percentile(table, year, ALL_LEAGUES, role, metric, raw.get(metric))
+        result.append(pct)
+    return result
+
+
+# パーセンタイルバッジ表示用の表
+def percentile_badges(table, year, league, role, raw):
+    pcts = radar_percentiles(table, year, league, role, raw)
+    rows = []
+    for metric, pct in zip(RADAR_METRICS[role], pcts):
+        rows.append({
+            "指標": metric,
+            "値": raw.get(metric),
+            "パーセンタイル": None if pd.isna(pct) else int(round(pct * 100)),
+        })
+    return pd.DataFrame(rows)
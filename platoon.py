@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from frame_views import numeric
+
+# 左右の対戦相性（打者の対右/対左、投手の右被/左被の打率から対戦ごとの予想打率を出す）
+# 年度ごとに全打者 × 全投手の行列を1回だけ放送演算で作り、チームの組み合わせは行・列の切り出しで答える
+
+# 左右別の打率は打数が少ないとぶれるので、この打数ぶん全体打率に寄せる
+SPLIT_REGRESS_AB = 100
+# 全体打率はこの打数ぶんリーグ平均に寄せる
+OVERALL_REGRESS_AB = 200
+LINEUP_SIZE = 9
+MIN_PITCHER_BF = 1
+
+
+def _regress(hits, at_bats, prior, k):
+    return (hits + k * prior) / (at_bats + k)
+
+
+# 投手の左右別被打数は 被安打 / 被打率 から戻す
+def _at_bats_from_rate(hits, rate):
+    out = np.zeros(len(hits))
+    np.divide(hits, rate, out=out, where=rate > 0)
+    return np.round(out)
+
+
+# 打者側の配列（全体・対右・対左の予想打率、打席の左右。bats は parse_hand_position 済みの列）
+def _batter_side(df, league_avg):
+    overall = _regress(np.nan_to_num(numeric(df, "安打")), np.nan_to_num(numeric(df, "打数")), league_avg, OVERALL_REGRESS_AB)
+    vs_r = _regress(np.nan_to_num(numeric(df, "対右安")), np.nan_to_num(numeric(df, "対右数")), overall, SPLIT_REGRESS_AB)
+    vs_l = _regress(np.nan_to_num(numeric(df, "対左安")), np.nan_to_num(numeric(df, "対左数")), overall, SPLIT_REGRESS_AB)
+    return overall, vs_r, vs_l, df["bats"].astype("string").fillna("不明").to_numpy()
+
+
+# 投手側の配列（全体・対右打者・対左打者の予想被打率、投げる手）
+def _pitcher_side(df, league_avg):
+    hits_r, rate_r = np.nan_to_num(numeric(df, "右被安")), np.nan_to_num(numeric(df, "右被率"))
+    hits_l, rate_l = np.nan_to_num(numeric(df, "左被安")), np.nan_to_num(numeric(df, "左被率"))
+    overall = _regress(np.nan_to_num(numeric(df, "被安打")), np.nan_to_num(numeric(df, "打数")), league_avg, OVERALL_REGRESS_AB)
+    vs_r = _regress(hits_r, _at_bats_from_rate(hits_r, rate_r), overall, SPLIT_REGRESS_AB)
+    vs_l = _regress(hits_l, _at_bats_from_rate(hits_l, rate_l), overall, SPLIT_REGRESS_AB)
+    return overall, vs_r, vs_l, df["throws"].astype("string").fillna("不明").to_numpy()
+
+
+# log5（打者の打率・投手の被打率・リーグ平均から対戦の打率を出す）
+def log5(batter, pitcher, league_avg):
+    num = batter * pitcher / league_avg
+    return num / (num + (1 - batter) * (1 - pitcher) / (1 - league_avg))
+
+
+# 年度ごとの対戦行列（打者 × 投手）。打順候補は各チーム打席数上位 LINEUP_SIZE 人
+def build_matchup_engine(df_bat, df_pitch, year):
+    bat = df_bat[(numeric(df_bat, "year") == year) & (np.nan_to_num(numeric(df_bat, "打席")) > 0)]
+    pitch = df_pitch[(numeric(df_pitch, "year") == year) & (np.nan_to_num(numeric(df_pitch, "打者")) >= MIN_PITCHER_BF)]
+    bat = bat.assign(_pa=numeric(bat, "打席")).sort_values(["team_name", "_pa"], ascending=[True, False], kind="stable")
+    bat = bat.groupby("team_name", sort=False).head(LINEUP_SIZE)
+
+    hits, at_bats = np.nansum(numeric(bat, "安打")), np.nansum(numeric(bat, "打数"))
+    league_avg = hits / at_bats if at_bats > 0 else 0.250
+    b_all, b_vs_r, b_vs_l, bats = _batter_side(bat, league_avg)
+    p_all, p_vs_r, p_vs_l, throws = _pitcher_side(pitch, league_avg)
+
+    # 投手の投げる手で打者の対右/対左を選び、打者の打席（両打は投手の逆）で投手の右被/左被を選ぶ
+    pitcher_left = (throws == "左投")[None, :]
+    batter_avg = np.where(pitcher_left, b_vs_l[:, None], b_vs_r[:, None])
+    hits_left = (bats == "左打")[:, None] | ((bats == "両打")[:, None] & ~pitcher_left)
+    pitcher_avg = np.where(hits_left, p_vs_l[None, :], p_vs_r[None, :])
+    expected = log5(batter_avg, pitcher_avg, league_avg)
+
+    # 左右を無視した対戦（双方の全体打率どうし）との差を左右の有利度とする（正なら打者有利）
+    neutral = log5(b_all[:, None], p_all[None, :], league_avg)
+    return {
+        "year": year,
+        "league_avg": league_avg,
+        "batters": bat[["選手名", "team_name", "bats"]].reset_index(drop=True),
+        "pitchers": pitch[["選手名", "team_name", "throws", "打者"]].reset_index(drop=True),
+        "batter_team": bat["team_name"].to_numpy(),
+        "pitcher_team": pitch["team_name"].to_numpy(),
+        "pitcher_bf": np.nan_to_num(numeric(pitch, "打者")),
+        "expected": expected,
+        "advantage": expected - neutral,
+    }
+
+
+# チームの組み合わせ（打撃側 × 投手側）の予想打率・有利度（行: 打者、列: 投手）
+def matchup_matrix(engine, bat_team, pitch_team, value="advantage"):
+    rows = np.flatnonzero(engine["batter_team"] == bat_team)
+    cols = np.flatnonzero(engine["pitcher_team"] == pitch_team)
+    batters = engine["batters"].iloc[rows]
+    pitchers = engine["pitchers"].iloc[cols]
+    index = batters["選手名"] + "（" + batters["bats"].astype("string") + "）"
+    columns = pitchers["選手名"] + "（" + pitchers["throws"].astype("string") + "）"
+    return pd.DataFrame(engine[value][np.ix_(rows, cols)], index=index.to_numpy(), columns=columns.to_numpy())
+
+
+# 全チームの組み合わせの平均有利度（投手は対戦打者数で加重）。行: 打撃側、列: 投手側
+def league_sweep(engine, value="advantage"):
+    bat_teams, bat_codes = np.unique(engine["batter_team"], return_inverse=True)
+    pitch_teams, pitch_codes = np.unique(engine["pitcher_team"], return_inverse=True)
+    # 打者方向はチームごとの平均、投手方向は打者数で加重した和（行列積1回ずつ）
+    bat_onehot = np.zeros((len(bat_teams), len(bat_codes)))
+    bat_onehot[bat_codes, np.arange(len(bat_codes))] = 1
+    bat_onehot /= bat_onehot.sum(axis=1, keepdims=True)
+    weights = np.zeros((len(pitch_codes), len(pitch_teams)))
+    weights[np.arange(len(pitch_codes)), pitch_codes] = engine["pitcher_bf"]
+    weights /= np.where(weights.sum(axis=0) > 0, weights.sum(axis=0), 1)
+    sweep = bat_onehot @ engine[value] @ weights
+    return pd.DataFrame(sweep, index=pd.Index(bat_teams, name="打撃側"), columns=pd.Index(pitch_teams, name="投手側"))
+
+
+# python platoon.py で年度の対戦行列作成と12球団総当たりの時間を計測
+if __name__ == "__main__":
+    import time
+    from roster_parse import parse_hand_position
+    from stats_common import read_table
+
+    df_bat = parse_hand_position(read_table("batting_stats"))
+    df_pitch = parse_hand_position(read_table("pitching_stats"))
+    year = int(pd.to_numeric(df_bat["year"], errors="coerce").max())
+
+    start = time.perf_counter()
+    engine = build_matchup_engine(df_bat, df_pitch, year)
+    t_build = time.perf_counter() - start
+    start = time.perf_counter()
+    sweep = league_sweep(engine)
+    teams = sorted(set(engine["batter_team"]))
+    pairs = [matchup_matrix(engine, a, b) for a in teams for b in teams if a != b]
+    t_sweep = time.perf_counter() - start
+    print(f"{year}: {len(engine['batters'])} batters x {len(engine['pitchers'])} pitchers, build {t_build * 1000:.1f}ms")
+    print(f"12x12 sweep + {len(pairs)} team-pair matrices: {t_sweep * 1000:.1f}ms")
+    print(sweep.round(4))
@@ -0,0 +1,247 @@
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.linear_model import Ridge
+
+from career_stats import player_keys
+
+# 翌年度成績の予測（野手: OPS・本塁打・K%、投手: 防御率・WHIP・K-BB%）
+# 今季の率を出場機会に応じてリーグ平均へ寄せた値・年齢（加齢曲線）・出場機会を特徴量にして、
+# 全年度の「今季 → 翌季」の組で Ridge 回帰を学習し、係数を版番号付きの JSON に保存する（学習はバッチで行う）。
+# 予測は保存済みの係数で全選手分を行列積1回で計算する。翌季の組が足りないうちは、
+# 平均への回帰と Marcel 式の加齢補正だけの事前モデルを同じ形式で保存する
+PROJECTION_DIR = "projections"
+PROJECTION_FILES = {"投手": "pitcher", "野手": "batter"}
+# 出場機会（野手は打席、投手は対戦打者数）
+EXPOSURE_COL = {"野手": "打席", "投手": "打者"}
+# 学習に使う組の最低出場機会（今季・翌季とも）
+MIN_EXPOSURE = 50
+# これより組が少なければ事前モデルにする
+MIN_TRAIN_PAIRS = 40
+RIDGE_ALPHA = 1.0
+PEAK_AGE = 29
+
+
+def _ratio(num, den, scale=1.0):
+    out = np.full(len(num), np.nan)
+    np.divide(num * scale, den, out=out, where=den > 0)
+    return out
+
+
+def _col(df, name):
+    return pd.to_numeric(df[name], errors="coerce").fillna(0).to_numpy(dtype=float) if name in df.columns else np.zeros(len(df))
+
+
+# 予測する指標 → (今季の値を出す関数, 平均へ寄せる出場機会, 大きいほど良いか)
+TARGETS = {
+    "野手": {
+        "OPS": (lambda df: _col(df, "OPS"), 250, True),
+        "本塁打率": (lambda df: _ratio(_col(df, "本塁打"), _col(df, "打席")), 150, True),
+        "K%": (lambda df: _ratio(_col(df, "三振"), _col(df, "打席")), 60, False),
+    },
+    "投手": {
+        "防御率": (lambda df: _ratio(_col(df, "自責点"), _col(df, "IP_"), 9), 300, False),
+        "WHIP": (lambda df: _ratio(_col(df, "被安打") + _col(df, "与四球"), _col(df, "IP_")), 250, False),
+        "K-BB%": (lambda df: _ratio(_col(df, "奪三振") - _col(df, "与四球"), _col(df, "打者"), 100), 100, True),
+    },
+}
+ROLE_FEATURES = {role: [f"回帰{t}" for t in targets] + ["年齢差", "年齢差^2", "log出場機会"] for role, targets in TARGETS.items()}
+# 表示用の列名（野手の本塁打率は今季の打席数を掛けて本塁打数にする。K% は打撃成績の K% と同じく割合）
+PROJECTION_COLUMNS = {
+    "野手": ["予測OPS", "予測本塁打", "予測K%"],
+    "投手": ["予測防御率", "予測WHIP", "予測K-BB%"],
+}
+
+
+# 選手年度ごとの今季の値・平均へ寄せた値・特徴量
+def season_features(df, role):
+    years = pd.to_numeric(df["year"], errors="coerce").to_numpy()
+    exposure = _col(df, EXPOSURE_COL[role])
+    raw = np.column_stack([value(df) for value, _, _ in TARGETS[role].values()])
+    regressed = np.empty_like(raw)
+    for j, (_, k, _) in enumerate(TARGETS[role].values()):
+        valid = ~np.isnan(raw[:, j]) & (exposure > 0)
+        # リーグ平均は年度ごとの出場機会加重平均
+        league = pd.Series(np.where(valid, raw[:, j] * exposure, 0)).groupby(years).transform("sum").to_numpy()
+        weight = pd.Series(np.where(valid, exposure, 0)).groupby(years).transform("sum").to_numpy()
+        league = _ratio(league, weight)
+        regressed[:, j] = (np.where(valid, raw[:, j] * exposure, 0) + k * league) / (np.where(valid, exposure, 0) + k)
+    age = pd.to_numeric(df["age"], errors="coerce").to_numpy(dtype=float) if "age" in df.columns else np.full(len(df), PEAK_AGE)
+    age_diff = np.nan_to_num(age - PEAK_AGE)
+    features = np.column_stack([regressed, age_diff, age_diff ** 2, np.log1p(exposure)])
+    return {"years": years, "exposure": exposure, "raw": raw, "regressed": regressed, "age_diff": age_diff, "features": features}
+
+
+# 今季 → 翌季の組（同一選手は選手名 + 生年月日）
+def training_pairs(df, role):
+    season = season_features(df, role)
+    keys = pd.Series(pd.factorize(player_keys(df))[0])
+    frame = pd.DataFrame({"key": keys, "year": season["years"], "row": np.arange(len(df))})
+    frame = frame[season["exposure"] >= MIN_EXPOSURE].dropna(subset=["year"])
+    nxt = frame.assign(year=frame["year"] - 1)
+    pairs = frame.merge(nxt, on=["key", "year"], suffixes=("", "_next")).drop_duplicates(["key", "year"])
+    now, later = pairs["row"].to_numpy(), pairs["row_next"].to_numpy()
+    targets = season["raw"][later]
+    valid = ~np.isnan(targets).any(axis=1) & ~np.isnan(season["features"][now]).any(axis=1)
+    return season["features"][now][valid], targets[valid], season["exposure"][later][valid], pairs["year"].to_numpy()[valid]
+
+
+# 学習（翌季の組が少なければ事前モデル）。戻り値はそのまま JSON に保存できる辞書
+def train_projection(df, role):
+    X, y, weight, years = training_pairs(df, role)
+    model = {
+        "role": role,
+        "targets": list(TARGETS[role]),
+        "features": ROLE_FEATURES[role],
+        "n_pairs": int(len(X)),
+        "years": sorted(int(v) for v in pd.Series(pd.to_numeric(df["year"], errors="coerce")).dropna().unique()),
+        "trained_at": date.today().isoformat(),
+        "sklearn": sklearn.__version__,
+    }
+    if len(X) < MIN_TRAIN_PAIRS:
+        return {**model, "method": "prior"}
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    std[std == 0] = 1
+    ridge = Ridge(alpha=RIDGE_ALPHA).fit((X - mean) / std, y, sample_weight=weight)
+    model.update({
+        "method": "ridge",
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "coef": ridge.coef_.tolist(),
+        "intercept": np.atleast_1d(ridge.intercept_).tolist(),
+    })
+    # 最終年度の組を除いて学習し直し、その組で「今季と同じ」予測と誤差を比べる
+    # 標準化の平均・標準偏差も学習側の組だけで求める（評価する組の情報を使わない）
+    holdout = years == years.max()
+    if holdout.any() and (~holdout).sum() >= MIN_TRAIN_PAIRS:
+        train_mean, train_std = X[~holdout].mean(axis=0), X[~holdout].std(axis=0)
+        train_std[train_std == 0] = 1
+        fit = Ridge(alpha=RIDGE_ALPHA).fit((X[~holdout] - train_mean) / train_std, y[~holdout], sample_weight=weight[~holdout])
+        pred = fit.predict((X[holdout] - train_mean) / train_std)
+        same = X[holdout][:, :len(model["targets"])]
+        rmse = lambda p: np.sqrt(np.average((p - y[holdout]) ** 2, axis=0, weights=weight[holdout])).round(4).tolist()
+        model["holdout"] = {"year": int(years.max()), "rmse": rmse(pred), "rmse_regressed_same": rmse(same)}
+    return model
+
+
+# Marcel 式の加齢補正（若いほど上向き、PEAK_AGE 以降は下向き。率への掛け算）
+def _aging_factor(age_diff):
+    return np.where(age_diff < 0, -0.006 * age_diff, -0.003 * age_diff)
+
+
+# 全選手分の予測（行列積1回）。戻り値は df と同じ index の予測列
+def project(model, df):
+    role = model["role"]
+    season = season_features(df, role)
+    if model["method"] == "ridge":
+        X = (season["features"] - np.asarray(model["mean"])) / np.asarray(model["std"])
+        pred = X @ np.asarray(model["coef"]).T + np.asarray(model["intercept"])
+    else:
+        sign = np.array([1.0 if better else -1.0 for _, _, better in TARGETS[role].values()])
+        pred = season["regressed"] * (1 + sign[None, :] * _aging_factor(season["age_diff"])[:, None])
+    if role == "野手":
+        # 本塁打率は今季と同じ打席数で本塁打数に直す
+        pred[:, 1] = pred[:, 1] * season["exposure"]
+    digits = {"予測OPS": 3, "予測本塁打": 1, "予測K%": 3, "予測防御率": 2, "予測WHIP": 2, "予測K-BB%": 1}
+    columns = PROJECTION_COLUMNS[role]
+    return pd.DataFrame({c: np.round(pred[:, j], digits[c]) for j, c in enumerate(columns)}, index=df.index)
+
+
+# df に予測列を付ける（df は元の表の行を切り出したもの。index で対応付ける）
+def with_projections(df, projected):
+    return df.assign(**projected.loc[df.index])
+
+
+def _versions(role, directory):
+    pattern = os.path.join(directory, f"{PROJECTION_FILES[role]}-v*.json")
+    found = {}
+    for path in glob.glob(pattern):
+        match = re.search(r"-v(\d+)\.json$", path)
+        if match:
+            found[int(match.group(1))] = path
+    return found
+
+
+# 最新版の保存済みモデル（無ければ None）
+def load_projection_model(role, directory=PROJECTION_DIR):
+    versions = _versions(role, directory)
+    if not versions:
+        return None
+    with open(versions[max(versions)], encoding="utf-8") as f:
+        return json.load(f)
+
+
+# 新しい版番号で保存（以前の版は残す）
+def save_projection_model(model, directory=PROJECTION_DIR):
+    os.makedirs(directory, exist_ok=True)
+    version = max(_versions(model["role"], directory), default=0) + 1
+    model = {**model, "version": version}
+    path = os.path.join(directory, f"{PROJECTION_FILES[model['role']]}-v{version:03d}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=1)
+    return path
+
+
+# 保存済みモデルがあれば読み込み、なければ学習して保存（アプリの初回起動用）
+def load_or_train(df, role, directory=PROJECTION_DIR):
+    model = load_projection_model(role, directory)
+    if model is not None and model["features"] == ROLE_FEATURES[role] and model["targets"] == list(TARGETS[role]):
+        return model
+    model = train_projection(df, role)
+    try:
+        save_projection_model(model, directory)
+    except OSError:
+        pass
+    return model
+
+
+# python projections.py --train  → 全年度から学習し、新しい版として保存（バッチ処理）
+# python projections.py          → 保存済みの最新版で全選手を予測し、時間を計測（年度を複製した合成データでも計測）
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+    from derived_stats import add_pitching_derived
+
+    parser = argparse.ArgumentParser(description="翌年度成績の予測モデルを学習・保存する")
+    parser.add_argument("--train", action="store_true", help="学習して新しい版を保存する")
+    parser.add_argument("--out", default=PROJECTION_DIR)
+    args = parser.parse_args()
+
+    sources = {"野手": read_table("batting_stats"), "投手": add_pitching_derived(read_table("pitching_stats"))}
+    for role, df in sources.items():
+        if args.train:
+            start = time.perf_counter()
+            model = train_projection(df, role)
+            path = save_projection_model(model, args.out)
+            print(f"{role}: {model['method']} model from {model['n_pairs']} season pairs in "
+                  f"{time.perf_counter() - start:.2f}s -> {path} {model.get('holdout', '')}")
+        model = load_projection_model(role, args.out) or train_projection(df, role)
+        start = time.perf_counter()
+        projected = project(model, df)
+        print(f"{role}: projected {len(projected)} player-seasons in {(time.perf_counter() - start) * 1000:.1f}ms "
+              f"(v{model.get('version', '-')}, {model['method']})")
+
+        # 年度を複製し、翌季の成績に揺らぎを加えた合成データで学習と50年分の予測を試す
+        rng = np.random.default_rng(0)
+        base_year = int(pd.to_numeric(df["year"], errors="coerce").max())
+        seasons = []
+        for i in range(50):
+            noisy = df.assign(year=base_year - i, age=pd.to_numeric(df["age"], errors="coerce") - i)
+            numeric_cols = [c for c in ["OPS", "本塁打", "三振", "自責点", "被安打", "与四球", "奪三振"] if c in df.columns]
+            noisy = noisy.assign(**{c: pd.to_numeric(df[c], errors="coerce") * rng.uniform(0.7, 1.3, len(df)) for c in numeric_cols})
+            seasons.append(noisy)
+        synthetic = pd.concat(seasons, ignore_index=True)
+        start = time.perf_counter()
+        synthetic_model = train_projection(synthetic, role)
+        t_train = time.perf_counter() - start
+        start = time.perf_counter()
+        project(synthetic_model, synthetic)
+        print(f"  synthetic {len(synthetic)} rows: train ({synthetic_model['method']}, {synthetic_model['n_pairs']} pairs) "
+              f"{t_train:.2f}s, predict {(time.perf_counter() - start) * 1000:.1f}ms, holdout {synthetic_model.get('holdout')}")
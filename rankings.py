@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from frame_views import numeric
+
+POSITION_OPTIONS = ["捕", "一", "二", "三", "遊", "左", "中", "右"]
+BATTING_RANK_METRICS = ["打率", "出塁率", "長打率", "OPS", "本塁打", "打点", "得点", "四球", "三振", "盗塁",
+                        "BABIP", "ISO", "wOBA", "wRAA"]
+PITCHING_RANK_METRICS = [
+    "防御率","投球回","勝率","勝","敗","セーブ","HP",
+    "登板", "先発", "完封", "完投", "QS", "QS率", "HQS","HQS率",
+    "奪三振", "奪三率", "与四球", "四球率", "与死球", "死球率",
+    "被安打", "被打率", "圏打率", "圏率差", "圏安打",
+    "右被率", "右率差", "右被安", "左被率", "左率差",
+    "被本率", "K/BB", "WHIP", "許盗率", "暴投",
+    "K/9", "BB/9", "K-BB%", "Command+",
+    "K%", "BB%", "被BABIP", "FIP（算出）"
+]
+
+
+# 並び替え後の上位 top_n 行（同値の順序は DataFrame.sort_values と同じ）
+def _top_rows(values, rows, ascending, top_n):
+    ranked = pd.Series(values[rows]).sort_values(ascending=ascending).index[:top_n]
+    return rows[ranked.to_numpy()]
+
+
+# 野手ランキング（最低打席数・年齢範囲・ポジションで絞り込み）
+def batter_ranking(df, metric, min_pa=50, age_range=(18, 45), positions=POSITION_OPTIONS, ascending=False, top_n=10):
+    # いずれかの選択ポジションを含む選手
+    if not positions:
+        return df.iloc[0:0]
+    position_pattern = "[" + "".join(positions) + "]"
+
+    # 絞り込みは列配列とマスクだけで行い、残った行だけを取り出す
+    age = numeric(df, "age")
+    values = numeric(df, metric)
+    keep = (
+        (numeric(df, "打席") >= min_pa)
+        & (age >= age_range[0]) & (age <= age_range[1])
+        & df["position"].astype("string").str.contains(position_pattern, na=False).to_numpy()
+        & ~np.isnan(values)
+    )
+    rows = np.flatnonzero(keep)
+    order = _top_rows(values, rows, ascending, top_n)
+    return df.iloc[order].assign(**{metric: values[order], "age": age[order]})
+
+
+# 投手ランキング（最低投球回・登板数・先発数・中継ぎ登板数で絞り込み）
+def pitcher_ranking(df, metric, min_ip=30, min_games=10, min_starts=0, min_reliever=0, ascending=True, top_n=10):
+    values = numeric(df, metric)
+    games = numeric(df, "登板")
+    starts = numeric(df, "先発")
+    reliever = np.abs(games - starts)
+    keep = (
+        ~np.isnan(values)
+        & (numeric(df, "IP_") >= min_ip)
+        & (games >= min_games)
+        & (starts >= min_starts)
+        & (reliever >= min_reliever)
+    )
+    rows = np.flatnonzero(keep)
+    order = _top_rows(values, rows, ascending, top_n)
+    return df.iloc[order].assign(**{metric: values[order], "中継ぎ": reliever[order]})
@@ -0,0 +1,137 @@
+import pandas as pd
+
+# ポジション名の日本語化
+POSITION_JA = {
+    "outfielder": "外野",
+    "catcher": "捕手",
+    "first": "一塁",
+    "second": "二塁",
+    "third": "三塁",
+    "short": "遊撃",
+}
+ABILITY_COLS = [
+    "選手名", "team_name", "Left", "Right", "center",
+    "first", "second", "short", "third", "catcher"
+]
+POSITION_ABILITY_COLS = ["Left", "Right", "center", "first", "second", "short", "third", "catcher"]
+DEFENSE_COLS = ["選手名", "チーム", "ポジション", "試合", "失策", "守備率", "捕逸", "被盗塁企画", "許盗塁", "盗塁刺", "盗阻率"]
+BEST_NINE_POSITIONS = ["捕手", "一塁", "二塁", "三塁", "遊撃", "左", "中", "右"]
+
+# 主力とみなす合計出場数（内野・捕手はポジションごと、外野は3枠合計）
+INFIELD_GAMES = 110
+OUTFIELD_GAMES = 330
+
+
+# 出場数の多い順に、合計出場が閾値に届くまでの選手を残す
+def _take_until(df, keys, threshold):
+    df = df.sort_values(keys + ["出場"], ascending=[True] * len(keys) + [False], kind="mergesort")
+    before = df.groupby(keys)["出場"].cumsum() - df["出場"]
+    return df[before < threshold]
+
+
+# 守備成績から各チーム・ポジションの主力を抽出（全チーム分）
+def select_regulars(df_def, year=None):
+    if year is not None and "year" in df_def.columns:
+        df_def = df_def[pd.to_numeric(df_def["year"], errors="coerce") == year]
+    # 「outfielder」としてすでに統一されているためそのまま使用
+    df_def = df_def.assign(
+        position_group=df_def["ポジション"],
+        team_name=df_def["チーム"],
+        出場=pd.to_numeric(df_def["試合"], errors="coerce"),
+    )
+    df_def = df_def.dropna(subset=["team_name", "position_group", "選手名", "出場"])
+
+    is_outfield = df_def["position_group"] == "outfielder"
+    top_players = _take_until(df_def[~is_outfield], ["team_name", "position_group"], INFIELD_GAMES)
+    outfield_top = _take_until(df_def[is_outfield], ["team_name"], OUTFIELD_GAMES)
+    outfield_top = outfield_top.assign(position_group="外野", ポジション="外野")
+
+    regulars = pd.concat(
+        [d.dropna(how="all", axis=1) for d in [top_players, outfield_top] if not d.empty],
+        ignore_index=True
+    )
+    regulars["ポジション"] = regulars["ポジション"].replace(POSITION_JA)
+    return regulars
+
+
+# 守備情報（ポジション名は日本語化）
+def defense_info(df_def, year=None):
+    if year is not None and "year" in df_def.columns:
+        df_def = df_def[pd.to_numeric(df_def["year"], errors="coerce") == year]
+    df_def_info = df_def[DEFENSE_COLS]
+    return df_def_info.assign(team_name=df_def_info["チーム"], ポジション=df_def_info["ポジション"].replace(POSITION_JA))
+
+
+# OPS偏差値（全体ベースの z-score）
+def add_ops_deviation(df):
+    if "OPS" not in df.columns:
+        return df
+    ops = pd.to_numeric(df["OPS"], errors="coerce")
+    ops_std = ops.std(ddof=0)
+    if ops_std != 0:
+        deviation = ((ops - ops.mean()) / ops_std * 10 + 50).round(2)
+    else:
+        deviation = 50
+    return df.assign(OPS=ops, OPS偏差値=deviation)
+
+
+# 外野手は守備能力の最も高い枠（左・中・右）に割り当てる
+def display_position(df):
+    outfield_ratings = pd.DataFrame({
+        "左": pd.to_numeric(df.get("Left"), errors="coerce"),
+        "中": pd.to_numeric(df.get("center"), errors="coerce"),
+        "右": pd.to_numeric(df.get("Right"), errors="coerce"),
+    }, index=df.index).fillna(0)
+    best_outfield = outfield_ratings.idxmax(axis=1)
+    return df["ポジション"].where(df["ポジション"] != "外野", best_outfield)
+
+
+# 主力 + 守備 + 打撃 + 能力を結合した表（全チーム分）
+def regulars_table(df_def, df_bat, df_ability, year):
+    regulars = select_regulars(df_def, year)
+    df_bat = df_bat[pd.to_numeric(df_bat["year"], errors="coerce") == year]
+    df_ability = df_ability[pd.to_numeric(df_ability["year"], errors="coerce") == year]
+
+    df_merged = pd.merge(
+        regulars,
+        defense_info(df_def, year),
+        on=["選手名", "team_name", "ポジション"],
+        how="left",
+        suffixes=("", "_def")
+    )
+    df_merged = pd.merge(
+        df_merged,
+        df_bat[["選手名", "team_name", "打率", "本塁打", "打点", "OPS"]],
+        on=["選手名", "team_name"],
+        how="left"
+    )
+    df_merged = pd.merge(
+        df_merged,
+        df_ability[ABILITY_COLS],
+        on=["選手名", "team_name"],
+        how="left"
+    )
+    df_merged["表示用ポジション"] = display_position(df_merged)
+    return df_merged
+
+
+# 表示用の列（守備情報は外し、OPS偏差値と守備能力を付ける）
+def regulars_display(df_merged):
+    df_merged = add_ops_deviation(df_merged)
+    display_cols = ["team_name", "ポジション", "選手名", "出場", "打率", "本塁打", "打点", "OPS", "OPS偏差値"]
+    display_cols += POSITION_ABILITY_COLS
+    return df_merged[[col for col in display_cols if col in df_merged.columns]].reset_index(drop=True)
+
+
+# ベストバッティングナイン（OPS順、ポジションごとに1人）
+def best_nine(df_merged, league_teams):
+    df_best_source = add_ops_deviation(df_merged)
+    df_best_source = df_best_source[df_best_source["team_name"].isin(league_teams)]
+    df_best_source = df_best_source.dropna(subset=["OPS", "ポジション"])
+    best = (
+        df_best_source[df_best_source["表示用ポジション"].isin(BEST_NINE_POSITIONS)]
+        .sort_values("OPS", ascending=False, kind="mergesort")
+        .drop_duplicates("表示用ポジション")
+    )
+    order = pd.Categorical(best["表示用ポジション"], categories=BEST_NINE_POSITIONS)
+    return best.iloc[order.argsort()]
@@ -0,0 +1,245 @@
+import argparse
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.font_manager as fm
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from clustering import (
+    pitcher_cluster_data, batter_cluster_data, tsne_embedding, kmeans_labels,
+    cluster_frame, cluster_center_table, cluster_type_names, team_cluster_composition,
+)
+from rankings import batter_ranking, pitcher_ranking
+from regulars import regulars_table, regulars_display, best_nine
+from roster_parse import parse_hand_position
+from roster_render import render_team_grid
+from stats_common import LEAGUE_TEAMS, TEAM_LEAGUE, read_table
+from team_compare import team_comparison_table, PITCHING_LOWER_IS_BETTER, BATTING_LOWER_IS_BETTER
+
+# 使い方: python report_builder.py --year 2038 --out reports --workers 4
+# 全12球団 × 各ビューを静的HTML/PNGに書き出す（アプリと同じ計算モジュールを使用）
+
+FONT_PATH = "font/NotoSansJP-VariableFont_wght.ttf"
+TEAM_VIEWS = ["rankings", "team_comparison", "roster_grid", "regulars", "clusters"]
+VIEW_TITLES = {
+    "rankings": "項目別ランキング",
+    "team_comparison": "チーム別比較",
+    "roster_grid": "選手層（年齢×ポジション）",
+    "regulars": "ポジション別出場主力",
+    "clusters": "クラスタ構成",
+    "best_nine": "ベストバッティングナイン",
+}
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{title}</title>
+<style>body {{font-family: sans-serif;}} table {{border-collapse: collapse; font-size: 13px;}} td, th {{padding: 2px 6px;}}</style>
+</head><body><h1>{title}</h1>
+{body}
+</body></html>
+"""
+
+# ワーカープロセスごとに1回だけ受け取る共有データ
+_shared = None
+_out_dir = None
+
+
+def _setup_font():
+    if os.path.exists(FONT_PATH):
+        fm.fontManager.addfont(FONT_PATH)
+        matplotlib.rcParams["font.family"] = fm.FontProperties(fname=FONT_PATH).get_name()
+    matplotlib.rcParams["axes.unicode_minus"] = False
+
+
+def _init_worker(shared, out_dir):
+    global _shared, _out_dir
+    _shared, _out_dir = shared, out_dir
+    _setup_font()
+
+
+# 全ビューで共有する中間結果を一度だけ計算
+def build_shared(year=None, n_clusters=3):
+    df_pitch = parse_hand_position(read_table("pitching_stats"))
+    df_bat = parse_hand_position(read_table("batting_stats"))
+    df_def = read_table("defense_stats")
+    df_ability = read_table("ability_stats")
+    for frame in [df_pitch, df_bat]:
+        frame["year"] = pd.to_numeric(frame["year"], errors="coerce")
+    if year is None:
+        year = int(df_pitch["year"].max())
+
+    pitch_year = df_pitch[df_pitch["year"] == year]
+    bat_year = df_bat[df_bat["year"] == year]
+    shared = {
+        "year": year,
+        "pitch": pitch_year,
+        "bat": bat_year,
+        "regulars": regulars_table(df_def, df_bat, df_ability, year),
+        "comparison": {},
+        "clusters": {},
+    }
+    for league, teams in LEAGUE_TEAMS.items():
+        shared["comparison"][(league, "投手")] = team_comparison_table(pitch_year[pitch_year["team_name"].isin(teams)], "投手")
+        shared["comparison"][(league, "野手")] = team_comparison_table(bat_year[bat_year["team_name"].isin(teams)], "野手")
+
+        # クラスタリングはアプリと同じ条件（投手は全年度、野手は指定年度・打席100以上）
+        for mode, (df_cluster, cluster_data) in [
+            ("投手", pitcher_cluster_data(df_pitch, teams)),
+            ("野手", batter_cluster_data(df_bat, year, teams)),
+        ]:
+            if len(cluster_data) < max(n_clusters, 6):
+                continue
+            embedding = tsne_embedding(cluster_data)
+            labels = kmeans_labels(embedding, n_clusters)
+            centers = cluster_center_table(cluster_data, labels)
+            shared["clusters"][(league, mode)] = {
+                "df_vis": cluster_frame(df_cluster, embedding, labels)[["選手名", "team_name", "tsne_x", "tsne_y", "cluster"]],
+                "centers": centers,
+                "types": cluster_type_names(centers, mode),
+            }
+    return shared
+
+
+def _write_page(rel_path, title, body):
+    path = os.path.join(_out_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(PAGE_TEMPLATE.format(title=title, body=body))
+    return rel_path
+
+
+def _save_fig(fig, rel_path):
+    path = os.path.join(_out_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig.savefig(path, bbox_inches="tight", dpi=100)
+    plt.close(fig)
+    return f"<img src='{os.path.basename(rel_path)}'>"
+
+
+def _barh(df, label_col, value_col, color, title, rel_path):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.barh(df[label_col], df[value_col], color=color)
+    ax.invert_yaxis()
+    ax.set_xlabel(value_col)
+    ax.set_title(title)
+    return _save_fig(fig, rel_path)
+
+
+def _render_rankings(team):
+    year = _shared["year"]
+    bat = batter_ranking(_shared["bat"][_shared["bat"]["team_name"] == team], "OPS")
+    pitch = pitcher_ranking(_shared["pitch"][_shared["pitch"]["team_name"] == team], "防御率")
+    return (
+        "<h2>野手 OPS</h2>" + bat[["選手名", "year", "OPS"]].to_html(index=False)
+        + _barh(bat, "選手名", "OPS", "#81c784", f"{year}年 {team} OPS ランキング", f"{team}/rankings_bat.png")
+        + "<h2>投手 防御率</h2>" + pitch[["選手名", "year", "防御率"]].to_html(index=False)
+        + _barh(pitch, "選手名", "防御率", "#4fc3f7", f"{year}年 {team} 防御率 ランキング", f"{team}/rankings_pitch.png")
+    )
+
+
+def _render_team_comparison(team):
+    league = TEAM_LEAGUE[team]
+    body = ""
+    for mode, lower_is_better in [("投手", PITCHING_LOWER_IS_BETTER), ("野手", BATTING_LOWER_IS_BETTER)]:
+        table = _shared["comparison"][(league, mode)]
+        ranks = pd.DataFrame({
+            m: table[m].rank(ascending=m in lower_is_better, method="min") for m in table.columns
+        })
+        view = pd.concat([table.loc[[team]], ranks.loc[[team]].rename(index={team: "リーグ内順位"})])
+        body += f"<h2>{mode}（{league}）</h2>" + view.to_html() + table.to_html()
+    return body
+
+
+def _render_roster_grid(team):
+    year = _shared["year"]
+    return (
+        "<h2>野手 年齢×ポジション</h2>" + render_team_grid(_shared["bat"], team, year, "野手")
+        + "<h2>投手 年齢分布</h2>" + render_team_grid(_shared["pitch"], team, year, "投手")
+    )
+
+
+def _render_regulars(team):
+    df_merged = _shared["regulars"]
+    return regulars_display(df_merged[df_merged["team_name"] == team]).to_html(index=False)
+
+
+def _render_clusters(team):
+    league = TEAM_LEAGUE[team]
+    body = ""
+    for mode in ["投手", "野手"]:
+        result = _shared["clusters"].get((league, mode))
+        if result is None:
+            body += f"<h2>{mode}</h2><p>クラスタリングに必要なデータが不足しています。</p>"
+            continue
+        centers = result["centers"].assign(タイプ=result["types"])
+        members = result["df_vis"][result["df_vis"]["team_name"] == team]
+        share = team_cluster_composition(result["df_vis"]).loc[[team]].round(3) if not members.empty else pd.DataFrame()
+        share.columns = [f"クラスタ{i+1}" for i in share.columns]
+        body += (
+            f"<h2>{mode}（{league}）</h2>" + centers.to_html() + share.to_html()
+            + members.assign(cluster=members["cluster"] + 1)[["選手名", "cluster"]].to_html(index=False)
+        )
+    return body
+
+
+def _render_best_nine(league):
+    best = best_nine(_shared["regulars"], LEAGUE_TEAMS[league])
+    return best[["ポジション", "表示用ポジション", "選手名", "team_name", "OPS"]].to_html(index=False)
+
+
+RENDERERS = {
+    "rankings": _render_rankings,
+    "team_comparison": _render_team_comparison,
+    "roster_grid": _render_roster_grid,
+    "regulars": _render_regulars,
+    "clusters": _render_clusters,
+    "best_nine": _render_best_nine,
+}
+
+
+# 1ジョブ = (チーム or リーグ, ビュー)
+def render_job(job):
+    key, view = job
+    body = RENDERERS[view](key)
+    return _write_page(f"{key}/{view}.html", f"{_shared['year']}年 {key} {VIEW_TITLES[view]}", body)
+
+
+def _write_index(out_dir, year, pages):
+    links = "".join(f"<li><a href='{p}'>{p}</a></li>" for p in sorted(pages))
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(PAGE_TEMPLATE.format(title=f"{year}年 レポート一覧", body=f"<ul>{links}</ul>"))
+
+
+def build_reports(out_dir, year=None, workers=None, views=TEAM_VIEWS, n_clusters=3):
+    start = time.perf_counter()
+    shared = build_shared(year, n_clusters)
+    shared_elapsed = time.perf_counter() - start
+
+    teams = [team for members in LEAGUE_TEAMS.values() for team in members]
+    jobs = [(team, view) for team in teams for view in views]
+    jobs += [(league, "best_nine") for league in LEAGUE_TEAMS]
+
+    out_dir = str(pathlib.Path(out_dir) / str(shared["year"]))
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared, out_dir)) as pool:
+        pages = list(pool.map(render_job, jobs))
+    _write_index(out_dir, shared["year"], pages)
+
+    total = time.perf_counter() - start
+    print(f"shared intermediates: {shared_elapsed:.2f}s")
+    print(f"rendered {len(pages)} pages to {out_dir} in {total:.2f}s (wall)")
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全球団・全リーグの静的レポートを書き出す")
+    parser.add_argument("--year", type=int, default=None, help="対象年度（省略時は最新年度）")
+    parser.add_argument("--out", default="reports", help="出力先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--views", nargs="+", choices=TEAM_VIEWS, default=TEAM_VIEWS, help="チーム別に出力するビュー")
+    parser.add_argument("--clusters", type=int, default=3, help="クラスタ数")
+    args = parser.parse_args()
+    build_reports(args.out, args.year, args.workers, args.views, args.clusters)
@@ -0,0 +1,82 @@
+import pandas as pd
+
+# 投打・ポジションのカテゴリ定義（グラフの色順もこの順）
+THROWS = ["右投", "左投", "不明"]
+BATS = ["右打", "左打", "両打", "不明"]
+THROW_BAT = ["右投右打", "右投左打", "右投両打", "左投右打", "左投左打", "左投両打", "不明"]
+POSITIONS = ["投", "捕", "一", "二", "三", "遊", "左", "中", "右"]
+POSITION_CLASSES = ["投手", "捕手", "内野手", "外野手"]
+
+POSITION_CLASS_MAP = {
+    "投": "投手", "捕": "捕手",
+    "一": "内野手", "二": "内野手", "三": "内野手", "遊": "内野手",
+    "左": "外野手", "中": "外野手", "右": "外野手",
+}
+
+# 半角・全角スペース
+_SPACES = r"[\s　]"
+
+
+# 値の種類は少ないので、ユニーク値だけ解析して行へ展開する
+def _categorical_from_uniques(series, parse, categories):
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.Series(uniques, dtype="string"))
+    parsed_codes = pd.Categorical(parsed, categories=categories).codes
+    # 欠損（codes == -1）は -1 のまま残す
+    result = parsed_codes.take(codes) if len(parsed_codes) else codes
+    result[codes == -1] = -1
+    return pd.Categorical.from_codes(result, categories=categories)
+
+
+def _parse_throws(hand):
+    return hand.str.replace(_SPACES, "", regex=True).str.extract(r"([右左])投", expand=False) + "投"
+
+
+def _parse_bats(hand):
+    return hand.str.replace(_SPACES, "", regex=True).str.extract(r"([右左両])打", expand=False) + "打"
+
+
+def _parse_primary(position):
+    return position.str.replace(_SPACES, "", regex=True).str[0]
+
+
+# hand / position 文字列を一度だけ解析してカテゴリ列を追加
+# throws, bats, throw_bat, primary_position, position_class
+def parse_hand_position(df):
+    if "hand" in df.columns:
+        hand = df["hand"]
+        df["throws"] = _categorical_from_uniques(hand, _parse_throws, THROWS).fillna("不明")
+        df["bats"] = _categorical_from_uniques(hand, _parse_bats, BATS).fillna("不明")
+        df["throw_bat"] = _categorical_from_uniques(
+            hand, lambda h: _parse_throws(h) + _parse_bats(h), THROW_BAT
+        ).fillna("不明")
+
+    if "position" in df.columns:
+        position = df["position"]
+        df["primary_position"] = _categorical_from_uniques(position, _parse_primary, POSITIONS)
+        df["position_class"] = _categorical_from_uniques(
+            position, lambda p: _parse_primary(p).map(POSITION_CLASS_MAP), POSITION_CLASSES
+        )
+    return df
+
+
+# 100万行の合成データで解析時間を計測（python roster_parse.py）
+if __name__ == "__main__":
+    import time
+    import numpy as np
+
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    hands = np.array(["右投右打", "右投左打", "右投両打", "左投左打", "左投右打", "右投 右打", "左投　左打", None], dtype=object)
+    positions = np.array(["投", "捕", "捕右一", "二", "三遊二一左右", "遊", "左右", "中右左", "右一", None], dtype=object)
+    df_bench = pd.DataFrame({
+        "hand": hands[rng.integers(0, len(hands), n)],
+        "position": positions[rng.integers(0, len(positions), n)],
+    })
+
+    start = time.perf_counter()
+    parse_hand_position(df_bench)
+    elapsed = time.perf_counter() - start
+    print(f"parse_hand_position: {n:,} rows in {elapsed:.3f}s")
+    print(df_bench["throw_bat"].value_counts())
+    print(df_bench.groupby("position_class", observed=True).size())
@@ -0,0 +1,106 @@
+import pandas as pd
+
+# 打席の色（凡例と同じ）
+BATS_COLORS = {"右打": "#ef5350", "左打": "#42a5f5", "両打": "#9ccc65"}
+UNKNOWN_COLOR = "#f0f0f0"
+THROWS_COLORS = {"左投": "#42a5f5", "右投": "#ef5350"}
+
+GRID_STYLE = "<style>table {font-size: 13px;} td {vertical-align: top;}</style>"
+CELL_TEMPLATE = "<div style='background-color:{color};padding:2px;border-radius:4px;margin:1px'>{name}</div>"
+NAME_TEMPLATE = '<span style="color:{color}">{name}</span>'
+
+
+# テンプレートは読み込み時に分割しておき、描画時は列の連結だけで済ませる
+def _compile(template, fields):
+    parts = [template]
+    for field in fields:
+        head, tail = parts[-1].split("{" + field + "}")
+        parts[-1:] = [head, tail]
+    return parts
+
+
+_CELL_PARTS = _compile(CELL_TEMPLATE, ["color", "name"])
+_NAME_PARTS = _compile(NAME_TEMPLATE, ["color", "name"])
+
+
+def _fill(parts, *columns):
+    out = parts[0]
+    for column, part in zip(columns, parts[1:]):
+        out = out + column + part
+    return out
+
+
+# 選手名のHTMLエスケープ（列単位）
+def escape_names(names):
+    names = names.astype("string").fillna("")
+    for char, entity in [("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;")]:
+        names = names.str.replace(char, entity, regex=False)
+    return names
+
+
+# 野手の年齢×ポジション表の元データ（1チーム・1年度）
+def batter_roster(df_batter, team, year):
+    years = pd.to_numeric(df_batter["year"], errors="coerce")
+    df_pos = df_batter[(years == year) & (df_batter["team_name"] == team)]
+    df_pos = df_pos[df_pos["hand"].notna()]
+    df_pos = df_pos[df_pos["hand"].str.contains("打")]
+    df_pos["age"] = pd.to_numeric(df_pos["age"], errors="coerce").fillna(0).astype(int)
+    df_pos["age_group"] = df_pos["age"].astype(str).where(df_pos["age"] <= 34, "35~")
+    return df_pos
+
+
+# 投手年齢分布の元データ（1チーム・1年度、左投/右投のみ）
+def pitcher_roster(df_pitch, team, year):
+    years = pd.to_numeric(df_pitch["year"], errors="coerce")
+    df_pos = df_pitch[(years == year) & (df_pitch["team_name"] == team)]
+    df_pos["age"] = pd.to_numeric(df_pos["age"], errors="coerce")
+    df_pos = df_pos.dropna(subset=["position", "age", "hand"])
+    df_pos = df_pos[df_pos["position"].astype(str).str.contains("投")]
+    df_pos["age"] = df_pos["age"].astype(int).clip(lower=18, upper=43)
+    df_pos["投手種別"] = df_pos["throws"]
+    df_pos = df_pos[df_pos["投手種別"].isin(["左投", "右投"])]
+    df_pos["投打分類"] = df_pos["throw_bat"]
+    return df_pos
+
+
+# 年齢×ポジション表のHTML
+def roster_grid_html(df_pos):
+    df_grid = df_pos.dropna(subset=["position_class"])
+    if df_grid.empty:
+        return GRID_STYLE
+    colors = df_grid["bats"].astype(object).map(BATS_COLORS).fillna(UNKNOWN_COLOR)
+    cells = _fill(_CELL_PARTS, colors, escape_names(df_grid["選手名"]))
+    pivot = (
+        cells.groupby([df_grid["age_group"], df_grid["position_class"]], observed=True)
+        .agg("".join)
+        .unstack(fill_value="")
+    )
+    pivot.index.name = "age_group"
+    pivot.columns.name = "pos_class"
+    return GRID_STYLE + pivot.to_html(escape=False)
+
+
+# 投手の年齢別一覧のHTML（左投は青・右投は赤）
+def pitcher_age_table_html(df_pos):
+    colors = df_pos["投手種別"].astype(object).map(THROWS_COLORS).fillna(THROWS_COLORS["右投"])
+    names = _fill(_NAME_PARTS, colors, escape_names(df_pos["選手名"]))
+    grouped = names.groupby(df_pos["age"]).agg("、".join).rename("選手名").reset_index()
+    return (
+        "<div style='font-size: 12px;'>"
+        + grouped.sort_values("age").to_html(escape=False, index=False)
+        + "</div>"
+    )
+
+
+# 1チーム分のHTML（mode: 野手 / 投手）
+def render_team_grid(df, team, year, mode):
+    if mode == "野手":
+        return roster_grid_html(batter_roster(df, team, year))
+    return pitcher_age_table_html(pitcher_roster(df, team, year))
+
+
+# 全チーム分を一括描画（静的エクスポート用）
+def render_all_grids(df, year, mode, teams=None):
+    if teams is None:
+        teams = sorted(df["team_name"].dropna().unique())
+    return {team: render_team_grid(df, team, year, mode) for team in teams}
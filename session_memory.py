@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# プロセス内で共有する読み取り専用データと、セッションごとに持つデータの量を記録する
+# アプリ側は st.cache_resource に置いた表（全セッションで同じオブジェクト）を「共有」、
+# session_state と絞り込み結果を「セッション」として数え、同時接続数ごとの必要メモリを見積もる
+SESSION_TTL = 30 * 60
+CAPACITY_USERS = [1, 10, 50, 100, 200]
+MB = 1024 * 1024
+
+
+# オブジェクトのおおよそのバイト数（DataFrame は文字列の中身も数える。同じオブジェクトは1回だけ）
+def object_bytes(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(object_bytes(k, seen) + object_bytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(object_bytes(v, seen) for v in obj)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + object_bytes(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+# プロセス全体の常駐メモリ（Linux 以外は取得できないので None）
+def process_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# セッション記録（st.cache_resource で1つだけ作り、全セッションから更新する）
+def new_registry():
+    return {"lock": threading.Lock(), "sessions": {}}
+
+
+# セッションの使用量を記録し、TTL を過ぎたセッションを消す
+def record_session(registry, session_id, nbytes, now=None, ttl=SESSION_TTL):
+    now = time.time() if now is None else now
+    with registry["lock"]:
+        sessions = registry["sessions"]
+        prev = sessions.get(session_id, {})
+        sessions[session_id] = {
+            "bytes": nbytes,
+            "peak_bytes": max(nbytes, prev.get("peak_bytes", 0)),
+            "runs": prev.get("runs", 0) + 1,
+            "seen": now,
+        }
+        for sid in [sid for sid, s in sessions.items() if now - s["seen"] > ttl]:
+            sessions.pop(sid)
+
+
+def session_table(registry):
+    with registry["lock"]:
+        rows = [{"session": sid[:8], **s} for sid, s in registry["sessions"].items()]
+    table = pd.DataFrame(rows, columns=["session", "bytes", "peak_bytes", "runs", "seen"])
+    return table.sort_values("seen", ascending=False, ignore_index=True)
+
+
+# 同時接続数ごとの必要メモリ（共有あり / セッションごとに全データを持つ場合）
+def capacity_estimate(shared_bytes, session_bytes, users=CAPACITY_USERS):
+    users = np.asarray(users)
+    return pd.DataFrame({
+        "同時接続数": users,
+        "共有データ（MB）": shared_bytes / MB,
+        "セッション合計（MB）": users * session_bytes / MB,
+        "合計（MB）": (shared_bytes + users * session_bytes) / MB,
+        "共有なしの場合（MB）": users * (shared_bytes + session_bytes) / MB,
+    })
+
+
+# python session_memory.py --sessions 5
+# AppTest で同じプロセスに複数セッションを作り、キャッシュが温まった状態での1回の実行あたりの
+# ピーク割り当て量を測る。同時に実行中のセッションはそれぞれこの分を持つので、サーバの見積もりに使う
+if __name__ == "__main__":
+    import tracemalloc
+    import warnings
+
+    from streamlit.testing.v1 import AppTest
+
+    parser = argparse.ArgumentParser(description="セッションごとの実行時メモリを計測する")
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--timeout", type=int, default=600)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    tracemalloc.start()
+    for i in range(args.sessions):
+        at = AppTest.from_file("GUItestv2.py", default_timeout=args.timeout)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        at.run()
+        if at.exception:
+            raise RuntimeError([e.value for e in at.exception])
+        after, peak = tracemalloc.get_traced_memory()
+        print(f"session {i + 1}: peak +{(peak - before) / MB:.1f} MB, retained +{(after - before) / MB:.1f} MB")
+    tracemalloc.stop()
@@ -0,0 +1,139 @@
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from clustering import BATTER_CLUSTER_FEATURES, PITCHER_CLUSTER_FEATURES
+from percentiles import MIN_PA, MIN_IP
+
+# 類似選手検索の特徴量（クラスタ分析と同じ指標、野手は能力値も任意で追加）
+ROLE_FEATURES = {"野手": BATTER_CLUSTER_FEATURES, "投手": PITCHER_CLUSTER_FEATURES}
+BATTER_ABILITY_FEATURES = ["contact_right", "contact_left", "power", "speed", "arm", "catch", "throw"]
+KEY_COLS = ["選手名", "team_name", "year"]
+LEAF_SIZE = 30
+
+
+# 役割ごとの対象選手（野手: 打席、投手: 投球回で足切り）と特徴量
+def _profile_frame(df, role, df_ability=None, qualified=True):
+    df = df.assign(year=pd.to_numeric(df["year"], errors="coerce"))
+    if qualified and role == "野手":
+        df = df[pd.to_numeric(df["打席"], errors="coerce") >= MIN_PA]
+    elif qualified:
+        df = df[pd.to_numeric(df["IP_"], errors="coerce") >= MIN_IP]
+    features = list(ROLE_FEATURES[role])
+    if role == "野手" and df_ability is not None:
+        ability = df_ability[KEY_COLS + BATTER_ABILITY_FEATURES]
+        ability = ability.assign(year=pd.to_numeric(ability["year"], errors="coerce"))
+        df = df.merge(ability.drop_duplicates(KEY_COLS), on=KEY_COLS, how="left")
+        features += BATTER_ABILITY_FEATURES
+    df = df.assign(**{col: pd.to_numeric(df[col], errors="coerce") for col in features})
+    df = df.dropna(subset=features + ["year"])
+    return df[KEY_COLS + features].reset_index(drop=True), features
+
+
+def _partition(profiles, features, mean, std):
+    X = ((profiles[features].to_numpy(dtype=float) - mean) / std)
+    return {"tree": KDTree(X, leaf_size=LEAF_SIZE), "keys": profiles[KEY_COLS].reset_index(drop=True)}
+
+
+# 役割ごとの索引を作成（標準化の平均・標準偏差は作成時に固定し、年度ごとに木を分ける）
+def build_index(df, role, df_ability=None):
+    profiles, features = _profile_frame(df, role, df_ability)
+    mean = profiles[features].mean().to_numpy()
+    std = profiles[features].std(ddof=0).replace(0, 1).fillna(1).to_numpy()
+    index = {
+        "role": role,
+        "features": features,
+        "use_ability": df_ability is not None,
+        "mean": mean,
+        "std": std,
+        "partitions": {},
+    }
+    for year, season in profiles.groupby("year"):
+        index["partitions"][year] = _partition(season, features, mean, std)
+    return index
+
+
+# 新しい年度を追加した索引（既存年度の木と標準化はそのまま使い、元の索引は変更しない）
+def add_season(index, df_season, df_ability=None):
+    # 空の索引には標準化の基準が無いので、追加分だけで作る（全体を作り直すのと同じ）
+    if not index["partitions"]:
+        return build_index(df_season, index["role"], df_ability if index["use_ability"] else None)
+    profiles, features = _profile_frame(df_season, index["role"], df_ability if index["use_ability"] else None)
+    index = {**index, "partitions": dict(index["partitions"])}
+    for year, season in profiles.groupby("year"):
+        index["partitions"][year] = _partition(season, features, index["mean"], index["std"])
+    return index
+
+
+# 選手の標準化済み特徴量ベクトル（規定未満の選手も検索元にできる。欠損があれば None）
+def player_vector(index, df, key, df_ability=None):
+    name, team, year = key
+    rows = df[(df["選手名"] == name) & (df["team_name"] == team) & (pd.to_numeric(df["year"], errors="coerce") == year)]
+    profiles, features = _profile_frame(rows, index["role"], df_ability if index["use_ability"] else None, qualified=False)
+    if profiles.empty:
+        return None
+    return (profiles[features].iloc[0].to_numpy(dtype=float) - index["mean"]) / index["std"]
+
+
+# k近傍の類似選手（全年度の木を検索して距離順にまとめる、exclude は除外する(選手名, team_name, year)）
+def similar_players(index, vector, k=5, exclude=None):
+    found = []
+    for part in index["partitions"].values():
+        n = min(k + 1, len(part["keys"]))
+        if n == 0:
+            continue
+        dist, idx = part["tree"].query(vector.reshape(1, -1), k=n)
+        hits = part["keys"].iloc[idx[0]].assign(距離=dist[0])
+        found.append(hits)
+    if not found:
+        return pd.DataFrame(columns=KEY_COLS + ["距離"])
+    comps = pd.concat(found, ignore_index=True)
+    if exclude is not None:
+        is_self = (comps["選手名"] == exclude[0]) & (comps["team_name"] == exclude[1]) & (comps["year"] == exclude[2])
+        comps = comps[~is_self]
+    comps = comps.sort_values("距離", kind="mergesort").head(k)
+    # 距離を 0〜100 の類似度に変換（同一成績で100）
+    comps["類似度"] = (100 / (1 + comps["距離"])).round(1)
+    comps["距離"] = comps["距離"].round(3)
+    return comps.reset_index(drop=True)
+
+
+# 索引に含まれる選手と特徴量の値を付けた表示用の表
+def comps_table(comps, df, role):
+    features = ROLE_FEATURES[role]
+    stats = df[KEY_COLS + features]
+    stats = stats.assign(year=pd.to_numeric(stats["year"], errors="coerce")).drop_duplicates(KEY_COLS)
+    return comps.merge(stats, on=KEY_COLS, how="left")
+
+
+# python similarity.py で検索時間を計測
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    df_bat = read_table("batting_stats")
+    df_pitch = read_table("pitching_stats")
+    df_ability = read_table("ability_stats")
+
+    for role, source, ability in [("野手", df_bat, df_ability), ("投手", df_pitch, None)]:
+        start = time.perf_counter()
+        index = build_index(source, role, ability)
+        built = time.perf_counter() - start
+        keys = list(source[KEY_COLS].assign(year=pd.to_numeric(source["year"], errors="coerce")).itertuples(index=False, name=None))
+        vectors = [v for v in (player_vector(index, source, key, ability) for key in keys) if v is not None]
+        start = time.perf_counter()
+        for v in vectors:
+            similar_players(index, v, k=5)
+        per_query = (time.perf_counter() - start) / max(len(vectors), 1)
+        size = sum(len(p["keys"]) for p in index["partitions"].values())
+        print(f"{role}: {size} profiles, build {built * 1000:.1f}ms, {per_query * 1000:.2f}ms/query")
+
+        # 最新年度を翌年度として複製して追加 → 既存の木はそのまま、追加年度の選手が全て入る
+        last = pd.to_numeric(source["year"], errors="coerce").max()
+        season = source[pd.to_numeric(source["year"], errors="coerce") == last].assign(year=last + 1)
+        season_ability = None if ability is None else ability.assign(year=pd.to_numeric(ability["year"], errors="coerce") + 1)
+        start = time.perf_counter()
+        appended = add_season(index, season, season_ability)
+        added = time.perf_counter() - start
+        assert appended["partitions"][last] is index["partitions"][last] and last + 1 not in index["partitions"]
+        assert appended["partitions"][last + 1]["keys"].drop(columns="year").equals(index["partitions"][last]["keys"].drop(columns="year"))
+        print(f"{role}: add_season {int(last + 1)} {added * 1000:.1f}ms ({len(appended['partitions'][last + 1]['keys'])} profiles)")
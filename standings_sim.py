@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from stats_common import LEAGUE_TEAMS, TEAM_LEAGUE
+
+# 143試合制: 同一リーグ5球団と25試合ずつ + 交流戦で他リーグ6球団と3試合ずつ
+GAMES = 143
+INTRA_LEAGUE_GAMES = 25
+INTERLEAGUE_GAMES = 3
+PLAYOFF_SPOTS = 3  # クライマックスシリーズ進出
+PYTHAGOREAN_EXPONENT = 1.83
+DEFAULT_TIE_RATE = 0.02
+CHUNK = 20_000  # メモリを抑えるため分割してシミュレーション
+
+
+# 全年度のチーム別得点（batting_stats）・失点（pitching_stats、欠損時は自責点）と勝敗（年度 × チームで1回だけ集計）
+def team_seasons(df_bat, df_pitch):
+    bat_year = pd.to_numeric(df_bat["year"], errors="coerce")
+    pitch_year = pd.to_numeric(df_pitch["year"], errors="coerce")
+    runs_scored = pd.to_numeric(df_bat["得点"], errors="coerce").groupby([bat_year, df_bat["team_name"]]).sum()
+    cols = ["失点", "自責点", "勝", "敗"]
+    pitch_sums = df_pitch[cols].apply(pd.to_numeric, errors="coerce").groupby([pitch_year, df_pitch["team_name"]]).sum()
+    runs_allowed = pitch_sums["失点"].where(pitch_sums["失点"] > 0, pitch_sums["自責点"])
+
+    seasons = pd.DataFrame({
+        "得点": runs_scored, "失点": runs_allowed, "自責点": pitch_sums["自責点"], "勝": pitch_sums["勝"], "敗": pitch_sums["敗"],
+    })
+    seasons.index.names = ["year", "team_name"]
+    seasons = seasons.reset_index()
+    seasons = seasons[seasons["team_name"].isin(TEAM_LEAGUE)].dropna(subset=["得点", "失点"])
+    seasons["league"] = seasons["team_name"].map(TEAM_LEAGUE)
+    return seasons.reset_index(drop=True)
+
+
+# 1年度分（シミュレーション用。index はチーム名）
+def team_run_rates(df_bat, df_pitch, year):
+    seasons = team_seasons(df_bat, df_pitch)
+    return seasons[seasons["year"] == year].set_index("team_name")[["得点", "失点", "勝", "敗", "league"]]
+
+
+# 対戦カードごとの試合数（チーム順は teams の順）
+def schedule_matrix(teams):
+    league = np.array([TEAM_LEAGUE[t] for t in teams])
+    games = np.where(league[:, None] == league[None, :], INTRA_LEAGUE_GAMES, INTERLEAGUE_GAMES)
+    np.fill_diagonal(games, 0)
+    return games
+
+
+# 順位表の勝敗から引き分け率を推定
+def estimate_tie_rate(teams):
+    decided = (teams["勝"] + teams["敗"]).sum()
+    if not np.isfinite(decided) or decided <= 0:
+        return DEFAULT_TIE_RATE
+    ties = GAMES * len(teams) - decided
+    return float(np.clip(ties / (GAMES * len(teams)), 0.0, 0.1))
+
+
+# ピタゴラス勝率 → log5 で対戦ごとの勝率
+def matchup_win_prob(runs_scored, runs_allowed, exponent=PYTHAGOREAN_EXPONENT):
+    rs = np.asarray(runs_scored, dtype=float) ** exponent
+    ra = np.asarray(runs_allowed, dtype=float) ** exponent
+    strength = rs / (rs + ra)
+    a, b = strength[:, None], strength[None, :]
+    return a * (1 - b) / (a * (1 - b) + b * (1 - a))
+
+
+# 143試合を n_sims 回シミュレーションし、優勝・CS進出確率を返す
+def simulate_standings(teams, n_sims=100_000, seed=0, tie_rate=None):
+    team_names = list(teams.index)
+    n = len(team_names)
+    if tie_rate is None:
+        tie_rate = estimate_tie_rate(teams)
+    games = schedule_matrix(team_names)
+    p = matchup_win_prob(teams["得点"], teams["失点"])
+
+    # 各カードは i<j の片側だけ抽選し、勝敗を両チームに振り分ける
+    i_idx, j_idx = np.triu_indices(n, k=1)
+    pair_games = games[i_idx, j_idx]
+    pair_p = p[i_idx, j_idx]
+    league = np.array([TEAM_LEAGUE[t] for t in team_names])
+    # カード → チームへの振り分け行列（勝敗の集計を行列積で行う）
+    home = np.zeros((len(pair_games), n))
+    away = np.zeros((len(pair_games), n))
+    home[np.arange(len(pair_games)), i_idx] = 1
+    away[np.arange(len(pair_games)), j_idx] = 1
+
+    rng = np.random.default_rng(seed)
+    wins_total = np.zeros(n)
+    losses_total = np.zeros(n)
+    pennant = np.zeros(n)
+    playoff = np.zeros(n)
+
+    done = 0
+    while done < n_sims:
+        size = min(CHUNK, n_sims - done)
+        ties = rng.binomial(pair_games, tie_rate, size=(size, len(pair_games)))
+        wins_i = rng.binomial(pair_games - ties, pair_p)
+        losses_i = (pair_games - ties - wins_i).astype(float)
+        wins_i = wins_i.astype(float)
+
+        wins = wins_i @ home + losses_i @ away
+        losses = losses_i @ home + wins_i @ away
+
+        # NPBは勝率（引き分け除く）で順位付け。同率は乱数で決着
+        win_pct = wins / np.maximum(wins + losses, 1) + rng.random((size, n)) * 1e-9
+        for league_name in LEAGUE_TEAMS:
+            cols = np.flatnonzero(league == league_name)
+            if len(cols) == 0:
+                continue
+            rank = np.argsort(np.argsort(-win_pct[:, cols], axis=1), axis=1)
+            pennant[cols] += (rank == 0).sum(axis=0)
+            playoff[cols] += (rank < PLAYOFF_SPOTS).sum(axis=0)
+
+        wins_total += wins.sum(axis=0)
+        losses_total += losses.sum(axis=0)
+        done += size
+
+    result = pd.DataFrame({
+        "league": league,
+        "得点": teams["得点"].to_numpy(),
+        "失点": teams["失点"].to_numpy(),
+        "平均勝": wins_total / n_sims,
+        "平均敗": losses_total / n_sims,
+        "優勝確率": pennant / n_sims,
+        "CS進出確率": playoff / n_sims,
+    }, index=pd.Index(team_names, name="チーム"))
+    result["平均分"] = games.sum(axis=1) - result["平均勝"] - result["平均敗"]
+    return result.sort_values(["league", "優勝確率"], ascending=[True, False])
+
+
+# python standings_sim.py で10万シーズンの所要時間を計測
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    df_bat = read_table("batting_stats")
+    df_pitch = read_table("pitching_stats")
+    year = pd.to_numeric(df_pitch["year"], errors="coerce").max()
+    teams = team_run_rates(df_bat, df_pitch, year)
+
+    start = time.perf_counter()
+    result = simulate_standings(teams, n_sims=100_000)
+    print(f"100,000 seasons in {time.perf_counter() - start:.2f}s")
+    print(result.round(3))
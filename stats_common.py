@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+DB_PATH = "player_stats.db"
+
+# リーグ定義
+SE_TEAMS = ["giants", "hanshin", "dragons", "baystars", "swallows", "carp"]
+PA_TEAMS = ["hawks", "lions", "eagles", "marines", "Buffaloes", "fighters"]
+LEAGUE_TEAMS = {"セ・リーグ": SE_TEAMS, "パ・リーグ": PA_TEAMS}
+TEAM_LEAGUE = {team: league for league, members in LEAGUE_TEAMS.items() for team in members}
+
+
+# チーム名 → リーグ名（Series でも単体でも可）
+def league_of(team):
+    if isinstance(team, pd.Series):
+        return team.map(TEAM_LEAGUE)
+    return TEAM_LEAGUE.get(team)
+
+
+# DBファイルの更新時刻をデータバージョンとして扱う（キャッシュキー用）
+def data_version(path=DB_PATH):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+# テーブル読み込み（Streamlit外のバッチ処理からも使う）
+def read_table(table, path=DB_PATH):
+    conn = sqlite3.connect(path)
+    df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+    conn.close()
+    return df
+
+
+# 指定列をまとめて数値化（存在しない列は無視）
+def to_numeric_cols(df, cols):
+    for col in cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
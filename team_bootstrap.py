@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# チーム別比較の不確かさ（各チームの選手を復元抽出し直し、積み上げ項目の合計から指標を計算し直す）
+# 全チームの選手をチーム順に並べた1本の配列にして、(リサンプル数 × 選手数) の添字を1回で引き、
+# np.add.reduceat でチームごとの合計を取る（チーム・リサンプルごとのループはしない）
+N_RESAMPLES = 10_000
+CONFIDENCE = 0.95
+# メモリを抑えるためリサンプルを分割して計算
+CHUNK = 2_500
+
+
+def _ratio(num, den, scale=1.0):
+    out = np.full(np.shape(num), np.nan)
+    np.divide(num * scale, den, out=out, where=den > 0)
+    return out
+
+
+# 指標 → (必要な積み上げ項目, 合計値から指標を出す関数, 小さいほど良いか)
+BOOTSTRAP_METRICS = {
+    "野手": {
+        "打率": (["安打", "打数"], lambda t: _ratio(t["安打"], t["打数"]), False),
+        "出塁率": (["安打", "四球", "死球", "打数", "犠飛"],
+                lambda t: _ratio(t["安打"] + t["四球"] + t["死球"], t["打数"] + t["四球"] + t["死球"] + t["犠飛"]), False),
+        "長打率": (["塁打", "打数"], lambda t: _ratio(t["塁打"], t["打数"]), False),
+        "OPS": (["安打", "四球", "死球", "打数", "犠飛", "塁打"],
+                lambda t: _ratio(t["安打"] + t["四球"] + t["死球"], t["打数"] + t["四球"] + t["死球"] + t["犠飛"])
+                + _ratio(t["塁打"], t["打数"]), False),
+        "三振率": (["三振", "打席"], lambda t: _ratio(t["三振"], t["打席"]), True),
+        "アダム・ダン率": (["四球", "三振", "本塁打", "打席"],
+                     lambda t: _ratio(t["四球"] + t["三振"] + t["本塁打"], t["打席"]), False),
+        "本塁打": (["本塁打"], lambda t: t["本塁打"], False),
+        "打点": (["打点"], lambda t: t["打点"], False),
+        "得点": (["得点"], lambda t: t["得点"], False),
+        "盗塁": (["盗塁"], lambda t: t["盗塁"], False),
+        "四球": (["四球"], lambda t: t["四球"], False),
+        "三振": (["三振"], lambda t: t["三振"], True),
+    },
+    "投手": {
+        "防御率": (["自責点", "IP_"], lambda t: _ratio(t["自責点"], t["IP_"], 9), True),
+        "WHIP": (["被安打", "与四球", "IP_"], lambda t: _ratio(t["被安打"] + t["与四球"], t["IP_"]), True),
+        "K/9": (["奪三振", "IP_"], lambda t: _ratio(t["奪三振"], t["IP_"], 9), False),
+        "奪三率": (["奪三振", "IP_"], lambda t: _ratio(t["奪三振"], t["IP_"], 9), False),
+        "BB/9": (["与四球", "IP_"], lambda t: _ratio(t["与四球"], t["IP_"], 9), True),
+        "四球率": (["与四球", "IP_"], lambda t: _ratio(t["与四球"], t["IP_"], 9), True),
+        "被本率": (["被本塁打", "IP_"], lambda t: _ratio(t["被本塁打"], t["IP_"], 9), True),
+        "K/BB": (["奪三振", "与四球"], lambda t: _ratio(t["奪三振"], t["与四球"]), False),
+        "被打率": (["被安打", "打数"], lambda t: _ratio(t["被安打"], t["打数"]), True),
+        "QS率": (["QS", "先発"], lambda t: _ratio(t["QS"], t["先発"]), False),
+        "奪三振": (["奪三振"], lambda t: t["奪三振"], False),
+        "与四球": (["与四球"], lambda t: t["与四球"], True),
+        "被安打": (["被安打"], lambda t: t["被安打"], True),
+    },
+}
+
+
+# 選手 × 積み上げ項目の配列（チーム順に並べ替え済み）とチームの区切り
+def _team_components(df, components):
+    df = df[df["team_name"].notna()].sort_values("team_name", kind="stable")
+    values = np.column_stack([pd.to_numeric(df[c], errors="coerce").fillna(0).to_numpy(dtype=float) for c in components])
+    teams, starts, sizes = np.unique(df["team_name"].to_numpy(), return_index=True, return_counts=True)
+    return values, teams, starts, sizes
+
+
+# チーム内復元抽出の合計（リサンプル数 × チーム数 × 積み上げ項目）
+def _resample_totals(values, starts, sizes, n_resamples, rng):
+    # 位置 j はチーム team_of[j] の枠。そのチームの選手から一様に1人選ぶ
+    team_of = np.repeat(np.arange(len(sizes)), sizes)
+    totals = np.empty((n_resamples, len(sizes), values.shape[1]))
+    for lo in range(0, n_resamples, CHUNK):
+        hi = min(lo + CHUNK, n_resamples)
+        picks = starts[team_of] + (rng.random((hi - lo, len(team_of))) * sizes[team_of]).astype(np.int64)
+        totals[lo:hi] = np.add.reduceat(values[picks], starts, axis=1)
+    return totals
+
+
+# 指標の点推定・信頼区間・順位確率（戻り値: {"summary": チーム表, "rank_probs": チーム × 順位の確率}）
+def bootstrap_team_metric(df, mode, metric, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    components, formula, lower_is_better = BOOTSTRAP_METRICS[mode][metric]
+    values, teams, starts, sizes = _team_components(df, components)
+    rng = np.random.default_rng(seed)
+    totals = _resample_totals(values, starts, sizes, n_resamples, rng)
+    samples = formula({c: totals[:, :, k] for k, c in enumerate(components)})
+    point = formula({c: np.add.reduceat(values[:, k], starts) for k, c in enumerate(components)})
+
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(samples, [alpha, 1 - alpha], axis=0)
+    # 各リサンプルでの順位（1位 = 最も良い。計算できないリサンプルは最下位扱い）
+    score = np.where(np.isnan(samples), np.inf, samples if lower_is_better else -samples)
+    ranks = score.argsort(axis=1, kind="stable").argsort(axis=1)
+    rank_probs = np.zeros((len(teams), len(teams)))
+    np.add.at(rank_probs, (np.tile(np.arange(len(teams)), n_resamples), ranks.ravel()), 1)
+    rank_probs /= n_resamples
+
+    point_order = np.argsort(np.where(np.isnan(point), np.inf, point if lower_is_better else -point), kind="stable")
+    point_rank = np.empty(len(teams), dtype=int)
+    point_rank[point_order] = np.arange(1, len(teams) + 1)
+    summary = pd.DataFrame({
+        metric: point,
+        "下限": low,
+        "上限": high,
+        "標準誤差": np.nanstd(samples, axis=0),
+        "順位": point_rank,
+        "順位確率": rank_probs[np.arange(len(teams)), point_rank - 1],
+        "首位確率": rank_probs[:, 0],
+        "選手数": sizes,
+    }, index=pd.Index(teams, name="team_name")).sort_values("順位")
+    rank_table = pd.DataFrame(rank_probs, index=pd.Index(teams, name="team_name"),
+                              columns=[f"{i}位" for i in range(1, len(teams) + 1)]).loc[summary.index]
+    return {"summary": summary, "rank_probs": rank_table, "n_resamples": n_resamples, "confidence": confidence}
+
+
+# python team_bootstrap.py で12球団 × 10,000回のリサンプル時間を計測
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+    from derived_stats import add_batting_derived, add_pitching_derived
+
+    sources = {"投手": add_pitching_derived(read_table("pitching_stats")), "野手": add_batting_derived(read_table("batting_stats"))}
+    for mode, metric in [("投手", "防御率"), ("投手", "WHIP"), ("野手", "OPS"), ("野手", "打率")]:
+        df = sources[mode]
+        start = time.perf_counter()
+        result = bootstrap_team_metric(df, mode, metric)
+        elapsed = time.perf_counter() - start
+        print(f"{mode} {metric}: {len(result['summary'])} teams x {result['n_resamples']} resamples in {elapsed:.3f}s")
+        print(result["summary"].round(3).head(4).to_string())
@@ -0,0 +1,166 @@
+import pandas as pd
+
+from frame_views import numeric
+
+# 野手: 加重平均する指標と重み列
+BATTING_WEIGHTED_METRICS = {
+    "打率": "打数",
+    "出塁率": "打数",
+    "長打率": "打数",
+    "OPS": "打数",
+    "盗塁率": "盗塁企画",  # assuming exists; otherwise remove
+    "三振率": "打席",
+    "アダム・ダン率": "打席",
+}
+BATTING_METRICS = [
+    "打率", "出塁率", "長打率", "OPS", "本塁打", "打点", "得点", "盗塁", "四球", "三振", "アダム・ダン率"
+]
+BATTING_LOWER_IS_BETTER = ["三振", "三振率"]
+
+# 投手: 指標ごとの集計方式
+PITCHING_AGG_METHOD = {
+    "防御率": "weighted_era",
+    "奪三振": "sum",
+    "与四球": "sum",
+    "被安打": "sum",
+    "被本率": "weighted_hr9",
+    "WHIP": "recalc_whip",
+    "K/9": "weighted_k9",
+    "BB/9": "weighted_bb9",
+    "QS率": "weighted_qs",
+    "K/BB": "recalc_kbb",
+    "被打率": "recalc_avg",
+    "HQS率": "weighted_hqs",
+    "奪三率": "weighted_k9",
+    "四球率": "weighted_bb9",
+    "完封": "sum",
+    "完投": "sum",
+    "与死球": "sum",
+    "許盗率": "weighted_sb",
+    "勝-セーブ": "sum_diff_win_sv",
+}
+PITCHING_LOWER_IS_BETTER = ["防御率", "与四球", "与死球", "被安打", "被本率", "BB/9", "四球率", "被打率", "許盗率", "WHIP"]
+
+
+# 野手の派生値（アダム・ダン率・OPS・打率など）を元の表とは別の Series として計算
+def _batting_metric_values(df, metric):
+    col = lambda name: pd.Series(numeric(df, name), index=df.index)
+    if metric == "アダム・ダン率":
+        return (col("四球") + col("三振") + col("本塁打")) / col("打席")
+    elif metric == "OPS":
+        return col("出塁率") + col("長打率")
+    elif metric == "打率":
+        return col("安打") / col("打数")
+    elif metric == "盗塁率":
+        if "盗塁企画" in df.columns and "盗塁" in df.columns:
+            return col("盗塁") / col("盗塁企画")
+        return col(metric)
+    elif metric == "三振率":
+        return col("三振") / col("打席")
+    return col(metric)
+
+
+# 値 × 重みをチームごとに合計して割る
+def _weighted_by_team(values, weights, teams):
+    valid = values.notna() & weights.notna()
+    g = pd.DataFrame({"weighted_value": values * weights, "weight": weights})[valid].groupby(teams[valid])
+    sums = g.sum()
+    return sums["weighted_value"] / sums["weight"]
+
+
+# 野手のチーム別集計（加重平均対象は打数・打席で加重、それ以外は平均）
+def team_batting_values(df, metric):
+    values = _batting_metric_values(df, metric)
+    weight_col = BATTING_WEIGHTED_METRICS.get(metric)
+    if weight_col is None or weight_col not in df.columns:
+        return values.groupby(df["team_name"]).mean().rename(metric).dropna()
+    weights = pd.Series(numeric(df, weight_col), index=df.index)
+    return _weighted_by_team(values, weights, df["team_name"]).rename(metric).dropna()
+
+
+# 上位/下位一覧用の野手集計（加重対象外の指標も打数で加重）
+def _batting_summary_values(df, metric):
+    values = _batting_metric_values(df, metric)
+    weight_col = BATTING_WEIGHTED_METRICS.get(metric, "打数")
+    weights = pd.Series(numeric(df, weight_col), index=df.index)
+    return _weighted_by_team(values, weights, df["team_name"]).dropna()
+
+
+# 投手のチーム別集計（投球回・先発数などで再計算）
+def team_pitching_values(df, metric):
+    agg = PITCHING_AGG_METHOD.get(metric, "mean")
+    # 必要な列だけを数値配列で持ち、チーム単位で合計する
+    col = lambda name: pd.Series(numeric(df, name), index=df.index)
+    team_sum = lambda **cols: pd.DataFrame(cols).groupby(df["team_name"]).sum()
+
+    if agg == "weighted_era":
+        g = team_sum(自責点=col("防御率") * col("IP_") / 9, IP_=col("IP_"))
+        values = g["自責点"] / g["IP_"] * 9
+    elif agg == "weighted_hr9":
+        g = team_sum(被本数_推定=col("被本率") * col("IP_") / 9, IP_=col("IP_"))
+        values = g["被本数_推定"] / g["IP_"] * 9
+    elif agg == "recalc_whip":
+        g = team_sum(被安打=col("被安打"), 与四球=col("与四球"), IP_=col("IP_"))
+        values = (g["被安打"] + g["与四球"]) / g["IP_"]
+    elif agg == "weighted_k9":
+        g = team_sum(奪三振=col("奪三振"), IP_=col("IP_"))
+        values = g["奪三振"] / g["IP_"] * 9
+    elif agg == "weighted_bb9":
+        g = team_sum(与四球=col("与四球"), IP_=col("IP_"))
+        values = g["与四球"] / g["IP_"] * 9
+    elif agg == "weighted_qs":
+        g = team_sum(QS=col("QS"), 先発=col("先発"))
+        values = g["QS"] / g["先発"]
+    elif agg == "recalc_kbb":
+        g = team_sum(奪三振=col("奪三振"), 与四球=col("与四球"))
+        values = g["奪三振"] / g["与四球"]
+    elif agg == "recalc_avg":
+        g = team_sum(被安打=col("被安打"), 打数=col("打数"))
+        values = g["被安打"] / g["打数"]
+    elif agg == "weighted_hqs":
+        g = team_sum(HQS=col("HQS"), 先発=col("先発"))
+        values = g["HQS"] / g["先発"]
+    elif agg == "sum_diff_win_sv":
+        values = (col("勝") - col("セーブ")).groupby(df["team_name"]).sum()
+    elif agg == "sum":
+        values = col(metric).groupby(df["team_name"]).sum()
+    elif agg == "weighted_sb":
+        g = team_sum(許盗数=col("許盗数"), 被盗企=col("被盗企"))
+        values = g["許盗数"] / g["被盗企"]
+    else:
+        values = col(metric).groupby(df["team_name"]).mean()
+    return values.rename(metric).dropna()
+
+
+# 各指標の上位/下位3チーム一覧（display_mode: 上位3チーム / ワースト3チーム）
+def top_team_summary(df, mode, display_mode):
+    if mode == "野手":
+        metrics, lower_is_better, values_of = BATTING_METRICS, BATTING_LOWER_IS_BETTER, _batting_summary_values
+    else:
+        metrics, lower_is_better, values_of = list(PITCHING_AGG_METHOD), PITCHING_LOWER_IS_BETTER, team_pitching_values
+
+    summary_results = []
+    for m in metrics:
+        try:
+            g = values_of(df, m)
+        except Exception:
+            continue
+        is_better_high = m not in lower_is_better
+        ascending = not is_better_high if display_mode == "上位3チーム" else is_better_high
+        top = g.sort_values(ascending=ascending).head(3)
+
+        result_row = {"指標": m}
+        for idx, (team, value) in enumerate(top.items(), 1):
+            result_row[f"{idx}位チーム"] = team
+            result_row[f"{idx}位値"] = round(value, 3)
+        summary_results.append(result_row)
+    return pd.DataFrame(summary_results)
+
+
+# 全指標×チームの比較表（レポート用）
+def team_comparison_table(df, mode):
+    if mode == "野手":
+        columns = {m: team_batting_values(df, m) for m in BATTING_METRICS}
+    else:
+        columns = {m: team_pitching_values(df, m) for m in PITCHING_AGG_METHOD}
+    return pd.DataFrame(columns).round(3)
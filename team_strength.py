@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from standings_sim import GAMES, PYTHAGOREAN_EXPONENT, team_seasons
+
+# 得失点から見たチームの実力（ピタゴラス勝率・Pythagenpat）と、実際の勝敗との差（運）
+# 全年度 × 全チームを1回の集計と配列計算で作るので、歴代の表もそのまま切り出すだけでよい
+PYTHAGENPAT_EXPONENT = 0.287
+
+
+def pythagorean_pct(runs_scored, runs_allowed, exponent=PYTHAGOREAN_EXPONENT):
+    rs = np.asarray(runs_scored, dtype=float) ** exponent
+    ra = np.asarray(runs_allowed, dtype=float) ** exponent
+    total = rs + ra
+    return np.divide(rs, total, out=np.full(len(total), np.nan), where=total > 0)
+
+
+# 1試合あたりの総得点に応じて指数を変える Pythagenpat
+def pythagenpat_pct(runs_scored, runs_allowed, games):
+    runs_scored = np.asarray(runs_scored, dtype=float)
+    runs_allowed = np.asarray(runs_allowed, dtype=float)
+    rpg = (runs_scored + runs_allowed) / np.maximum(np.asarray(games, dtype=float), 1)
+    exponent = np.where(rpg > 0, rpg, 1.0) ** PYTHAGENPAT_EXPONENT
+    rs, ra = runs_scored ** exponent, runs_allowed ** exponent
+    total = rs + ra
+    return np.divide(rs, total, out=np.full(len(total), np.nan), where=total > 0)
+
+
+# 年度 × チームの実力表（試合数は143試合制、勝率は引き分けを除く）
+def team_strength_table(df_bat, df_pitch):
+    seasons = team_seasons(df_bat, df_pitch)
+    wins, losses = seasons["勝"].to_numpy(dtype=float), seasons["敗"].to_numpy(dtype=float)
+    decided = wins + losses
+    rs, ra = seasons["得点"].to_numpy(dtype=float), seasons["失点"].to_numpy(dtype=float)
+
+    actual = np.divide(wins, decided, out=np.full(len(decided), np.nan), where=decided > 0)
+    pyth = pythagorean_pct(rs, ra)
+    pythagenpat = pythagenpat_pct(rs, ra, GAMES)
+    pyth_era = pythagorean_pct(rs, seasons["自責点"].to_numpy(dtype=float))
+    expected_wins = pythagenpat * decided
+    return seasons.assign(**{
+        "分": np.clip(GAMES - decided, 0, None),
+        "勝率": actual,
+        "得失点差": rs - ra,
+        "ピタゴラス勝率": pyth,
+        "Pythagenpat勝率": pythagenpat,
+        "ピタゴラス勝率（自責点）": pyth_era,
+        "期待勝利": expected_wins,
+        "運（勝利数）": wins - expected_wins,
+        "運（勝率）": actual - pythagenpat,
+    })
+
+
+# 表示用（年度・リーグで絞り、年度の新しい順・勝率の高い順。運は「運（勝利数）」列で見る）
+def strength_view(table, year=None, league=None):
+    view = table
+    if year is not None:
+        view = view[view["year"] == year]
+    if league is not None:
+        view = view[view["league"] == league]
+    cols = ["year", "team_name", "勝", "敗", "分", "勝率", "得点", "失点", "得失点差",
+            "ピタゴラス勝率", "Pythagenpat勝率", "期待勝利", "運（勝利数）"]
+    return view.sort_values(["year", "勝率"], ascending=[False, False])[cols].reset_index(drop=True)
+
+
+# python team_strength.py で全年度の実力表を作る時間を計測（年度を複製した合成データ）
+if __name__ == "__main__":
+    import time
+    from stats_common import read_table
+
+    n_seasons = 50
+    df_bat, df_pitch = read_table("batting_stats"), read_table("pitching_stats")
+    base_year = int(pd.to_numeric(df_bat["year"], errors="coerce").max())
+    bat = pd.concat([df_bat.assign(year=base_year - i) for i in range(n_seasons)], ignore_index=True)
+    pitch = pd.concat([df_pitch.assign(year=base_year - i) for i in range(n_seasons)], ignore_index=True)
+
+    start = time.perf_counter()
+    table = team_strength_table(bat, pitch)
+    print(f"{len(table)} team-seasons ({len(bat) + len(pitch)} player rows) in {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(strength_view(team_strength_table(df_bat, df_pitch)).round(3).to_string(index=False))
@@ -0,0 +1,143 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from roster_parse import parse_hand_position
+from stats_common import read_table
+
+# 投手の特性・球種評価・球速・スタミナの索引（pitching_stats.db の traits1〜9, "1"〜"5", velocity, stamina）
+# 特性などの語 → 選手年度ID（行番号）の昇順配列（転置索引）と、球速・スタミナの昇順配列を持ち、
+# 条件の組み合わせは短い配列どうしの積集合と二分探索だけで答える（毎回9列を文字列検索しない）
+TRAIT_DB = "pitching_stats.db"
+TRAIT_COLS = [f"traits{i}" for i in range(1, 10)]
+PITCH_COLS = ["1", "2", "3", "4", "5"]
+RANGE_COLS = ["velocity", "stamina"]
+KEY_COLS = ["選手名", "team_name", "year"]
+# 先発登板が登板数の半分以上なら先発
+STARTER_SHARE = 0.5
+
+# 読み取り時の揺れ（空白・句点）を落として同じ特性にまとめる
+_NOISE = re.compile(r"[\s　。、]")
+
+
+def load_trait_table(path=TRAIT_DB):
+    return read_table("pitching_stats", path)
+
+
+# 行ごとの語（特性:xx, 球種1:A, 投:左投, 役割:中継ぎ）を縦持ちにする
+def _row_terms(df):
+    parts = []
+    traits = df[[c for c in TRAIT_COLS if c in df.columns]].stack().dropna().astype("string")
+    traits = traits.str.replace(_NOISE, "", regex=True)
+    parts.append(pd.DataFrame({"row": traits.index.get_level_values(0), "term": "特性:" + traits.to_numpy()}))
+    for col in [c for c in PITCH_COLS if c in df.columns]:
+        grades = df[col].dropna().astype("string")
+        parts.append(pd.DataFrame({"row": grades.index, "term": f"球種{col}:" + grades.to_numpy()}))
+    parts.append(pd.DataFrame({"row": df.index, "term": "投:" + df["throws"].astype("string").to_numpy()}))
+    games = pd.to_numeric(df["登板"], errors="coerce").fillna(0)
+    starts = pd.to_numeric(df["先発"], errors="coerce").fillna(0)
+    role = np.where(starts >= games * STARTER_SHARE, "先発", "中継ぎ")
+    role = np.where(games > 0, role, "登板なし")
+    parts.append(pd.DataFrame({"row": df.index, "term": "役割:" + role}))
+    terms = pd.concat(parts, ignore_index=True)
+    return terms[terms["term"].str.len() > 0]
+
+
+# 索引を作る（DB更新時に1回）
+def build_trait_index(df):
+    df = parse_hand_position(df.reset_index(drop=True))
+    terms = _row_terms(df).drop_duplicates()
+    postings = {
+        term: np.sort(rows.to_numpy(dtype=np.int32))
+        for term, rows in terms.groupby("term")["row"]
+    }
+    ranges = {}
+    for col in RANGE_COLS:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        order = np.argsort(values, kind="stable")
+        valid = ~np.isnan(values[order])
+        ranges[col] = (values[order][valid], order[valid].astype(np.int32))
+    keys = df[KEY_COLS].assign(year=pd.to_numeric(df["year"], errors="coerce"))
+    return {"keys": keys, "postings": postings, "ranges": ranges, "n_rows": len(df)}
+
+
+# 分類ごとの語の一覧（UIの選択肢用）
+def term_options(index, prefix):
+    options = [t[len(prefix) + 1:] for t in index["postings"] if t.startswith(prefix + ":")]
+    return sorted(options, key=lambda t: -len(index["postings"][f"{prefix}:{t}"]))
+
+
+# 値の範囲 [low, high] に入る行番号（昇順）
+def _range_rows(index, col, low=None, high=None):
+    values, rows = index["ranges"][col]
+    lo = 0 if low is None else np.searchsorted(values, low, side="left")
+    hi = len(values) if high is None else np.searchsorted(values, high, side="right")
+    return np.sort(rows[lo:hi])
+
+
+# すべての条件を満たす行番号（terms は AND、any_terms は分類ごとの OR のリスト）
+def query(index, terms=(), ranges=None, any_terms=()):
+    candidates = []
+    for term in terms:
+        candidates.append(index["postings"].get(term, np.empty(0, dtype=np.int32)))
+    for group in any_terms:
+        lists = [index["postings"][t] for t in group if t in index["postings"]]
+        candidates.append(np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int32))
+    for col, (low, high) in (ranges or {}).items():
+        if low is not None or high is not None:
+            candidates.append(_range_rows(index, col, low, high))
+    if not candidates:
+        return np.arange(index["n_rows"], dtype=np.int32)
+    # 短い配列から順に積集合をとる
+    candidates.sort(key=len)
+    result = candidates[0]
+    for other in candidates[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, other, assume_unique=True)
+    return result
+
+
+# 検索結果の選手年度キー（選手名, team_name, year）
+def query_keys(index, rows):
+    return index["keys"].iloc[rows].reset_index(drop=True)
+
+
+# df のうち検索結果に含まれる行のマスク（ランキング・クラスタリングの絞り込み用）
+def key_mask(df, keys):
+    wanted = pd.MultiIndex.from_frame(keys)
+    current = pd.MultiIndex.from_arrays([
+        df["選手名"], df["team_name"], pd.to_numeric(df["year"], errors="coerce"),
+    ])
+    return current.isin(wanted)
+
+
+# python trait_index.py で「左投の中継ぎ・特性あり・球速150以上」の検索時間を計測（全件走査と比較）
+if __name__ == "__main__":
+    import time
+
+    df = load_trait_table()
+    start = time.perf_counter()
+    index = build_trait_index(df)
+    print(f"index: {index['n_rows']} rows, {len(index['postings'])} terms in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    trait = term_options(index, "特性")[0]
+    conditions = dict(terms=["投:左投", "役割:中継ぎ", f"特性:{trait}"], ranges={"velocity": (150, None)})
+    n_queries = 100_000
+    start = time.perf_counter()
+    for _ in range(n_queries):
+        rows = query(index, **conditions)
+    per_query = (time.perf_counter() - start) / n_queries
+    print(f"左投・中継ぎ・{trait}・球速150以上: {len(rows)} rows, {per_query * 1e6:.1f}µs/query")
+
+    parsed = parse_hand_position(df.copy())
+    start = time.perf_counter()
+    n_scan = 200
+    for _ in range(n_scan):
+        has_trait = parsed[TRAIT_COLS].astype("string").apply(lambda c: c.str.replace(_NOISE, "", regex=True) == trait).any(axis=1)
+        games, starts = pd.to_numeric(parsed["登板"]), pd.to_numeric(parsed["先発"])
+        scan = parsed[(parsed["throws"] == "左投") & (starts < games * STARTER_SHARE) & has_trait
+                      & (pd.to_numeric(parsed["velocity"]) >= 150)]
+    per_scan = (time.perf_counter() - start) / n_scan
+    print(f"pandas scan: {len(scan)} rows, {per_scan * 1e6:.0f}µs/query")
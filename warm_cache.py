@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from clustering import pitcher_cluster_data, batter_cluster_data, tsne_embedding, cluster_sweep
+from derived_stats import add_batting_derived, add_pitching_derived
+from incremental import update as update_derived
+from frame_views import typed_frame
+from roster_parse import parse_hand_position
+from roster_render import pitcher_roster, render_team_grid
+from similarity import build_index
+from standings_sim import team_run_rates, simulate_standings
+from stats_common import LEAGUE_TEAMS, read_table
+from watcher import content_version, scope_digests
+
+# 使い方: python warm_cache.py --workers 4
+# サイドバーの全組み合わせ（年度 × チーム範囲 × 投手/野手）で使う重い計算をデプロイ時に済ませ、
+# データバージョンごとのディレクトリに保存する。アプリは fetch() でここを先に見る
+CACHE_DIR = ".warm_cache"
+# ディレクトリ名はこのテーブルの内容版（アプリは監視中のダイジェストから同じ値を作る）
+CACHE_TABLES = ["pitching_stats", "batting_stats", "ability_stats"]
+# アプリの実行中に残しておくバージョン数（現在の版を含む。切り替わり直後に古い版を読んでいるセッション用）
+KEEP_VERSIONS = 2
+MODES = ["投手", "野手"]
+DEFAULT_N_SIMS = 100000
+
+# テーブルの読み込みと前処理（アプリの load_shared_table もこれを使うので、どちらで計算しても同じ型の表になる）
+def source_table(table):
+    df = read_table(table)
+    if table in ("pitching_stats", "batting_stats"):
+        df = typed_frame(parse_hand_position(df))
+    # BABIP・wOBA・FIP などの複合指標はここで全選手分まとめて列にしておく
+    if table == "pitching_stats":
+        df = add_pitching_derived(df)
+    if table == "batting_stats":
+        df = add_batting_derived(df)
+        # 打順の列（"1"〜"5"）は文字列として扱う
+        df = df.assign(**{col: df[col].astype(str) for col in ["1", "2", "3", "4", "5"] if col in df.columns})
+    return df
+
+
+# DB の現在の内容版（キャッシュのディレクトリ名）
+def cache_version():
+    return content_version({table: scope_digests(read_table(table)) for table in CACHE_TABLES})
+
+
+# ソース名 → 読み込み関数
+SOURCES = {
+    "pitch": lambda: source_table("pitching_stats"),
+    "bat": lambda: source_table("batting_stats"),
+    "ability": lambda: source_table("ability_stats"),
+}
+
+
+# クラスタリング入力・t-SNE・クラスタ数探索
+def _cluster_sweep(df_pitch, df_bat, mode, year=None, teams=None, roster_team=None):
+    if roster_team is not None:
+        df_cluster, cluster_data = pitcher_cluster_data(pitcher_roster(df_pitch, roster_team, year))
+    elif mode == "投手":
+        df_cluster, cluster_data = pitcher_cluster_data(df_pitch, teams)
+    else:
+        df_cluster, cluster_data = batter_cluster_data(df_bat, year, teams)
+    if len(cluster_data) < 2:
+        return df_cluster, cluster_data, None, None
+    embedding = tsne_embedding(cluster_data)
+    return df_cluster, cluster_data, embedding, cluster_sweep(cluster_data, embedding)
+
+
+def _roster_grid(df_pitch, df_bat, team, year, mode):
+    return render_team_grid(df_bat if mode == "野手" else df_pitch, team, year, mode)
+
+
+def _standings(df_pitch, df_bat, year, n_sims):
+    return simulate_standings(team_run_rates(df_bat, df_pitch, year), n_sims=n_sims)
+
+
+def _similarity_index(df_pitch, df_bat, df_ability, role, use_ability):
+    source = df_bat if role == "野手" else df_pitch
+    return build_index(source, role, df_ability if use_ability else None)
+
+
+# 計算名 → (必要なソース, 計算関数)
+COMPUTATIONS = {
+    "cluster_sweep": (["pitch", "bat"], _cluster_sweep),
+    "roster_grid": (["pitch", "bat"], _roster_grid),
+    "standings": (["pitch", "bat"], _standings),
+    "similarity_index": (["pitch", "bat", "ability"], _similarity_index),
+}
+
+
+# 年度は float / numpy 型でも同じキーになるよう揃える
+def _normalize(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, (np.integer, np.floating, float)) and float(value).is_integer():
+        return int(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def cache_path(version, name, args, cache_dir=CACHE_DIR):
+    digest = hashlib.sha1(repr(_normalize(args)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, str(version), name, f"{digest}.pkl")
+
+
+def _write(path, result):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+# 共有キャッシュにあれば読み込み、なければ計算して保存（loaders はソース名 → 読み込み関数）
+def fetch(version, name, args, loaders=SOURCES, cache_dir=CACHE_DIR):
+    args = _normalize(args)
+    path = cache_path(version, name, args, cache_dir)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    sources, compute = COMPUTATIONS[name]
+    result = compute(*[loaders[s]() for s in sources], *args)
+    try:
+        # 新しい版のディレクトリを作るときに古い版を消す（長時間動くサーバーでも増え続けない）
+        if not os.path.isdir(os.path.join(cache_dir, str(version))):
+            prune(version, cache_dir, KEEP_VERSIONS - 1)
+        _write(path, result)
+    except OSError:
+        pass
+    return result
+
+
+# サイドバーの組み合わせ（年度 × チーム範囲 × モード）
+def sidebar_combinations(years, teams):
+    scopes = [("12球団", tuple(teams))]
+    scopes += [(league, tuple(t for t in teams if t in members)) for league, members in LEAGUE_TEAMS.items()]
+    scopes += [(team, (team,)) for team in teams]
+    return [(year, scope, members, mode) for year in years for scope, members in scopes for mode in MODES]
+
+
+# 組み合わせごとに必要な計算を列挙（同じ計算は1回にまとめる）
+def warm_jobs(years, teams):
+    jobs = []
+    for year, _, members, mode in sidebar_combinations(years, teams):
+        # 選手層タブ（チームごとの表と投手クラスタ）
+        for team in members:
+            jobs.append(("roster_grid", (team, year, mode)))
+            if mode == "投手":
+                jobs.append(("cluster_sweep", (mode, year, None, team)))
+        # クラスタ分析タブ（全体・各リーグ。投手は全年度が対象）
+        for league_teams in [None] + [tuple(m) for m in LEAGUE_TEAMS.values()]:
+            jobs.append(("cluster_sweep", (mode, None if mode == "投手" else year, league_teams, None)))
+        jobs.append(("standings", (year, DEFAULT_N_SIMS)))
+        jobs.append(("similarity_index", (mode, False)))
+        if mode == "野手":
+            jobs.append(("similarity_index", (mode, True)))
+    return list(dict.fromkeys((name, _normalize(args)) for name, args in jobs))
+
+
+# ワーカーごとにデータを1回だけ読み込む
+_frames = None
+_version = None
+_cache_dir = None
+
+
+def _init_worker(version, cache_dir):
+    global _frames, _version, _cache_dir
+    _frames = {name: load() for name, load in SOURCES.items()}
+    _version, _cache_dir = version, cache_dir
+
+
+def _run_job(job):
+    name, args = job
+    start = time.perf_counter()
+    path = cache_path(_version, name, args, _cache_dir)
+    if not os.path.exists(path):
+        loaders = {key: (lambda frame=frame: frame) for key, frame in _frames.items()}
+        fetch(_version, name, args, loaders, _cache_dir)
+    return name, time.perf_counter() - start
+
+
+def cache_size(cache_dir=CACHE_DIR):
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+# 古いデータバージョンのキャッシュを削除（keep 個までは新しい順に残す）
+def prune(version, cache_dir=CACHE_DIR, keep=0):
+    if not os.path.isdir(cache_dir):
+        return
+    others = [os.path.join(cache_dir, entry) for entry in os.listdir(cache_dir) if entry != str(version)]
+    for path in sorted(others, key=_mtime, reverse=True)[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def warm(workers=None, cache_dir=CACHE_DIR):
+    start = time.perf_counter()
+    version = cache_version()
+    prune(version, cache_dir)
+
+    rebuilt = update_derived()
+    print(f"derived views: rebuilt {len(rebuilt)} partitions in {time.perf_counter() - start:.2f}s")
+
+    df_pitch = read_table("pitching_stats")
+    years = sorted(int(y) for y in pd.to_numeric(df_pitch["year"], errors="coerce").dropna().unique())
+    teams = sorted(df_pitch["team_name"].dropna().unique())
+    jobs = warm_jobs(years, teams)
+    print(f"{len(sidebar_combinations(years, teams))} sidebar combinations -> {len(jobs)} computations")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(version, cache_dir)) as pool:
+        elapsed = {}
+        for name, seconds in pool.map(_run_job, jobs):
+            elapsed[name] = elapsed.get(name, 0.0) + seconds
+    for name, seconds in sorted(elapsed.items()):
+        print(f"  {name}: {seconds:.2f}s (summed over jobs)")
+    print(f"warm-up finished in {time.perf_counter() - start:.2f}s (wall), cache size {cache_size(cache_dir) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="サイドバーの全組み合わせの計算結果を共有キャッシュに書き出す")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="キャッシュの保存先")
+    args = parser.parse_args()
+    warm(args.workers, args.cache_dir)
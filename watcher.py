@@ -0,0 +1,416 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from image_hash import IMAGE_DIR, list_images
+from incremental import SOURCE_TABLES
+from stats_common import DB_PATH
+
+# DB と image/<年度>/ の変更監視（外部のスクレイパーなどがアプリ起動中に書き込む場合）
+# 変更を (テーブル, 年度, チーム) の単位に割り当てて、その範囲の版番号だけを1つ進める。
+# アプリのキャッシュは DB 全体の更新時刻ではなくこの版番号をキーにするので、
+# 変更の無い年度・チームのキャッシュはそのまま使われる
+POLL_SECONDS = 1.0
+# 変更ログの保持件数（表示用）
+LOG_SIZE = 200
+# 画像の変更は範囲のテーブル名をこの名前にする。
+# 書き込み途中を拾わないよう、2回続けて (サイズ, 更新時刻) が同じになってから変更とみなす
+IMAGE_TABLE = "image"
+
+
+def new_watcher(db_path=DB_PATH, image_root=IMAGE_DIR, tables=SOURCE_TABLES):
+    return {
+        "lock": threading.Lock(),
+        "db_path": db_path,
+        "image_root": image_root,
+        "tables": list(tables),
+        # DB ファイル（と -wal）の状態。PRAGMA data_version は別の接続のコミットで変わる
+        "db_stat": None,
+        "conn": None,
+        "pragma_version": None,
+        "digests": {},
+        # 画像: 確定した状態と、前回と状態が変わって確定待ちの画像
+        "images": None,
+        "pending": {},
+        # 起動後に追加・差し替え・削除された画像
+        "changed_images": set(),
+        # 画像ファイル名の "teamXX" → チーム名（DB の filename 列から）
+        "image_teams": {},
+        # 範囲 → 版番号。範囲は (テーブル,)・(テーブル, 年度)・(テーブル, 年度, チーム)
+        "versions": {},
+        "generation": 0,
+        "log": deque(maxlen=LOG_SIZE),
+        "errors": 0,
+        "thread": None,
+    }
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _db_stat(db_path):
+    return _file_stat(db_path), _file_stat(db_path + "-wal")
+
+
+def _year_of(value):
+    year = pd.to_numeric(value, errors="coerce")
+    return None if pd.isna(year) else int(year)
+
+
+# (年度, チーム) ごとのダイジェスト（行ハッシュの和。チーム列の無いテーブルはチーム None）
+def scope_digests(df):
+    years = pd.to_numeric(df["year"], errors="coerce")
+    teams = df["team_name"].astype("string").fillna("") if "team_name" in df.columns else pd.Series("", index=df.index)
+    row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digests = {}
+    for (year, team), idx in pd.DataFrame({"year": years, "team": teams}).groupby(["year", "team"]).indices.items():
+        total = np.add.reduce(row_hash[idx], dtype=np.uint64)
+        digests[(int(year), team or None)] = f"{len(idx)}-{int(total):016x}"
+    return digests
+
+
+# 全テーブルを1つの読み取りトランザクションで読む（書き込みの途中の状態が混ざらない）
+def _read_snapshot(conn, tables):
+    conn.execute("BEGIN")
+    try:
+        frames = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn) for table in tables}
+    finally:
+        conn.execute("COMMIT")
+    return frames
+
+
+def _image_team_map(frames):
+    mapping = {}
+    for df in frames.values():
+        if "filename" in df.columns and "team_name" in df.columns:
+            pairs = df[["filename", "team_name"]].dropna().astype(str)
+            prefixes = pairs["filename"].str.split("_").str[0]
+            mapping.update(zip(prefixes, pairs["team_name"]))
+    return mapping
+
+
+def _bump(watcher, table, year, team):
+    versions = watcher["versions"]
+    for scope in [(table,), (table, year), (table, year, team)]:
+        versions[scope] = versions.get(scope, 0) + 1
+
+
+# DB の変更 → 変わった (テーブル, 年度, チーム) の一覧（DB が変わっていなければ読み込まない）
+def _poll_db(watcher):
+    stat = _db_stat(watcher["db_path"])
+    if watcher["conn"] is None and stat[0] is not None:
+        watcher["conn"] = sqlite3.connect(watcher["db_path"], isolation_level=None, check_same_thread=False, timeout=5)
+    pragma = None
+    if watcher["conn"] is not None:
+        try:
+            pragma = watcher["conn"].execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            pass
+    if stat == watcher["db_stat"] and pragma == watcher["pragma_version"]:
+        return []
+    if stat[0] is None:
+        return []
+    # ファイルごと置き換えられた場合（inode が変わる）は接続し直す
+    if watcher["db_stat"] is not None and watcher["db_stat"][0] is not None and watcher["db_stat"][0][0] != stat[0][0]:
+        watcher["conn"].close()
+        watcher["conn"] = sqlite3.connect(watcher["db_path"], isolation_level=None, check_same_thread=False, timeout=5)
+    try:
+        frames = _read_snapshot(watcher["conn"], watcher["tables"])
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        # 書き込み中でロックが取れない・テーブルが作り直し中など。状態は更新せず次回読み直す
+        watcher["errors"] += 1
+        return []
+    # 読み込み前に取った状態を記録する（読み込み中に書き込まれていれば次回もう一度読む）
+    watcher["db_stat"], watcher["pragma_version"] = stat, pragma
+    watcher["image_teams"] = _image_team_map(frames) or watcher["image_teams"]
+
+    changed = []
+    first = not watcher["digests"]
+    for table, df in frames.items():
+        digests = scope_digests(df)
+        previous = watcher["digests"].get(table, {})
+        if not first:
+            for scope in sorted(set(digests) | set(previous), key=repr):
+                if digests.get(scope) != previous.get(scope):
+                    changed.append((table, *scope))
+        watcher["digests"][table] = digests
+    return changed
+
+
+def _scan_images(root):
+    found = {}
+    if not os.path.isdir(root):
+        return found
+    for year_entry in os.scandir(root):
+        if not year_entry.is_dir() or not year_entry.name.isdigit():
+            continue
+        for entry in os.scandir(year_entry.path):
+            if entry.name.lower().endswith(".png") and entry.is_file():
+                st = entry.stat()
+                found[f"{year_entry.name}/{entry.name}"] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+# 画像の変更 → 変わった画像の一覧（書き込み途中の画像は次回以降に回す）
+def _poll_images(watcher):
+    current = _scan_images(watcher["image_root"])
+    if watcher["images"] is None:
+        watcher["images"] = current
+        return []
+    settled, pending = watcher["images"], watcher["pending"]
+    changed = []
+    for rel, stat in current.items():
+        if settled.get(rel) == stat:
+            pending.pop(rel, None)
+        elif pending.get(rel) == stat:
+            settled[rel] = stat
+            pending.pop(rel)
+            changed.append(rel)
+        else:
+            pending[rel] = stat
+    for rel in [rel for rel in settled if rel not in current]:
+        settled.pop(rel)
+        changed.append(rel)
+    for rel in [rel for rel in pending if rel not in current]:
+        pending.pop(rel)
+    return changed
+
+
+# 1回分の監視。戻り値は今回の変更（{"table", "year", "team", "file"} の一覧）
+def poll(watcher, now=None):
+    now = time.time() if now is None else now
+    with watcher["lock"]:
+        changes = [{"table": table, "year": year, "team": team, "file": None} for table, year, team in _poll_db(watcher)]
+        for rel in _poll_images(watcher):
+            year, _, filename = rel.partition("/")
+            team = watcher["image_teams"].get(filename.partition("_")[0])
+            changes.append({"table": IMAGE_TABLE, "year": int(year), "team": team, "file": rel})
+            watcher["changed_images"].add(rel)
+        for change in changes:
+            _bump(watcher, change["table"], change["year"], change["team"])
+            watcher["log"].append({**change, "time": now})
+        if changes:
+            watcher["generation"] += 1
+    return changes
+
+
+def _loop(watcher, interval, stop):
+    while not stop.wait(interval):
+        try:
+            poll(watcher)
+        except Exception:
+            # 監視が止まるとキャッシュが古いままになるので、失敗しても次の回で続ける
+            watcher["errors"] += 1
+
+
+# バックグラウンドのスレッドで監視を始める（戻り値の Event を set すると止まる）
+def start_watching(watcher, interval=POLL_SECONDS):
+    poll(watcher)
+    stop = threading.Event()
+    thread = threading.Thread(target=_loop, args=(watcher, interval, stop), name="data-watcher", daemon=True)
+    thread.start()
+    watcher["thread"] = thread
+    return stop
+
+
+# キャッシュキー用の版番号（tables はテーブル名1つか複数。year・teams を省くとその範囲全体）
+def scope_version(watcher, tables, year=None, teams=None):
+    tables = [tables] if isinstance(tables, str) else list(tables)
+    versions = watcher["versions"]
+    if year is None:
+        return tuple(versions.get((table,), 0) for table in tables)
+    year = _year_of(year)
+    if teams is None:
+        return tuple(versions.get((table, year), 0) for table in tables)
+    teams = [teams] if isinstance(teams, str) else sorted(teams)
+    # チーム列の無いテーブル（チーム None）の変更も含める
+    return tuple(versions.get((table, year, team), 0) for table in tables for team in [*teams, None])
+
+
+# ディスクキャッシュ用の内容版（テーブルごとの範囲ダイジェストをまとめたハッシュ）。
+# 版番号はプロセスごとに 0 から数えるので、再起動をまたぐキーにはこちらを使う
+def content_version(digests):
+    text = repr(sorted((table, sorted(scopes.items(), key=repr)) for table, scopes in digests.items()))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# 監視中の tables の範囲ダイジェスト（コピー）
+def watched_digests(watcher, tables):
+    with watcher["lock"]:
+        return {table: dict(watcher["digests"].get(table, {})) for table in tables}
+
+
+# 監視中の DB の内容版（tables のダイジェストだけを見る）
+def watched_content_version(watcher, tables):
+    return content_version(watched_digests(watcher, tables))
+
+
+# 前回のダイジェストから年度が追加されただけなら、追加された年度の一覧。
+# 既存の年度の範囲が変わった・消えた場合は None（作り直しが必要）
+def appended_years(previous, current):
+    years = set()
+    for table in set(previous) | set(current):
+        before, after = previous.get(table, {}), current.get(table, {})
+        old_years = {year for year, _ in before}
+        for scope in set(before) | set(after):
+            if before.get(scope) == after.get(scope):
+                continue
+            if scope in before or scope[0] in old_years:
+                return None
+            years.add(scope[0])
+    return sorted(years)
+
+
+# 前回見た世代以降の変更があるか
+def changed_since(watcher, generation):
+    return watcher["generation"] != generation
+
+
+# 変更のあった画像（起動後に追加・差し替え・削除されたもの）
+def changed_images(watcher, year=None):
+    with watcher["lock"]:
+        files = {rel for rel in watcher["changed_images"] if year is None or int(rel.partition("/")[0]) == _year_of(year)}
+    return tuple(sorted(files))
+
+
+def change_log(watcher):
+    with watcher["lock"]:
+        log = list(watcher["log"])
+    return pd.DataFrame(log, columns=["time", "table", "year", "team", "file"]).assign(
+        time=lambda d: pd.to_datetime(d["time"], unit="s"))
+
+
+# python watcher.py          → 実データで変更の無い回・1行修正の回の監視コストを計測
+# python watcher.py --check  → DB と画像のコピーに複数スレッドから同時に書き込み、変更範囲の割り当てを確認
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    from incremental import upsert_rows
+    from stats_common import read_table
+
+    parser = argparse.ArgumentParser(description="DB と画像の変更を監視してキャッシュの版番号を進める")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--images", default=IMAGE_DIR)
+    parser.add_argument("--check", action="store_true", help="同時書き込みのシミュレーションで動作を確認")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "player_stats.db")
+        root = os.path.join(tmp, "image")
+        shutil.copy(args.db, db)
+        year_dirs = sorted(d for d in os.listdir(args.images) if d.isdigit())
+        latest_dir = year_dirs[-1]
+        os.makedirs(os.path.join(root, latest_dir))
+        # .DS_Store などは除き、png だけを使う
+        sample_images = [rel.partition("/")[2] for rel in list_images(args.images) if rel.startswith(latest_dir + "/")][:24]
+        for name in sample_images:
+            shutil.copy(os.path.join(args.images, latest_dir, name), os.path.join(root, latest_dir, name))
+
+        watcher = new_watcher(db, root)
+        start = time.perf_counter()
+        poll(watcher)
+        print(f"initial snapshot: {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        for _ in range(100):
+            poll(watcher)
+        print(f"idle poll: {(time.perf_counter() - start) / 100 * 1e3:.2f}ms")
+
+        bat = read_table("batting_stats", db)
+        year = _year_of(bat["year"].max())
+        team = bat["team_name"].iloc[0]
+        row = bat[bat["team_name"] == team].iloc[[0]].assign(本塁打=lambda d: pd.to_numeric(d["本塁打"]) + 1)
+        upsert_rows("batting_stats", row, db)
+        start = time.perf_counter()
+        changes = poll(watcher)
+        print(f"one-row correction: {[(c['table'], c['year'], c['team']) for c in changes]} "
+              f"in {(time.perf_counter() - start) * 1e3:.1f}ms")
+
+        if args.check:
+            pitch = read_table("pitching_stats", db)
+            bat_teams = sorted(bat["team_name"].dropna().unique())[:3]
+            pitch_team = sorted(pitch["team_name"].dropna().unique())[-1]
+            versions_before = dict(watcher["versions"])
+            stop = start_watching(watcher, interval=0.02)
+            errors = []
+
+            # 打撃: 3球団分を1行ずつ何度も書き換える
+            def write_batting():
+                try:
+                    for i in range(30):
+                        t = bat_teams[i % len(bat_teams)]
+                        row = bat[bat["team_name"] == t].iloc[[0]].assign(打点=lambda d: pd.to_numeric(d["打点"]) + i + 1)
+                        upsert_rows("batting_stats", row, db)
+                except Exception as e:
+                    errors.append(e)
+
+            # 投手: 1球団分を1トランザクションでまとめて書き換える
+            def write_pitching():
+                try:
+                    for i in range(10):
+                        rows = pitch[pitch["team_name"] == pitch_team].assign(勝=lambda d: pd.to_numeric(d["勝"]) + i + 1)
+                        upsert_rows("pitching_stats", rows, db)
+                except Exception as e:
+                    errors.append(e)
+
+            # 画像: 既存の画像の差し替え（途中で止めながら書く）と新しい年度のフォルダへの追加
+            def write_images():
+                try:
+                    data = open(os.path.join(root, latest_dir, sample_images[0]), "rb").read()
+                    target = os.path.join(root, latest_dir, sample_images[1])
+                    with open(target, "wb") as f:
+                        for lo in range(0, len(data), len(data) // 4 + 1):
+                            f.write(data[lo:lo + len(data) // 4 + 1])
+                            f.flush()
+                            time.sleep(0.005)
+                    os.makedirs(os.path.join(root, str(year + 1)), exist_ok=True)
+                    for name in sample_images[2:6]:
+                        shutil.copy(os.path.join(root, latest_dir, name), os.path.join(root, str(year + 1), name))
+                except Exception as e:
+                    errors.append(e)
+
+            writers = [threading.Thread(target=w) for w in (write_batting, write_pitching, write_images)]
+            start = time.perf_counter()
+            for w in writers:
+                w.start()
+            for w in writers:
+                w.join()
+            written = time.perf_counter() - start
+            # 書き込み後、監視が追いつくまで待つ
+            time.sleep(0.3)
+            stop.set()
+            watcher["thread"].join()
+
+            log = change_log(watcher)
+            touched = {(c["table"], c["year"], c["team"]) for _, c in log.iterrows()}
+            expected_db = {("batting_stats", year, t) for t in bat_teams} | {("pitching_stats", year, pitch_team)}
+            expected_images = {f"{latest_dir}/{sample_images[1]}"} | {f"{year + 1}/{n}" for n in sample_images[2:6]}
+            db_touched = {s for s in touched if s[0] != IMAGE_TABLE}
+            assert not errors, errors
+            assert db_touched == expected_db | {("batting_stats", year, team)}, db_touched
+            assert set(changed_images(watcher)) == expected_images, changed_images(watcher)
+            assert not watcher["pending"], watcher["pending"]
+            # 書き込みの無かった範囲の版番号は変わらない
+            untouched_team = sorted(set(bat["team_name"].dropna()) - set(bat_teams) - {team})[0]
+            assert scope_version(watcher, "batting_stats", year, [untouched_team]) == \
+                tuple(versions_before.get(("batting_stats", year, t), 0) for t in [untouched_team, None])
+            assert scope_version(watcher, ["defense_stats", "ability_stats"]) == (0, 0)
+            # 監視側の読み込みが最後に見た内容と DB の内容が一致する（途中の状態のまま止まっていない）
+            final = scope_digests(read_table("batting_stats", db))
+            assert final == watcher["digests"]["batting_stats"]
+            print(f"concurrent writes ({written:.2f}s): {len(log)} changes in {watcher['generation']} polls with changes, "
+                  f"{watcher['errors']} retried polls; scopes {sorted(db_touched, key=repr)}")
+            print(f"images: {sorted(changed_images(watcher))}")
+            print("check passed")